@@ -39,7 +39,7 @@ class ProductionConfig:
     CORS_ORIGINS = ['*']  # En producción, especificar dominios específicos
     
     # Configuración de cache
-    SEND_FILE_MAX_AGE_DEFAULT = 31536000  # 1 año para archivos estáticos
+    SEND_FILE_MAX_AGE_DEFAULT = 3600  # 1 hora: los archivos estáticos no llevan hash en el nombre
 
 class DevelopmentConfig:
     """Configuración para entorno de desarrollo"""
@@ -10,9 +10,14 @@ from datetime import datetime, timedelta
 # Agregar el directorio raíz al path
 sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
 
-from src.models.database import db
+from src.models.database import db, ensure_columns, ensure_indexes
 from src.models.models import *
 from src.models.excel_models import *
+from src.services.deadline_engine import dismiss_duplicate_alerts
+from src.services.alert_store import backfill_archive_alert_ids, backfill_priority_ranks
+from src.services.document_search import ensure_search_index
+from src.services.blob_store import shard_flat_blobs
+from src.services.storage_usage import ensure_usage
 
 def create_sample_data():
     """Crear datos de ejemplo para demostración"""
@@ -187,6 +192,14 @@ def initialize_database():
         
         # Crear todas las tablas
         db.create_all()
+        ensure_columns()
+        backfill_priority_ranks()
+        backfill_archive_alert_ids()
+        dismiss_duplicate_alerts()
+        ensure_indexes()
+        ensure_search_index()
+        shard_flat_blobs()
+        ensure_usage()
         print("✅ Tablas de base de datos creadas")
         
         # Crear datos de ejemplo
@@ -9,43 +9,186 @@ import shutil
 import sqlite3
 import logging
 import zipfile
+import gzip
+import hashlib
+import uuid
+import time
+import subprocess
+import threading
+import queue
+import random
+import atexit
+import copy
+import zlib
 import psutil
-from datetime import datetime, timedelta
-from logging.handlers import RotatingFileHandler
+from contextvars import ContextVar
+from datetime import datetime, timedelta, timezone
+from logging.handlers import RotatingFileHandler, QueueHandler, QueueListener
 import json
 
 # Configuración de logging
-LOG_LEVEL = logging.INFO
-LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+LOG_LEVEL = getattr(logging, os.environ.get('LOG_LEVEL', 'INFO').upper(), logging.INFO)
+LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - [%(request_id)s] %(message)s'
+LOG_JSON = os.environ.get('LOG_JSON', 'true').lower() == 'true'  # Archivos en JSON (una línea por registro)
+LOG_QUEUE_SIZE = 10000  # Registros pendientes antes de descartar
+DEBUG_SAMPLE_RATE = float(os.environ.get('DEBUG_SAMPLE_RATE', 0.1))  # Fracción de peticiones con logs DEBUG
+REQUEST_ID_HEADER = 'X-Request-ID'
 LOG_DIR = 'src/logs'
 BACKUP_DIR = 'backups'
 MAX_LOG_SIZE = 10 * 1024 * 1024  # 10MB
 BACKUP_RETENTION_DAYS = 30
 
+# Respaldos de base de datos
+SQLITE_BACKUP_METHOD = os.environ.get('SQLITE_BACKUP_METHOD', 'backup')  # backup (por páginas) o vacuum
+SQLITE_BACKUP_PAGES_PER_STEP = 1024  # Páginas copiadas antes de ceder el bloqueo a los escritores
+SQLITE_BACKUP_STEP_SLEEP = 0.005  # Segundos de pausa entre pasos
+LEGACY_DB_FILES = ['procurement.db', 'src/procurement.db', 'instance/procurement.db']
+
+# Monitoreo de salud
+HEALTH_PROBE_INTERVAL = int(os.environ.get('HEALTH_PROBE_INTERVAL', 15))  # Segundos entre sondeos livianos
+HEALTH_INTEGRITY_INTERVAL = int(os.environ.get('HEALTH_INTEGRITY_INTERVAL', 3600))  # Segundos entre quick_check
+HEALTH_STALE_INTERVALS = 4  # Intervalos sin sondear antes de considerar vencido el estado
+CRITICAL_DIRS = ['src/uploads', 'src/logs', 'backups']
+EXPECTED_TABLES = ['suppliers', 'processes', 'bids', 'documents', 'alerts']
+
+# Respaldos incrementales de archivos
+FILES_BACKUP_SOURCES = ['src/uploads', 'uploads']
+FILES_BACKUP_EXCLUDED_DIRS = {'tmp', 'locks'}  # Subidas en curso y archivos de bloqueo
+FULL_BACKUP_EVERY = 7  # Cada cuántos respaldos se escribe un manifiesto completo
+BACKUP_CHUNK_SIZE = 1024 * 1024  # 1MB
+COMPRESSED_EXTENSIONS = {
+    'pdf', 'png', 'jpg', 'jpeg', 'gif', 'zip', 'gz', 'docx', 'xlsx', 'pptx', 'mp4', 'webp', '7z', 'rar'
+}
+COMPRESSED_SIGNATURES = (
+    b'%PDF', b'PK\x03\x04', b'\x89PNG', b'\xff\xd8\xff', b'GIF8', b'\x1f\x8b', b'7z\xbc\xaf', b'Rar!'
+)
+
+# Identificador de la petición en curso, agregado a cada registro
+request_id_var = ContextVar('request_id', default='-')
+_log_listener = None
+
+class RequestIdFilter(logging.Filter):
+    """Agregar el identificador de la petición (se evalúa en el hilo que genera el registro)"""
+    
+    def filter(self, record):
+        record.request_id = request_id_var.get()
+        return True
+
+class DebugSamplingFilter(logging.Filter):
+    """Conservar los registros DEBUG de una fracción de las peticiones.
+    
+    La decisión depende del identificador de la petición, de modo que una
+    petición muestreada conserva todos sus registros DEBUG.
+    """
+    
+    def __init__(self, rate=DEBUG_SAMPLE_RATE):
+        super().__init__()
+        self.rate = rate
+    
+    def filter(self, record):
+        if record.levelno >= logging.INFO or self.rate >= 1:
+            return True
+        request_id = getattr(record, 'request_id', '-')
+        if request_id == '-':
+            return random.random() < self.rate
+        return zlib.crc32(request_id.encode('utf-8')) % 10000 < self.rate * 10000
+
+class JsonFormatter(logging.Formatter):
+    """Una línea JSON por registro (se formatea una sola vez aunque lo escriban varios archivos)"""
+    
+    def format(self, record):
+        cached = getattr(record, '_json_line', None)
+        if cached is not None:
+            return cached
+        
+        entry = {
+            'timestamp': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'request_id': getattr(record, 'request_id', '-'),
+            'module': record.module,
+            'line': record.lineno,
+            'thread': record.threadName,
+            'process': record.process,
+        }
+        if record.exc_text:
+            entry['exception'] = record.exc_text
+        elif record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        
+        record._json_line = json.dumps(entry, ensure_ascii=False, default=str)
+        return record._json_line
+
+class LogQueueHandler(QueueHandler):
+    """Encolar registros sin bloquear: el formateo y la escritura ocurren en el hilo del listener"""
+    
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+    
+    def prepare(self, record):
+        # Resolver el mensaje y la traza aquí: los argumentos pueden cambiar después
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+    
+    def enqueue(self, record):
+        try:
+            if self.dropped:
+                self.queue.put_nowait(logging.makeLogRecord({
+                    'name': 'procurement_system', 'levelno': logging.WARNING, 'levelname': 'WARNING',
+                    'msg': f'Cola de logs llena: {self.dropped} registros descartados', 'request_id': '-'
+                }))
+                self.dropped = 0
+            self.queue.put_nowait(record)
+        except queue.Full:
+            # Bajo sobrecarga se descartan registros en lugar de bloquear las peticiones (salvo errores)
+            if record.levelno >= logging.ERROR:
+                try:
+                    self.queue.put(record, timeout=1)
+                    return
+                except queue.Full:
+                    pass
+            self.dropped += 1
+
+def _file_handler(path, backup_count, formatter):
+    handler = RotatingFileHandler(path, maxBytes=MAX_LOG_SIZE, backupCount=backup_count, encoding='utf-8')
+    handler.setLevel(LOG_LEVEL)
+    handler.setFormatter(formatter)
+    return handler
+
 def setup_logging():
-    """Configurar sistema de logging avanzado"""
+    """Configurar sistema de logging asíncrono.
+    
+    Los loggers solo encolan los registros; un QueueListener en segundo plano
+    los formatea (JSON en archivos) y hace la escritura y la rotación, fuera
+    del hilo de la petición. La cola se instala en el logger raíz, así que
+    también pasan por ella los loggers por módulo (src.routes.*,
+    src.services.*) y los de las librerías.
+    """
+    global _log_listener
+    
     # Crear directorio de logs si no existe
     os.makedirs(LOG_DIR, exist_ok=True)
     
     # Configurar logger principal
     logger = logging.getLogger('procurement_system')
     logger.setLevel(LOG_LEVEL)
+    logging.getLogger('src').setLevel(LOG_LEVEL)
     
     # Evitar duplicar handlers
-    if logger.handlers:
+    if _log_listener is not None:
         return logger
     
+    file_formatter = JsonFormatter() if LOG_JSON else logging.Formatter(LOG_FORMAT)
+    
     # Handler para archivo con rotación
-    log_file = os.path.join(LOG_DIR, 'procurement_system.log')
-    file_handler = RotatingFileHandler(
-        log_file, 
-        maxBytes=MAX_LOG_SIZE, 
-        backupCount=5,
-        encoding='utf-8'
-    )
-    file_handler.setLevel(LOG_LEVEL)
-    file_formatter = logging.Formatter(LOG_FORMAT)
-    file_handler.setFormatter(file_formatter)
+    file_handler = _file_handler(os.path.join(LOG_DIR, 'procurement_system.log'), 5, file_formatter)
     
     # Handler para consola
     console_handler = logging.StreamHandler(sys.stdout)
@@ -53,116 +196,562 @@ def setup_logging():
     console_formatter = logging.Formatter('%(levelname)s - %(message)s')
     console_handler.setFormatter(console_formatter)
     
-    # Agregar handlers
-    logger.addHandler(file_handler)
-    logger.addHandler(console_handler)
-    
     # Configurar loggers específicos
-    setup_specific_loggers()
+    handlers = [file_handler, console_handler] + setup_specific_loggers(file_formatter)
+    
+    log_queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+    _log_listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _log_listener.start()
+    atexit.register(stop_logging)
+    
+    queue_handler = LogQueueHandler(log_queue)
+    queue_handler.addFilter(RequestIdFilter())
+    queue_handler.addFilter(DebugSamplingFilter())
+    
+    # La cola reemplaza a los handlers síncronos del raíz (basicConfig); las
+    # librerías no bajan de INFO aunque LOG_LEVEL sea DEBUG
+    root_logger = logging.getLogger()
+    for handler in root_logger.handlers[:]:
+        root_logger.removeHandler(handler)
+    root_logger.addHandler(queue_handler)
+    root_logger.setLevel(max(LOG_LEVEL, logging.INFO))
     
     logger.info("Sistema de logging inicializado correctamente")
     return logger
 
-def setup_specific_loggers():
-    """Configurar loggers específicos para diferentes módulos"""
+def stop_logging():
+    """Escribir los registros pendientes y detener el listener"""
+    global _log_listener
+    
+    if _log_listener is not None:
+        listener, _log_listener = _log_listener, None
+        listener.stop()
+
+def setup_specific_loggers(formatter=None):
+    """Configurar loggers específicos para diferentes módulos.
+    
+    Devuelve un handler de archivo por módulo, filtrado por nombre de logger,
+    para que el listener de setup_logging los escriba.
+    """
     modules = ['database', 'api', 'excel', 'backup', 'monitoring']
+    formatter = formatter or logging.Formatter(LOG_FORMAT)
+    handlers = []
     
     for module in modules:
         module_logger = logging.getLogger(f'procurement_system.{module}')
         module_logger.setLevel(LOG_LEVEL)
         
         # Handler específico para cada módulo
-        log_file = os.path.join(LOG_DIR, f'{module}.log')
-        handler = RotatingFileHandler(
-            log_file,
-            maxBytes=MAX_LOG_SIZE,
-            backupCount=3,
-            encoding='utf-8'
+        handler = _file_handler(os.path.join(LOG_DIR, f'{module}.log'), 3, formatter)
+        handler.addFilter(logging.Filter(f'procurement_system.{module}'))
+        handlers.append(handler)
+    
+    return handlers
+
+def init_request_logging(app):
+    """Asignar un identificador a cada petición (o respetar el X-Request-ID recibido)"""
+    from flask import request
+    
+    def start_request():
+        incoming = request.headers.get(REQUEST_ID_HEADER, '')
+        request_id = incoming if incoming and len(incoming) <= 64 and incoming.isprintable() else uuid.uuid4().hex[:16]
+        request.environ['request_logging.token'] = request_id_var.set(request_id)
+    
+    def add_header(response):
+        response.headers[REQUEST_ID_HEADER] = request_id_var.get()
+        return response
+    
+    def end_request(exception=None):
+        token = request.environ.pop('request_logging.token', None)
+        if token is not None:
+            request_id_var.reset(token)
+    
+    app.before_request(start_request)
+    app.after_request(add_header)
+    app.teardown_request(end_request)
+
+class IncrementalFileBackup:
+    """Respaldo incremental y deduplicado de archivos.
+    
+    Cada archivo se guarda una sola vez en objects/ bajo su SHA-256 (los tipos
+    ya comprimidos tal cual, el resto con gzip). Cada ejecución escribe un
+    manifiesto con ruta, tamaño, mtime y huella: el primero de cada cadena es
+    completo y los siguientes solo registran los archivos nuevos, modificados
+    o eliminados respecto del anterior. Los archivos cuyo tamaño y mtime no
+    cambiaron no se vuelven a leer.
+    """
+    
+    def __init__(self, backup_dir, sources=None):
+        self.root = os.path.join(backup_dir, 'files')
+        self.objects_dir = os.path.join(self.root, 'objects')
+        self.manifests_dir = os.path.join(self.root, 'manifests')
+        self.sources = sources or FILES_BACKUP_SOURCES
+        self.logger = logging.getLogger('procurement_system.backup')
+        os.makedirs(self.objects_dir, exist_ok=True)
+        os.makedirs(self.manifests_dir, exist_ok=True)
+    
+    def object_path(self, digest, compressed):
+        """Ruta de un objeto respaldado (con sufijo .gz si se guardó comprimido)"""
+        return os.path.join(self.objects_dir, digest[:2], f'{digest}.gz' if compressed else digest)
+    
+    def find_object(self, digest):
+        """Indica si el objeto ya existe y si está comprimido: None, True o False"""
+        for compressed in (False, True):
+            if os.path.exists(self.object_path(digest, compressed)):
+                return compressed
+        return None
+    
+    def list_manifests(self):
+        """Nombres de los manifiestos en orden cronológico"""
+        return sorted(name for name in os.listdir(self.manifests_dir) if name.endswith('.json'))
+    
+    def load_manifest(self, name):
+        """Leer un manifiesto"""
+        with open(os.path.join(self.manifests_dir, name), 'r', encoding='utf-8') as manifest_file:
+            return json.load(manifest_file)
+    
+    def snapshot(self, name):
+        """Estado completo de los archivos en un manifiesto, resolviendo su cadena"""
+        chain = []
+        while name:
+            manifest = self.load_manifest(name)
+            chain.append(manifest)
+            name = manifest.get('parent')
+        
+        files = {}
+        for manifest in reversed(chain):
+            for path in manifest.get('deleted', []):
+                files.pop(path, None)
+            files.update(manifest['files'])
+        return files
+    
+    def _scan(self):
+        """Recorrer los directorios de origen con os.scandir"""
+        for source in self.sources:
+            if not os.path.isdir(source):
+                continue
+            
+            stack = [source]
+            while stack:
+                with os.scandir(stack.pop()) as entries:
+                    for entry in entries:
+                        if entry.is_dir(follow_symlinks=False):
+                            if entry.name not in FILES_BACKUP_EXCLUDED_DIRS:
+                                stack.append(entry.path)
+                        elif entry.is_file(follow_symlinks=False):
+                            yield os.path.normpath(entry.path).replace(os.sep, '/'), entry.stat()
+    
+    @staticmethod
+    def is_compressed(path):
+        """Indica si el archivo ya está comprimido (por extensión o por su firma)"""
+        if path.rsplit('.', 1)[-1].lower() in COMPRESSED_EXTENSIONS:
+            return True
+        with open(path, 'rb') as source_file:
+            header = source_file.read(8)
+        return header.startswith(COMPRESSED_SIGNATURES)
+    
+    def _store(self, path):
+        """Copiar un archivo al almacén de objetos calculando su huella; devuelve (huella, comprimido, nuevo)"""
+        compress = not self.is_compressed(path)
+        tmp_path = os.path.join(self.objects_dir, f'{uuid.uuid4().hex}.tmp')
+        digest = hashlib.sha256()
+        
+        try:
+            with open(path, 'rb') as source_file:
+                target = gzip.open(tmp_path, 'wb', compresslevel=6) if compress else open(tmp_path, 'wb')
+                with target:
+                    while True:
+                        chunk = source_file.read(BACKUP_CHUNK_SIZE)
+                        if not chunk:
+                            break
+                        digest.update(chunk)
+                        target.write(chunk)
+            
+            digest = digest.hexdigest()
+            existing = self.find_object(digest)
+            if existing is not None:
+                return digest, existing, False
+            
+            object_path = self.object_path(digest, compress)
+            os.makedirs(os.path.dirname(object_path), exist_ok=True)
+            os.replace(tmp_path, object_path)
+            return digest, compress, True
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+    
+    def run(self):
+        """Ejecutar un respaldo; devuelve la ruta del manifiesto vigente (None si no hay archivos)"""
+        manifests = self.list_manifests()
+        parent = manifests[-1] if manifests else None
+        previous = self.snapshot(parent) if parent else {}
+        
+        chain_length = 0
+        name = parent
+        while name:
+            chain_length += 1
+            name = self.load_manifest(name).get('parent')
+        full = parent is None or chain_length >= FULL_BACKUP_EVERY
+        
+        current = {}
+        changed = {}
+        stats = {'files': 0, 'bytes': 0, 'new_objects': 0, 'new_bytes': 0, 'rehashed': 0}
+        
+        for path, stat in self._scan():
+            stats['files'] += 1
+            stats['bytes'] += stat.st_size
+            
+            known = previous.get(path)
+            if known and known['size'] == stat.st_size and known['mtime_ns'] == stat.st_mtime_ns \
+                    and os.path.exists(self.object_path(known['sha256'], known['compressed'])):
+                current[path] = known
+                continue
+            
+            try:
+                digest, compressed, created = self._store(path)
+            except FileNotFoundError:
+                continue  # Eliminado durante el recorrido
+            
+            stats['rehashed'] += 1
+            if created:
+                stats['new_objects'] += 1
+                stats['new_bytes'] += stat.st_size
+            
+            entry = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'sha256': digest, 'compressed': compressed}
+            current[path] = entry
+            if known != entry:
+                changed[path] = entry
+        
+        deleted = sorted(set(previous) - set(current))
+        
+        if not full and not changed and not deleted:
+            self.logger.info("Respaldo incremental sin cambios")
+            return os.path.join(self.manifests_dir, parent)
+        
+        if not current and parent is None:
+            self.logger.info("No hay archivos para respaldar")
+            return None
+        
+        manifest = {
+            'version': 1,
+            'created': datetime.now().isoformat(),
+            'type': 'full' if full else 'incremental',
+            'parent': None if full else parent,
+            'sources': self.sources,
+            'files': current if full else changed,
+            'deleted': [] if full else deleted,
+            'stats': stats,
+        }
+        
+        name = f"{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}.json"
+        manifest_path = os.path.join(self.manifests_dir, name)
+        tmp_path = f'{manifest_path}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as manifest_file:
+            json.dump(manifest, manifest_file, separators=(',', ':'))
+        os.replace(tmp_path, manifest_path)
+        
+        self.logger.info(
+            f"Respaldo de archivos ({manifest['type']}): {stats['files']} archivos, "
+            f"{len(changed)} nuevos o modificados, {len(deleted)} eliminados, "
+            f"{stats['new_objects']} objetos nuevos ({stats['new_bytes'] / (1024 * 1024):.1f} MB)"
         )
-        handler.setLevel(LOG_LEVEL)
-        formatter = logging.Formatter(LOG_FORMAT)
-        handler.setFormatter(formatter)
+        return manifest_path
+    
+    def manifest_at(self, point_in_time=None):
+        """Último manifiesto anterior o igual al momento indicado"""
+        selected = None
+        for name in self.list_manifests():
+            if point_in_time is None or datetime.fromisoformat(self.load_manifest(name)['created']) <= point_in_time:
+                selected = name
+        return selected
+    
+    def restore(self, target_dir, point_in_time=None):
+        """Restaurar en target_dir los archivos tal como estaban en un momento dado; devuelve cuántos"""
+        name = self.manifest_at(point_in_time)
+        if name is None:
+            raise FileNotFoundError('No hay respaldos de archivos para el momento indicado')
+        
+        restored = 0
+        for path, entry in self.snapshot(name).items():
+            target = os.path.join(target_dir, path)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            tmp_path = f'{target}.restore'
+            digest = hashlib.sha256()
+            
+            object_path = self.object_path(entry['sha256'], entry['compressed'])
+            source = gzip.open(object_path, 'rb') if entry['compressed'] else open(object_path, 'rb')
+            with source, open(tmp_path, 'wb') as target_file:
+                while True:
+                    chunk = source.read(BACKUP_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    digest.update(chunk)
+                    target_file.write(chunk)
+            
+            if digest.hexdigest() != entry['sha256']:
+                os.remove(tmp_path)
+                raise ValueError(f'El objeto respaldado de {path} está dañado')
+            
+            os.replace(tmp_path, target)
+            os.utime(target, ns=(entry['mtime_ns'], entry['mtime_ns']))
+            restored += 1
+        
+        self.logger.info(f"Archivos restaurados desde {name}: {restored}")
+        return restored
+    
+    def prune(self, cutoff):
+        """Eliminar cadenas de manifiestos reemplazadas antes de cutoff y los objetos sin referencias"""
+        chains = []
+        for name in self.list_manifests():
+            manifest = self.load_manifest(name)
+            if manifest['type'] == 'full' or not chains:
+                chains.append([])
+            chains[-1].append((name, manifest))
+        
+        # Una cadena se puede eliminar si la siguiente ya cubre todo momento posterior a cutoff
+        removed = 0
+        for chain, following in zip(chains, chains[1:]):
+            if datetime.fromisoformat(following[0][1]['created']) <= cutoff:
+                for name, _ in chain:
+                    os.remove(os.path.join(self.manifests_dir, name))
+                    removed += 1
         
-        module_logger.addHandler(handler)
+        if not removed:
+            return 0
+        
+        referenced = set()
+        for name in self.list_manifests():
+            referenced.update(entry['sha256'] for entry in self.load_manifest(name)['files'].values())
+        
+        for shard in os.scandir(self.objects_dir):
+            if not shard.is_dir():
+                continue
+            for entry in os.scandir(shard.path):
+                if entry.name.split('.', 1)[0] not in referenced:
+                    os.remove(entry.path)
+        
+        self.logger.info(f"Manifiestos de respaldo eliminados: {removed}")
+        return removed
+
+def gzip_file(source_path, target_path):
+    """Comprimir un archivo en streaming (escritura atómica)"""
+    tmp_path = f'{target_path}.tmp'
+    try:
+        with open(source_path, 'rb') as source_file, gzip.open(tmp_path, 'wb', compresslevel=6) as target_file:
+            shutil.copyfileobj(source_file, target_file, BACKUP_CHUNK_SIZE)
+        os.replace(tmp_path, target_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+class SQLiteBackupStrategy:
+    """Respaldo consistente de SQLite sin detener la aplicación.
+    
+    'backup' usa la API de respaldo de SQLite por pasos de
+    SQLITE_BACKUP_PAGES_PER_STEP páginas dentro de una transacción de lectura;
+    'vacuum' usa VACUUM INTO, que copia una instantánea compactada. En modo WAL
+    ninguno de los dos bloquea a los escritores.
+    """
+    
+    extension = 'db.gz'
+    
+    def __init__(self, database_path, method=None):
+        self.database_path = database_path
+        self.method = method or SQLITE_BACKUP_METHOD
+    
+    def describe(self):
+        return self.database_path
+    
+    def dump(self, target_path):
+        if not os.path.exists(self.database_path):
+            raise FileNotFoundError(f"Base de datos no encontrada: {self.database_path}")
+        
+        snapshot_path = f'{target_path}.snapshot'
+        source = sqlite3.connect(f'file:{os.path.abspath(self.database_path)}?mode=ro', uri=True)
+        try:
+            if self.method == 'vacuum':
+                source.execute('VACUUM INTO ?', (snapshot_path,))
+            else:
+                # Sin una transacción de lectura abierta, cada escritura de otra
+                # conexión reinicia el respaldo y con tráfico constante nunca
+                # termina; así todos los pasos copian la misma versión (en WAL los
+                # escritores siguen trabajando mientras tanto)
+                source.execute('BEGIN')
+                source.execute('SELECT count(*) FROM sqlite_master').fetchone()
+                destination = sqlite3.connect(snapshot_path)
+                try:
+                    source.backup(
+                        destination,
+                        pages=SQLITE_BACKUP_PAGES_PER_STEP,
+                        sleep=SQLITE_BACKUP_STEP_SLEEP
+                    )
+                finally:
+                    destination.close()
+        finally:
+            source.close()
+        
+        try:
+            # La verificación se hace sobre la copia, no sobre la base en uso
+            check = sqlite3.connect(snapshot_path)
+            try:
+                result = check.execute('PRAGMA quick_check').fetchone()[0]
+            finally:
+                check.close()
+            if result != 'ok':
+                raise ValueError(f"La copia de la base de datos no es consistente: {result}")
+            
+            gzip_file(snapshot_path, target_path)
+        finally:
+            if os.path.exists(snapshot_path):
+                os.remove(snapshot_path)
+    
+    def restore(self, backup_path):
+        """Restaurar mediante la API de respaldo (respeta los bloqueos de las conexiones abiertas)"""
+        restored_path = f'{backup_path}.restore.db'
+        try:
+            if backup_path.endswith('.gz'):
+                with gzip.open(backup_path, 'rb') as source_file, open(restored_path, 'wb') as target_file:
+                    shutil.copyfileobj(source_file, target_file, BACKUP_CHUNK_SIZE)
+            else:
+                with zipfile.ZipFile(backup_path, 'r') as zipf:
+                    member = next(name for name in zipf.namelist() if name.endswith('.db'))
+                    with zipf.open(member) as source_file, open(restored_path, 'wb') as target_file:
+                        shutil.copyfileobj(source_file, target_file, BACKUP_CHUNK_SIZE)
+            
+            source = sqlite3.connect(restored_path)
+            destination = sqlite3.connect(self.database_path)
+            try:
+                source.backup(destination)
+            finally:
+                destination.close()
+                source.close()
+        finally:
+            if os.path.exists(restored_path):
+                os.remove(restored_path)
+
+class PostgresDumpStrategy:
+    """Respaldo de PostgreSQL con pg_dump en formato personalizado (ya comprimido).
+    
+    pg_dump trabaja sobre una instantánea MVCC, por lo que no bloquea a los
+    escritores.
+    """
+    
+    extension = 'dump'
+    
+    def __init__(self, database_uri):
+        # pg_dump no entiende el sufijo de driver de SQLAlchemy (postgresql+psycopg2://)
+        scheme, rest = database_uri.split('://', 1)
+        self.database_uri = f"{scheme.split('+', 1)[0]}://{rest}"
+    
+    def describe(self):
+        return self.database_uri.rsplit('@', 1)[-1]
+    
+    def dump(self, target_path):
+        tmp_path = f'{target_path}.tmp'
+        try:
+            subprocess.run(
+                ['pg_dump', '--format=custom', '--no-owner', '--file', tmp_path, '--dbname', self.database_uri],
+                check=True, capture_output=True, timeout=6 * 3600
+            )
+            os.replace(tmp_path, target_path)
+        except subprocess.CalledProcessError as e:
+            raise RuntimeError(f"pg_dump falló: {e.stderr.decode('utf-8', errors='replace').strip()}")
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+    
+    def restore(self, backup_path):
+        try:
+            subprocess.run(
+                ['pg_restore', '--clean', '--if-exists', '--no-owner', '--dbname', self.database_uri, backup_path],
+                check=True, capture_output=True, timeout=6 * 3600
+            )
+        except subprocess.CalledProcessError as e:
+            raise RuntimeError(f"pg_restore falló: {e.stderr.decode('utf-8', errors='replace').strip()}")
+
+def _sqlite_strategy(database_uri):
+    from sqlalchemy.engine import make_url
+    
+    database = make_url(database_uri).database
+    if not database or database == ':memory:':
+        return None
+    return SQLiteBackupStrategy(database)
+
+# Estrategias de respaldo por motor (se pueden agregar otras con register_backup_strategy)
+BACKUP_STRATEGIES = {
+    'sqlite': _sqlite_strategy,
+    'postgresql': PostgresDumpStrategy,
+}
+
+def register_backup_strategy(backend, factory):
+    """Registrar una estrategia de respaldo: factory(database_uri) -> objeto con dump() y restore()"""
+    BACKUP_STRATEGIES[backend] = factory
+
+def get_backup_strategy(database_uri=None):
+    """Estrategia de respaldo para la URI de la base de datos (o para los archivos SQLite conocidos)"""
+    if database_uri:
+        backend = database_uri.split(':', 1)[0].split('+', 1)[0]
+        if backend == 'postgres':
+            backend = 'postgresql'
+        factory = BACKUP_STRATEGIES.get(backend)
+        if factory is None:
+            raise ValueError(f"No hay estrategia de respaldo para el motor '{backend}'")
+        return factory(database_uri)
+    
+    for db_file in LEGACY_DB_FILES:
+        if os.path.exists(db_file):
+            return SQLiteBackupStrategy(db_file)
+    return None
 
 class BackupManager:
     """Gestor de respaldos automáticos"""
     
-    def __init__(self):
+    def __init__(self, database_uri=None):
         self.backup_dir = BACKUP_DIR
+        self.database_uri = database_uri
         self.logger = logging.getLogger('procurement_system.backup')
         os.makedirs(self.backup_dir, exist_ok=True)
     
     def create_database_backup(self):
-        """Crear respaldo de la base de datos"""
+        """Crear respaldo consistente de la base de datos sin detener la aplicación"""
         try:
-            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-            backup_filename = f'db_backup_{timestamp}.db'
-            backup_path = os.path.join(self.backup_dir, backup_filename)
-            
-            # Buscar archivo de base de datos
-            db_files = ['procurement.db', 'src/procurement.db', 'instance/procurement.db']
-            source_db = None
-            
-            for db_file in db_files:
-                if os.path.exists(db_file):
-                    source_db = db_file
-                    break
-            
-            if not source_db:
+            strategy = get_backup_strategy(self.database_uri)
+            if strategy is None:
                 self.logger.warning("No se encontró archivo de base de datos para respaldar")
                 return None
             
-            # Crear respaldo
-            shutil.copy2(source_db, backup_path)
-            
-            # Comprimir respaldo
-            zip_path = backup_path + '.zip'
-            with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
-                zipf.write(backup_path, backup_filename)
+            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+            backup_path = os.path.join(self.backup_dir, f'db_backup_{timestamp}.{strategy.extension}')
             
-            # Eliminar archivo sin comprimir
-            os.remove(backup_path)
+            started = time.monotonic()
+            strategy.dump(backup_path)
             
-            self.logger.info(f"Respaldo de base de datos creado: {zip_path}")
-            return zip_path
+            self.logger.info(
+                f"Respaldo de base de datos creado: {backup_path} "
+                f"({strategy.describe()}, {time.monotonic() - started:.1f}s)"
+            )
+            return backup_path
             
         except Exception as e:
             self.logger.error(f"Error creando respaldo de base de datos: {str(e)}")
             return None
     
     def create_files_backup(self):
-        """Crear respaldo de archivos subidos"""
+        """Crear respaldo incremental de archivos subidos; devuelve la ruta del manifiesto"""
         try:
-            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-            backup_filename = f'files_backup_{timestamp}.zip'
-            backup_path = os.path.join(self.backup_dir, backup_filename)
-            
-            # Directorios a respaldar
-            dirs_to_backup = ['src/uploads', 'uploads']
-            
-            with zipfile.ZipFile(backup_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
-                for backup_dir in dirs_to_backup:
-                    if os.path.exists(backup_dir):
-                        for root, dirs, files in os.walk(backup_dir):
-                            for file in files:
-                                file_path = os.path.join(root, file)
-                                arcname = os.path.relpath(file_path, os.path.dirname(backup_dir))
-                                zipf.write(file_path, arcname)
-            
-            # Verificar que el archivo no esté vacío
-            if os.path.getsize(backup_path) > 0:
-                self.logger.info(f"Respaldo de archivos creado: {backup_path}")
-                return backup_path
-            else:
-                os.remove(backup_path)
-                self.logger.info("No hay archivos para respaldar")
-                return None
-                
+            return IncrementalFileBackup(self.backup_dir).run()
         except Exception as e:
             self.logger.error(f"Error creando respaldo de archivos: {str(e)}")
             return None
     
+    def restore_files(self, target_dir, point_in_time=None):
+        """Restaurar los archivos subidos tal como estaban en un momento dado (por defecto, el último)"""
+        try:
+            return IncrementalFileBackup(self.backup_dir).restore(target_dir, point_in_time)
+        except Exception as e:
+            self.logger.error(f"Error restaurando archivos: {str(e)}")
+            return None
+    
     def cleanup_old_backups(self):
         """Limpiar respaldos antiguos"""
         try:
@@ -180,6 +769,9 @@ class BackupManager:
                         deleted_count += 1
                         self.logger.info(f"Respaldo antiguo eliminado: {filename}")
             
+            # Respaldos incrementales: cadenas de manifiestos ya reemplazadas y objetos sin uso
+            deleted_count += IncrementalFileBackup(self.backup_dir).prune(cutoff_date)
+            
             if deleted_count > 0:
                 self.logger.info(f"Limpieza completada: {deleted_count} respaldos eliminados")
             
@@ -192,114 +784,189 @@ class BackupManager:
             if not os.path.exists(backup_path):
                 raise FileNotFoundError(f"Archivo de respaldo no encontrado: {backup_path}")
             
-            # Crear respaldo de seguridad antes de restaurar
-            current_backup = self.create_database_backup()
+            strategy = get_backup_strategy(self.database_uri) or SQLiteBackupStrategy(LEGACY_DB_FILES[0])
             
-            # Extraer y restaurar
-            with zipfile.ZipFile(backup_path, 'r') as zipf:
-                zipf.extractall(self.backup_dir)
-                
-                # Buscar archivo de base de datos extraído
-                for filename in zipf.namelist():
-                    if filename.endswith('.db'):
-                        extracted_path = os.path.join(self.backup_dir, filename)
-                        
-                        # Restaurar a ubicación principal
-                        target_paths = ['procurement.db', 'src/procurement.db']
-                        for target in target_paths:
-                            if os.path.exists(os.path.dirname(target)) or target == 'procurement.db':
-                                shutil.copy2(extracted_path, target)
-                                self.logger.info(f"Base de datos restaurada desde: {backup_path}")
-                                break
-                        
-                        # Limpiar archivo temporal
-                        os.remove(extracted_path)
-                        return True
+            # Crear respaldo de seguridad antes de restaurar
+            self.create_database_backup()
             
-            return False
+            strategy.restore(backup_path)
+            self.logger.info(f"Base de datos restaurada desde: {backup_path}")
+            return True
             
         except Exception as e:
             self.logger.error(f"Error restaurando base de datos: {str(e)}")
             return False
 
 class SystemMonitor:
-    """Monitor del estado del sistema"""
+    """Sondeos del estado del sistema (cada uno devuelve un diccionario con 'status')"""
     
     @staticmethod
-    def get_system_status():
-        """Obtener estado completo del sistema"""
-        logger = logging.getLogger('procurement_system.monitoring')
+    def check_disk():
+        """Espacio libre en disco"""
+        disk_usage = psutil.disk_usage('.')
+        disk_free_gb = disk_usage.free / (1024**3)
+        disk_percent = (disk_usage.used / disk_usage.total) * 100
         
+        return {
+            'status': 'healthy' if disk_free_gb > 1 else 'warning',
+            'free_gb': round(disk_free_gb, 2),
+            'used_percent': round(disk_percent, 1),
+            'message': f'{disk_free_gb:.1f} GB libres ({disk_percent:.1f}% usado)'
+        }
+    
+    @staticmethod
+    def check_memory():
+        """Uso de memoria"""
+        memory = psutil.virtual_memory()
+        memory_percent = memory.percent
+        
+        return {
+            'status': 'healthy' if memory_percent < 80 else 'warning',
+            'used_percent': memory_percent,
+            'available_gb': round(memory.available / (1024**3), 2),
+            'message': f'{memory_percent:.1f}% de memoria en uso'
+        }
+    
+    @staticmethod
+    def check_cpu():
+        """Uso de CPU desde la llamada anterior (no bloquea)"""
+        cpu_percent = psutil.cpu_percent(interval=None)
+        
+        return {
+            'status': 'healthy' if cpu_percent < 80 else 'warning',
+            'usage_percent': cpu_percent,
+            'message': f'{cpu_percent:.1f}% de CPU en uso'
+        }
+    
+    @staticmethod
+    def check_directories():
+        """Directorios críticos"""
+        dirs_status = []
+        for directory in CRITICAL_DIRS:
+            if os.path.exists(directory):
+                dirs_status.append(f'{directory}: OK')
+            else:
+                dirs_status.append(f'{directory}: FALTANTE')
+        
+        return {
+            'status': 'healthy' if all('OK' in d for d in dirs_status) else 'warning',
+            'details': dirs_status
+        }
+    
+    @staticmethod
+    def _legacy_database_path():
+        for db_file in LEGACY_DB_FILES:
+            if os.path.exists(db_file):
+                return db_file
+        return None
+    
+    @staticmethod
+    def check_database_health(engine=None):
+        """Conexión a la base de datos y presencia de las tablas principales (sin recorrer datos)"""
         try:
-            status = {
-                'timestamp': datetime.now().isoformat(),
-                'overall_status': 'healthy',
-                'checks': {}
-            }
+            if engine is not None:
+                from sqlalchemy import inspect
+                
+                with engine.connect() as connection:
+                    connection.exec_driver_sql('SELECT 1')
+                    tables = inspect(connection).get_table_names()
+            else:
+                db_path = SystemMonitor._legacy_database_path()
+                if not db_path:
+                    return {
+                        'status': 'warning',
+                        'message': 'Archivo de base de datos no encontrado'
+                    }
+                conn = sqlite3.connect(db_path)
+                try:
+                    tables = [row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type='table'")]
+                finally:
+                    conn.close()
             
-            # Verificar espacio en disco
-            disk_usage = psutil.disk_usage('.')
-            disk_free_gb = disk_usage.free / (1024**3)
-            disk_percent = (disk_usage.used / disk_usage.total) * 100
+            missing_tables = [table for table in EXPECTED_TABLES if table not in tables]
+            if missing_tables:
+                return {
+                    'status': 'error',
+                    'message': f'Tablas faltantes: {", ".join(missing_tables)}'
+                }
             
-            status['checks']['disk_space'] = {
-                'status': 'healthy' if disk_free_gb > 1 else 'warning',
-                'free_gb': round(disk_free_gb, 2),
-                'used_percent': round(disk_percent, 1),
-                'message': f'{disk_free_gb:.1f} GB libres ({disk_percent:.1f}% usado)'
+            return {
+                'status': 'healthy',
+                'message': 'Base de datos funcionando correctamente',
+                'tables_count': len(tables)
             }
-            
-            # Verificar memoria
-            memory = psutil.virtual_memory()
-            memory_percent = memory.percent
-            
-            status['checks']['memory'] = {
-                'status': 'healthy' if memory_percent < 80 else 'warning',
-                'used_percent': memory_percent,
-                'available_gb': round(memory.available / (1024**3), 2),
-                'message': f'{memory_percent:.1f}% de memoria en uso'
+                
+        except Exception as e:
+            return {
+                'status': 'error',
+                'message': f'Error verificando base de datos: {str(e)}'
             }
+    
+    @staticmethod
+    def check_database_integrity(engine=None, full=False):
+        """Integridad de SQLite: quick_check, o integrity_check completo con full=True (recorre toda la base)"""
+        pragma = 'PRAGMA integrity_check' if full else 'PRAGMA quick_check'
+        try:
+            if engine is not None:
+                if engine.dialect.name != 'sqlite':
+                    return {'status': 'healthy', 'message': f'No aplica para {engine.dialect.name}'}
+                with engine.connect() as connection:
+                    integrity_result = connection.exec_driver_sql(pragma).scalar()
+            else:
+                db_path = SystemMonitor._legacy_database_path()
+                if not db_path:
+                    return {'status': 'warning', 'message': 'Archivo de base de datos no encontrado'}
+                conn = sqlite3.connect(db_path)
+                try:
+                    integrity_result = conn.execute(pragma).fetchone()[0]
+                finally:
+                    conn.close()
             
-            # Verificar CPU
-            cpu_percent = psutil.cpu_percent(interval=1)
-            
-            status['checks']['cpu'] = {
-                'status': 'healthy' if cpu_percent < 80 else 'warning',
-                'usage_percent': cpu_percent,
-                'message': f'{cpu_percent:.1f}% de CPU en uso'
+            if integrity_result == 'ok':
+                return {'status': 'healthy', 'message': 'Integridad verificada', 'full': full}
+            return {
+                'status': 'error',
+                'message': f'Problemas de integridad: {integrity_result}',
+                'full': full
             }
-            
-            # Verificar directorios críticos
-            critical_dirs = ['src/uploads', 'src/logs', 'backups']
-            dirs_status = []
-            
-            for directory in critical_dirs:
-                if os.path.exists(directory):
-                    dirs_status.append(f'{directory}: OK')
-                else:
-                    dirs_status.append(f'{directory}: FALTANTE')
-                    status['overall_status'] = 'warning'
-            
-            status['checks']['directories'] = {
-                'status': 'healthy' if all('OK' in d for d in dirs_status) else 'warning',
-                'details': dirs_status
+        
+        except Exception as e:
+            return {
+                'status': 'error',
+                'message': f'Error verificando integridad: {str(e)}'
             }
+    
+    @staticmethod
+    def overall_status(checks):
+        """Estado general a partir de los sondeos individuales"""
+        statuses = {check['status'] for check in checks.values()}
+        if 'error' in statuses:
+            return 'error'
+        if 'warning' in statuses:
+            return 'warning'
+        return 'healthy'
+    
+    @staticmethod
+    def get_system_status(engine=None, deep=False):
+        """Ejecutar todos los sondeos en el momento (deep agrega el integrity_check completo)"""
+        logger = logging.getLogger('procurement_system.monitoring')
+        
+        try:
+            checks = {
+                'disk_space': SystemMonitor.check_disk(),
+                'memory': SystemMonitor.check_memory(),
+                'cpu': SystemMonitor.check_cpu(),
+                'directories': SystemMonitor.check_directories(),
+                'database': SystemMonitor.check_database_health(engine),
+            }
+            if deep:
+                checks['database_integrity'] = SystemMonitor.check_database_integrity(engine, full=True)
             
-            # Verificar base de datos
-            db_status = SystemMonitor.check_database_health()
-            status['checks']['database'] = db_status
-            
-            # Determinar estado general
-            warning_checks = [check for check in status['checks'].values() 
-                            if check['status'] == 'warning']
-            error_checks = [check for check in status['checks'].values() 
-                          if check['status'] == 'error']
-            
-            if error_checks:
-                status['overall_status'] = 'error'
-            elif warning_checks:
-                status['overall_status'] = 'warning'
-            
+            status = {
+                'timestamp': datetime.now().isoformat(),
+                'overall_status': SystemMonitor.overall_status(checks),
+                'checks': checks
+            }
             logger.info(f"Verificación de estado completada: {status['overall_status']}")
             return status
             
@@ -310,67 +977,135 @@ class SystemMonitor:
                 'overall_status': 'error',
                 'error': str(e)
             }
+
+class HealthMonitor:
+    """Estado de salud calculado en segundo plano y servido desde memoria.
     
-    @staticmethod
-    def check_database_health():
-        """Verificar salud de la base de datos"""
+    Un hilo por worker ejecuta los sondeos livianos cada probe_interval
+    segundos y el quick_check de SQLite cada integrity_interval; get_status()
+    solo copia el último resultado, por lo que /health responde sin tocar el
+    disco ni la base de datos. deep_check() ejecuta todo en el momento,
+    incluido el integrity_check completo, y las llamadas concurrentes
+    comparten una misma ejecución.
+    """
+    
+    def __init__(self, engine=None, probe_interval=HEALTH_PROBE_INTERVAL, integrity_interval=HEALTH_INTEGRITY_INTERVAL):
+        self.engine = engine
+        self.probe_interval = probe_interval
+        self.integrity_interval = integrity_interval
+        self.logger = logging.getLogger('procurement_system.monitoring')
+        self.probes = {
+            'disk_space': SystemMonitor.check_disk,
+            'memory': SystemMonitor.check_memory,
+            'cpu': SystemMonitor.check_cpu,
+            'directories': SystemMonitor.check_directories,
+            'database': lambda: SystemMonitor.check_database_health(self.engine),
+        }
+        self._checks = {}
+        self._updated = None
+        self._timestamp = None
+        self._last_integrity = None
+        self._last_deep = None
+        self._lock = threading.Lock()
+        self._deep_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+    
+    def _run_probe(self, func):
+        started = time.perf_counter()
         try:
-            # Buscar archivo de base de datos
-            db_files = ['procurement.db', 'src/procurement.db', 'instance/procurement.db']
-            db_path = None
-            
-            for db_file in db_files:
-                if os.path.exists(db_file):
-                    db_path = db_file
-                    break
-            
-            if not db_path:
-                return {
-                    'status': 'warning',
-                    'message': 'Archivo de base de datos no encontrado'
-                }
-            
-            # Verificar integridad
-            conn = sqlite3.connect(db_path)
-            cursor = conn.cursor()
-            
-            # Verificar que las tablas principales existan
-            cursor.execute("SELECT name FROM sqlite_master WHERE type='table'")
-            tables = [row[0] for row in cursor.fetchall()]
-            
-            expected_tables = ['suppliers', 'processes', 'bids', 'documents', 'alerts']
-            missing_tables = [table for table in expected_tables if table not in tables]
-            
-            if missing_tables:
-                conn.close()
-                return {
-                    'status': 'error',
-                    'message': f'Tablas faltantes: {", ".join(missing_tables)}'
-                }
-            
-            # Verificar integridad de la base de datos
-            cursor.execute("PRAGMA integrity_check")
-            integrity_result = cursor.fetchone()[0]
-            
-            conn.close()
-            
-            if integrity_result == 'ok':
-                return {
-                    'status': 'healthy',
-                    'message': 'Base de datos funcionando correctamente',
-                    'tables_count': len(tables)
-                }
-            else:
-                return {
-                    'status': 'error',
-                    'message': f'Problemas de integridad: {integrity_result}'
-                }
-                
+            result = func()
         except Exception as e:
+            result = {'status': 'error', 'message': str(e)}
+        result['duration_ms'] = round((time.perf_counter() - started) * 1000, 1)
+        return result
+    
+    def refresh(self, integrity=False, full=False):
+        """Ejecutar los sondeos y reemplazar el estado guardado"""
+        checks = {name: self._run_probe(func) for name, func in self.probes.items()}
+        if integrity:
+            checks['database_integrity'] = self._run_probe(
+                lambda: SystemMonitor.check_database_integrity(self.engine, full=full)
+            )
+        
+        with self._lock:
+            if not integrity and 'database_integrity' in self._checks:
+                # Conservar el último resultado de integridad hasta el próximo chequeo
+                checks['database_integrity'] = self._checks['database_integrity']
+            previous = SystemMonitor.overall_status(self._checks) if self._checks else None
+            self._checks = checks
+            self._updated = time.monotonic()
+            self._timestamp = datetime.now().isoformat()
+            if integrity:
+                self._last_integrity = self._updated
+        
+        current = SystemMonitor.overall_status(checks)
+        if current != previous:
+            failing = {name: check.get('message') for name, check in checks.items() if check['status'] != 'healthy'}
+            log = self.logger.info if current == 'healthy' else self.logger.warning
+            log(f"Estado del sistema: {current} {failing if failing else ''}".rstrip())
+    
+    def get_status(self):
+        """Último estado calculado (no ejecuta sondeos)"""
+        with self._lock:
+            checks = dict(self._checks)
+            updated = self._updated
+            timestamp = self._timestamp
+        
+        if updated is None:
             return {
-                'status': 'error',
-                'message': f'Error verificando base de datos: {str(e)}'
+                'timestamp': datetime.now().isoformat(),
+                'overall_status': 'starting',
+                'checks': {}
             }
+        
+        age = time.monotonic() - updated
+        status = {
+            'timestamp': timestamp,
+            'age_seconds': round(age, 1),
+            'overall_status': SystemMonitor.overall_status(checks),
+            'checks': checks
+        }
+        if self._thread is not None and age > self.probe_interval * HEALTH_STALE_INTERVALS:
+            status['overall_status'] = 'error'
+            status['message'] = f'Sin sondeos desde hace {age:.0f} segundos'
+        return status
+    
+    def deep_check(self):
+        """Ejecutar todos los sondeos ahora, con integrity_check completo"""
+        requested = time.monotonic()
+        with self._deep_lock:
+            # Si otra petición terminó un chequeo mientras se esperaba, reutilizarlo
+            if self._last_deep is None or self._last_deep < requested:
+                self.refresh(integrity=True, full=True)
+                self._last_deep = time.monotonic()
+        return self.get_status()
+    
+    def _loop(self):
+        while not self._stop.wait(self.probe_interval):
+            integrity_due = (
+                self._last_integrity is None or
+                time.monotonic() - self._last_integrity >= self.integrity_interval
+            )
+            try:
+                self.refresh(integrity=integrity_due)
+            except Exception as e:
+                self.logger.error(f"Error en sondeo de salud: {str(e)}")
+    
+    def start(self):
+        """Primer sondeo liviano y arranque del hilo (una vez por worker)"""
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._loop, name='health-monitor', daemon=True)
+        
+        # La primera medición de CPU solo fija la referencia
+        psutil.cpu_percent(interval=None)
+        self.refresh()
+        self._thread.start()
+    
+    def stop(self):
+        self._stop.set()
 
 class ErrorHandler:
     """Manejador centralizado de errores"""
@@ -457,8 +1192,10 @@ def create_monitoring_endpoint(app):
 # Exportar funciones principales
 __all__ = [
     'setup_logging',
+    'init_request_logging',
     'BackupManager', 
     'SystemMonitor',
+    'HealthMonitor',
     'ErrorHandler',
     'initialize_robustness'
 ]
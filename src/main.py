@@ -6,36 +6,50 @@ from datetime import datetime
 # Agregar el directorio raíz al path
 sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
 
-from flask import Flask, send_from_directory, jsonify, session
+from flask import Flask, Response, request, send_from_directory, jsonify, session
 from flask_cors import CORS
-from src.models.database import db
+from config import get_config
+from src.models.database import db, configure_engine, ensure_columns, ensure_indexes
 from src.models.models import *
 from src.models.excel_models import *
+from src.services.deadline_engine import dismiss_duplicate_alerts
+from src.services.alert_store import backfill_archive_alert_ids, backfill_priority_ranks
+from src.services.deadline_timer import init_deadline_timer
+from src.services import live_counters, document_search, storage_usage, request_metrics, query_diagnostics, profiler
+from src.services.blob_store import shard_flat_blobs
 from src.routes.suppliers import suppliers_bp
 from src.routes.processes import processes_bp
 from src.routes.documents import documents_bp
 from src.routes.bids import bids_bp
 from src.routes.alerts import alerts_bp
 from src.routes.reports import reports_bp
-from src.routes.alerts_scheduler import alerts_scheduler_bp
+from src.routes.alerts_scheduler import alerts_scheduler_bp, init_scheduler
+from src.routes.events import events_bp
 from src.routes.excel_routes import excel_bp
 from src.routes.auth import auth_bp, login_required
 
-# Configuración de logging básico
 import logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger('procurement_system')
 
-# Robustness setup (opcional)
+# Los pools 'spawn' (extracción de texto, PDF de informes) vuelven a importar
+# este archivo como __mp_main__ en cada proceso hijo: ahí no se arranca nada
+SPAWNED_CHILD = __name__ == '__mp_main__'
+
+# Robustness setup (opcional): logging asíncrono en el logger raíz
 try:
-    from robustness_improvements import setup_logging, SystemMonitor, BackupManager
-    logger = setup_logging()
+    from robustness_improvements import setup_logging, init_request_logging, BackupManager, HealthMonitor
+    if not SPAWNED_CHILD:
+        logger = setup_logging()
     ROBUSTNESS_ENABLED = True
 except ImportError:
+    # Configuración de logging básico
+    logging.basicConfig(level=logging.INFO)
     ROBUSTNESS_ENABLED = False
     logger.warning("Robustness improvements not available")
 
 app = Flask(__name__, static_folder=os.path.join(os.path.dirname(__file__), 'static'))
+# Configuración por entorno (FLASK_ENV); los valores definidos abajo tienen prioridad
+app.config.from_object(get_config())
 app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'procurement_secret_key_2024_enhanced')
 
 # Configuración de base de datos
@@ -69,6 +83,7 @@ app.register_blueprint(bids_bp, url_prefix='/api/bids')
 app.register_blueprint(alerts_bp, url_prefix='/api/alerts')
 app.register_blueprint(reports_bp, url_prefix='/api/reports')
 app.register_blueprint(alerts_scheduler_bp, url_prefix='/api/alerts-scheduler')
+app.register_blueprint(events_bp, url_prefix='/api/events')
 app.register_blueprint(excel_bp, url_prefix='/api/excel')
 
 # Importar y registrar el nuevo blueprint de evaluación
@@ -83,13 +98,31 @@ app.register_blueprint(export_bp, url_prefix='/api/export')
 from src.routes.calendar import calendar_bp
 app.register_blueprint(calendar_bp, url_prefix='/api/calendar')
 
-# Inicializar DB
+# Identificador de petición (X-Request-ID) en los logs
+if ROBUSTNESS_ENABLED:
+    init_request_logging(app)
+
+# Métricas de latencia y consultas SQL por endpoint (/api/system/metrics)
+request_metrics.init_app(app)
+
+# Registro de consultas lentas y detector de N+1 (solo con QUERY_DIAGNOSTICS=true)
+query_diagnostics.init_app(app)
+
+# Profiler por muestreo a pedido (cabecera X-Profile con sesión, o PROFILE_ENDPOINTS)
+profiler.init_app(app)
+
+# Inicializar DB (pool por worker y PRAGMAs de SQLite antes de crear el engine)
+configure_engine(app)
 db.init_app(app)
 
 # Inicializar backups si aplica
 if ROBUSTNESS_ENABLED:
     try:
-        backup_manager = BackupManager()
+        # La URL del engine ya tiene resuelta la ruta de SQLite dentro de instance/
+        with app.app_context():
+            backup_manager = BackupManager(database_uri=db.engine.url.render_as_string(hide_password=False))
+            # Sondeos de salud en segundo plano: /health solo lee el último resultado
+            health_monitor = HealthMonitor(engine=db.engine)
     except Exception as e:
         logger.warning(f"Backup manager initialization failed: {e}")
 
@@ -97,7 +130,7 @@ if ROBUSTNESS_ENABLED:
 def health_check():
     try:
         if ROBUSTNESS_ENABLED:
-            status = SystemMonitor.get_system_status()
+            status = health_monitor.get_status()
             return jsonify(status), 200 if status['overall_status'] == 'healthy' else 503
         else:
             return jsonify({'status': 'ok', 'message': 'Basic health check passed'}), 200
@@ -105,6 +138,19 @@ def health_check():
         logger.error(f"Health check failed: {str(e)}")
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
+@app.route('/health/deep')
+@login_required
+def deep_health_check():
+    """Ejecutar todos los sondeos ahora, incluido el integrity_check completo de SQLite"""
+    try:
+        if not ROBUSTNESS_ENABLED:
+            return jsonify({'status': 'ok', 'message': 'Basic health check passed'}), 200
+        status = health_monitor.deep_check()
+        return jsonify(status), 200 if status['overall_status'] == 'healthy' else 503
+    except Exception as e:
+        logger.error(f"Deep health check failed: {str(e)}")
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
 @app.route('/api/system/backup', methods=['POST'])
 def create_backup():
     try:
@@ -129,7 +175,7 @@ def create_backup():
 def system_status():
     try:
         if ROBUSTNESS_ENABLED:
-            status = SystemMonitor.get_system_status()
+            status = health_monitor.get_status()
         else:
             status = {
                 'timestamp': datetime.now().isoformat(),
@@ -141,6 +187,17 @@ def system_status():
         logger.error(f"System status check failed: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/system/metrics')
+def system_metrics():
+    """Histogramas por endpoint en formato Prometheus (?format=json para un resumen con cuantiles)"""
+    try:
+        if request.args.get('format') == 'json':
+            return jsonify(request_metrics.summary())
+        return Response(request_metrics.render_prometheus(), mimetype='text/plain; version=0.0.4; charset=utf-8')
+    except Exception as e:
+        logger.error(f"Metrics export failed: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
 @app.errorhandler(404)
 def not_found(error):
     logger.warning(f"404 error: {error}")
@@ -156,23 +213,53 @@ def file_too_large(error):
     logger.warning(f"File too large: {error}")
     return jsonify({'error': 'Archivo muy grande. Máximo 16MB permitido'}), 413
 
-# Inicialización de la base de datos
-with app.app_context():
-    try:
-        db.create_all()
-        logger.info("Database tables created successfully")
+def start_application(app):
+    """Preparar la base de datos y arrancar las tareas en segundo plano del worker"""
+    # Inicialización de la base de datos
+    with app.app_context():
+        try:
+            db.create_all()
+            ensure_columns()
+            backfill_priority_ranks()
+            backfill_archive_alert_ids()
+            dismiss_duplicate_alerts()
+            ensure_indexes()
+            document_search.ensure_search_index()
+            shard_flat_blobs()
+            storage_usage.ensure_usage()
+            logger.info("Database tables created successfully")
+    
+            if ROBUSTNESS_ENABLED:
+                try:
+                    # Sondeo liviano inicial; el quick_check corre luego en el hilo de salud
+                    health_monitor.start()
+                    status = health_monitor.get_status()
+                    if status['overall_status'] != 'healthy':
+                        logger.warning(f"System health issues detected: {status}")
+                    backup_manager.cleanup_old_backups()
+                except Exception as e:
+                    logger.warning(f"Robustness checks failed: {e}")
+        except Exception as e:
+            logger.error(f"Application initialization failed: {str(e)}")
+            raise
+    
+    # Indexación de texto de documentos en segundo plano (registra su barrido en el scheduler)
+    document_search.start(app)
+    
+    # Conciliación diaria del almacenamiento de documentos
+    storage_usage.schedule_reconciliation()
+    
+    # Scheduler de alertas: todos los workers lo arrancan, solo el líder ejecuta las tareas
+    init_scheduler(app)
+    
+    # Alertas de vencimiento en el momento exacto en que se cruza cada umbral
+    init_deadline_timer(app)
+    
+    # Contadores en vivo para los clientes conectados a /api/events/stream
+    live_counters.start(app)
 
-        if ROBUSTNESS_ENABLED:
-            try:
-                status = SystemMonitor.get_system_status()
-                if status['overall_status'] != 'healthy':
-                    logger.warning(f"System health issues detected: {status}")
-                backup_manager.cleanup_old_backups()
-            except Exception as e:
-                logger.warning(f"Robustness checks failed: {e}")
-    except Exception as e:
-        logger.error(f"Application initialization failed: {str(e)}")
-        raise
+if not SPAWNED_CHILD:
+    start_application(app)
 
 @app.route('/', defaults={'path': ''})
 @app.route('/<path:path>')
@@ -1,12 +1,156 @@
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event
+from sqlalchemy.engine import Engine, make_url
+import logging
+import os
+import sqlite3
+
+logger = logging.getLogger(__name__)
 
 db = SQLAlchemy()
 
+# Pool de conexiones por worker de gunicorn (WEB_CONCURRENCY procesos con WEB_THREADS hilos)
+DEFAULT_WEB_THREADS = 8
+BACKGROUND_CONNECTIONS = 3  # Scheduler, sondeos de salud, indexación y contadores en vivo
+POOL_TIMEOUT = 10
+DB_MAX_CONNECTIONS = int(os.environ.get('DB_MAX_CONNECTIONS', 0))  # Límite del servidor para todos los workers (0 = sin límite)
+
+# PRAGMAs aplicados a cada conexión SQLite nueva
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',  # Los lectores no bloquean al escritor ni al revés
+    'synchronous': 'NORMAL',  # Seguro con WAL; evita un fsync por transacción
+    'busy_timeout': int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', 15000)),  # Esperar el bloqueo en vez de fallar
+    'mmap_size': int(os.environ.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024)),
+    'cache_size': -int(os.environ.get('SQLITE_CACHE_SIZE_KB', 16 * 1024)),  # Negativo = KiB por conexión
+}
+
+# Índices reemplazados por otros con distinta definición (se eliminan al arrancar)
+OBSOLETE_INDEXES = (
+    'uq_alerts_active_process_type',  # Incluía las alertas manuales
+)
+
+_pragmas_installed = False
+
+def web_concurrency():
+    """Procesos y hilos por proceso con que corre gunicorn"""
+    workers = max(int(os.environ.get('WEB_CONCURRENCY', 1)), 1)
+    threads = max(int(os.environ.get('WEB_THREADS', DEFAULT_WEB_THREADS)), 1)
+    return workers, threads
+
+def pool_options():
+    """Tamaño del pool de cada worker: un hilo por conexión más las tareas en segundo plano"""
+    workers, threads = web_concurrency()
+    pool_size = threads + BACKGROUND_CONNECTIONS
+    
+    if DB_MAX_CONNECTIONS:
+        # Repartir el máximo del servidor entre los workers
+        per_worker = max(DB_MAX_CONNECTIONS // workers, 1)
+        pool_size = min(pool_size, per_worker)
+        max_overflow = per_worker - pool_size
+    else:
+        max_overflow = threads
+    
+    return {'pool_size': pool_size, 'max_overflow': max_overflow, 'pool_timeout': POOL_TIMEOUT}
+
+def engine_options(database_uri, configured=None):
+    """Opciones del engine: las de la configuración más el tamaño del pool"""
+    options = dict(configured or {})
+    url = make_url(database_uri)
+    
+    # SQLite en memoria usa un pool de una sola conexión
+    if url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:'):
+        return options
+    
+    for key, value in pool_options().items():
+        options.setdefault(key, value)
+    return options
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    if not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+    
+    cursor = dbapi_connection.cursor()
+    try:
+        for name, value in SQLITE_PRAGMAS.items():
+            cursor.execute(f'PRAGMA {name}={value}')
+    finally:
+        cursor.close()
+
+def install_sqlite_pragmas():
+    """Aplicar SQLITE_PRAGMAS a cada conexión SQLite (también las del almacén del scheduler)"""
+    global _pragmas_installed
+    if not _pragmas_installed:
+        event.listen(Engine, 'connect', _set_sqlite_pragmas)
+        _pragmas_installed = True
+
+def configure_engine(app):
+    """Completar SQLALCHEMY_ENGINE_OPTIONS antes de db.init_app (que crea el engine)"""
+    options = engine_options(app.config['SQLALCHEMY_DATABASE_URI'], app.config.get('SQLALCHEMY_ENGINE_OPTIONS'))
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = options
+    install_sqlite_pragmas()
+    
+    workers, threads = web_concurrency()
+    logger.info(
+        f"Database pool: pool_size={options.get('pool_size')} max_overflow={options.get('max_overflow')} "
+        f"({workers} workers x {threads} threads)"
+    )
+
 def init_db(app):
     """Inicializar la base de datos con la aplicación Flask"""
+    configure_engine(app)
     db.init_app(app)
     
     with app.app_context():
         db.create_all()
         print("Base de datos inicializada correctamente")
 
+def dialect_insert(model):
+    """Construir un INSERT con soporte ON CONFLICT para el motor actual (None si no aplica)"""
+    dialect_name = db.engine.dialect.name
+    
+    if dialect_name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect_name == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        return None
+    
+    return insert(model)
+
+def ensure_indexes():
+    """Crear los índices declarados en los modelos que falten en tablas ya existentes"""
+    for name in OBSOLETE_INDEXES:
+        try:
+            with db.engine.begin() as connection:
+                connection.execute(db.text(f'DROP INDEX IF EXISTS {name}'))
+        except Exception as e:
+            logger.warning(f"Could not drop index {name}: {str(e)}")
+    
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            try:
+                index.create(bind=db.engine, checkfirst=True)
+            except Exception as e:
+                logger.warning(f"Could not create index {index.name}: {str(e)}")
+
+def ensure_columns():
+    """Agregar a tablas existentes las columnas nuevas declaradas en los modelos (como nulas)"""
+    inspector = db.inspect(db.engine)
+    preparer = db.engine.dialect.identifier_preparer
+    
+    for table in db.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        
+        existing = {column['name'] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            
+            column_type = column.type.compile(dialect=db.engine.dialect)
+            with db.engine.begin() as connection:
+                connection.execute(db.text(
+                    f'ALTER TABLE {preparer.format_table(table)} '
+                    f'ADD COLUMN {preparer.format_column(column)} {column_type}'
+                ))
+            logger.info(f"Column added: {table.name}.{column.name}")
@@ -4,6 +4,11 @@ from src.models.database import db
 class ExcelProcessTracking(db.Model):
     """Modelo para seguimiento de procesos desde Excel"""
     __tablename__ = 'excel_process_tracking'
+    __table_args__ = (
+        db.Index('ix_excel_process_tracking_upload', 'upload_date', 'id'),
+        db.Index('ix_excel_process_tracking_process_upload', 'process_number', 'upload_date', 'id'),
+        db.Index('ix_excel_process_tracking_status_upload', 'status', 'upload_date', 'id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     process_number = db.Column(db.String(50), nullable=False)
@@ -35,6 +40,11 @@ class ExcelProcessTracking(db.Model):
 class ExcelTechnicalEvaluation(db.Model):
     """Modelo para evaluación técnica desde Excel"""
     __tablename__ = 'excel_technical_evaluation'
+    __table_args__ = (
+        db.Index('ix_excel_technical_evaluation_upload', 'upload_date', 'id'),
+        db.Index('ix_excel_technical_evaluation_process_upload', 'process_number', 'upload_date', 'id'),
+        db.Index('ix_excel_technical_evaluation_supplier_upload', 'supplier_name', 'upload_date', 'id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     process_number = db.Column(db.String(50), nullable=False)
@@ -62,6 +72,11 @@ class ExcelTechnicalEvaluation(db.Model):
 class ExcelCommercialComparison(db.Model):
     """Modelo para comparación comercial desde Excel"""
     __tablename__ = 'excel_commercial_comparison'
+    __table_args__ = (
+        db.Index('ix_excel_commercial_comparison_upload', 'upload_date', 'id'),
+        db.Index('ix_excel_commercial_comparison_process_upload', 'process_number', 'upload_date', 'id'),
+        db.Index('ix_excel_commercial_comparison_supplier_upload', 'supplier_name', 'upload_date', 'id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     process_number = db.Column(db.String(50), nullable=False)
@@ -93,6 +108,11 @@ class ExcelCommercialComparison(db.Model):
 class ExcelSupplierEvaluation(db.Model):
     """Modelo para evaluación de proveedores desde Excel"""
     __tablename__ = 'excel_supplier_evaluation'
+    __table_args__ = (
+        db.Index('ix_excel_supplier_evaluation_upload', 'upload_date', 'id'),
+        db.Index('ix_excel_supplier_evaluation_supplier_upload', 'supplier_name', 'upload_date', 'id'),
+        db.Index('ix_excel_supplier_evaluation_category_upload', 'evaluation_category', 'upload_date', 'id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     supplier_name = db.Column(db.String(200), nullable=False)
@@ -122,6 +142,11 @@ class ExcelSupplierEvaluation(db.Model):
 class ExcelSavingsAnalysis(db.Model):
     """Modelo para análisis de ahorros desde Excel"""
     __tablename__ = 'excel_savings_analysis'
+    __table_args__ = (
+        db.Index('ix_excel_savings_analysis_upload', 'upload_date', 'id'),
+        db.Index('ix_excel_savings_analysis_process_upload', 'process_number', 'upload_date', 'id'),
+        db.Index('ix_excel_savings_analysis_category_upload', 'category', 'upload_date', 'id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     process_number = db.Column(db.String(50), nullable=False)
@@ -149,6 +174,12 @@ class ExcelSavingsAnalysis(db.Model):
 class ExcelQuestionsAnswers(db.Model):
     """Modelo para consultas y respuestas desde Excel"""
     __tablename__ = 'excel_questions_answers'
+    __table_args__ = (
+        db.Index('ix_excel_questions_answers_upload', 'upload_date', 'id'),
+        db.Index('ix_excel_questions_answers_process_upload', 'process_number', 'upload_date', 'id'),
+        db.Index('ix_excel_questions_answers_supplier_upload', 'supplier_name', 'upload_date', 'id'),
+        db.Index('ix_excel_questions_answers_status_upload', 'status', 'upload_date', 'id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     process_number = db.Column(db.String(50), nullable=False)
@@ -175,3 +206,38 @@ class ExcelQuestionsAnswers(db.Model):
             'upload_date': self.upload_date.isoformat() if self.upload_date else None
         }
 
+class ExcelAnalysisRollup(db.Model):
+    """Modelo para agregados precalculados de los análisis de Excel"""
+    __tablename__ = 'excel_analysis_rollups'
+    __table_args__ = (
+        db.UniqueConstraint('table_type', 'dimension', 'key', name='uq_excel_analysis_rollup'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    table_type = db.Column(db.String(50), nullable=False)
+    dimension = db.Column(db.String(50), nullable=False)  # supplier, criterion, item, category, total
+    key = db.Column(db.String(500), nullable=False, default='')
+    row_count = db.Column(db.Integer, nullable=False, default=0)
+    value_sum = db.Column(db.Float, nullable=False, default=0)
+    value_count = db.Column(db.Integer, nullable=False, default=0)  # Filas con la métrica no nula (para el promedio)
+    secondary_sum = db.Column(db.Float, nullable=False, default=0)
+    secondary_count = db.Column(db.Integer, nullable=False, default=0)
+    min_value = db.Column(db.Float)
+    min_label = db.Column(db.String(200))
+    updated_date = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'table_type': self.table_type,
+            'dimension': self.dimension,
+            'key': self.key,
+            'row_count': self.row_count,
+            'value_sum': self.value_sum,
+            'value_count': self.value_count,
+            'secondary_sum': self.secondary_sum,
+            'secondary_count': self.secondary_count,
+            'min_value': self.min_value,
+            'min_label': self.min_label,
+            'updated_date': self.updated_date.isoformat() if self.updated_date else None
+        }
@@ -37,6 +37,9 @@ class Supplier(db.Model):
 class Process(db.Model):
     """Modelo para procesos de compra/licitación"""
     __tablename__ = 'processes'
+    __table_args__ = (
+        db.Index('ix_processes_status_end_date', 'status', 'end_date'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     process_number = db.Column(db.String(50), unique=True, nullable=False)
@@ -106,6 +109,9 @@ class Bid(db.Model):
 class Document(db.Model):
     """Modelo para documentos"""
     __tablename__ = 'documents'
+    __table_args__ = (
+        db.Index('ix_documents_content_hash', 'content_hash'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     filename = db.Column(db.String(200), nullable=False)
@@ -113,6 +119,7 @@ class Document(db.Model):
     file_path = db.Column(db.String(500), nullable=False)
     file_size = db.Column(db.Integer)
     file_type = db.Column(db.String(50))
+    content_hash = db.Column(db.String(64))  # SHA-256 del contenido (almacén por contenido)
     document_type = db.Column(db.String(50))  # tender_specs, technical_proposal, commercial_proposal, contract
     process_id = db.Column(db.Integer, db.ForeignKey('processes.id'))
     supplier_id = db.Column(db.Integer, db.ForeignKey('suppliers.id'))
@@ -127,6 +134,7 @@ class Document(db.Model):
             'file_path': self.file_path,
             'file_size': self.file_size,
             'file_type': self.file_type,
+            'content_hash': self.content_hash,
             'document_type': self.document_type,
             'process_id': self.process_id,
             'supplier_id': self.supplier_id,
@@ -136,21 +144,132 @@ class Document(db.Model):
             'supplier_name': self.supplier.name if self.supplier else None
         }
 
+class UploadSession(db.Model):
+    """Modelo para subidas de documentos por partes (reanudables)"""
+    __tablename__ = 'upload_sessions'
+    
+    id = db.Column(db.String(32), primary_key=True)
+    original_filename = db.Column(db.String(200), nullable=False)
+    file_type = db.Column(db.String(50))
+    document_type = db.Column(db.String(50))
+    description = db.Column(db.Text)
+    process_id = db.Column(db.Integer, db.ForeignKey('processes.id'))
+    supplier_id = db.Column(db.Integer, db.ForeignKey('suppliers.id'))
+    total_size = db.Column(db.BigInteger, nullable=False)
+    chunk_size = db.Column(db.Integer, nullable=False)
+    total_parts = db.Column(db.Integer, nullable=False)
+    checksum = db.Column(db.String(64))  # SHA-256 esperado del archivo completo (opcional)
+    status = db.Column(db.String(20), default='pending')  # pending, completed
+    document_id = db.Column(db.Integer, db.ForeignKey('documents.id'))
+    created_date = db.Column(db.DateTime, default=datetime.utcnow)
+    expires_at = db.Column(db.DateTime, nullable=False)
+    
+    def to_dict(self):
+        return {
+            'upload_id': self.id,
+            'original_filename': self.original_filename,
+            'document_type': self.document_type,
+            'process_id': self.process_id,
+            'supplier_id': self.supplier_id,
+            'total_size': self.total_size,
+            'chunk_size': self.chunk_size,
+            'total_parts': self.total_parts,
+            'status': self.status,
+            'document_id': self.document_id,
+            'created_date': self.created_date.isoformat() if self.created_date else None,
+            'expires_at': self.expires_at.isoformat() if self.expires_at else None
+        }
+
+class DocumentText(db.Model):
+    """Modelo para el texto extraído de documentos (fuente del índice de búsqueda)"""
+    __tablename__ = 'document_texts'
+    
+    document_id = db.Column(db.Integer, db.ForeignKey('documents.id'), primary_key=True, autoincrement=False)
+    status = db.Column(db.String(20), nullable=False)  # indexed, empty, unsupported, failed
+    content = db.Column(db.Text)
+    error = db.Column(db.String(500))
+    extracted_date = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def to_dict(self):
+        return {
+            'document_id': self.document_id,
+            'status': self.status,
+            'error': self.error,
+            'characters': len(self.content) if self.content else 0,
+            'extracted_date': self.extracted_date.isoformat() if self.extracted_date else None
+        }
+
+class StorageUsage(db.Model):
+    """Modelo para contadores de uso de almacenamiento (total, por proceso y por proveedor)"""
+    __tablename__ = 'storage_usage'
+    
+    scope = db.Column(db.String(20), primary_key=True)  # total, process, supplier
+    scope_id = db.Column(db.Integer, primary_key=True, autoincrement=False)  # 0 para total
+    document_count = db.Column(db.Integer, nullable=False, default=0)
+    total_bytes = db.Column(db.BigInteger, nullable=False, default=0)
+    updated_date = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def to_dict(self):
+        return {
+            'scope': self.scope,
+            'scope_id': self.scope_id,
+            'document_count': self.document_count,
+            'total_bytes': self.total_bytes,
+            'total_mb': round(self.total_bytes / (1024 * 1024), 2),
+            'updated_date': self.updated_date.isoformat() if self.updated_date else None
+        }
+
+# Orden numérico de prioridad (menor = más urgente)
+PRIORITY_RANKS = {'critical': 1, 'high': 2, 'medium': 3, 'low': 4}
+DEFAULT_PRIORITY_RANK = 5
+
+def priority_rank(priority):
+    """Rango numérico de una prioridad"""
+    return PRIORITY_RANKS.get(priority, DEFAULT_PRIORITY_RANK)
+
+def _default_priority_rank(context):
+    """Rango por defecto al insertar, derivado de la prioridad de la fila"""
+    return priority_rank(context.get_current_parameters().get('priority') or 'medium')
+
+# Tipos de alerta que genera el motor de vencimientos (únicos por proceso mientras estén activos)
+AUTOMATIC_ALERT_TYPES = ('deadline', 'process_expired')
+AUTOMATIC_ALERTS_PREDICATE = (
+    "status = 'active' AND alert_type IN ("
+    + ', '.join(f"'{alert_type}'" for alert_type in AUTOMATIC_ALERT_TYPES) + ')'
+)
+
 class Alert(db.Model):
     """Modelo para alertas del sistema"""
     __tablename__ = 'alerts'
+    __table_args__ = (
+        db.Index('ix_alerts_status_rank_created', 'status', 'priority_rank', db.text('created_date DESC')),
+        db.Index('ix_alerts_rank_created', 'priority_rank', db.text('created_date DESC')),
+        # Una sola alerta automática activa por proceso y tipo (evita duplicados entre
+        # ejecuciones concurrentes); las alertas manuales pueden repetirse
+        db.Index(
+            'uq_alerts_active_auto_process_type', 'process_id', 'alert_type', unique=True,
+            sqlite_where=db.text(AUTOMATIC_ALERTS_PREDICATE),
+            postgresql_where=db.text(AUTOMATIC_ALERTS_PREDICATE)
+        ).ddl_if(dialect=('sqlite', 'postgresql')),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(200), nullable=False)
     message = db.Column(db.Text, nullable=False)
     alert_type = db.Column(db.String(50), nullable=False)  # deadline, missing_document, process_expired
     priority = db.Column(db.String(20), default='medium')  # low, medium, high, critical
+    priority_rank = db.Column(db.Integer, default=_default_priority_rank)  # 1 = critical ... 4 = low
     status = db.Column(db.String(20), default='active')  # active, dismissed, resolved
     process_id = db.Column(db.Integer, db.ForeignKey('processes.id'))
     created_date = db.Column(db.DateTime, default=datetime.utcnow)
     due_date = db.Column(db.DateTime)
     resolved_date = db.Column(db.DateTime)
     
+    @db.validates('priority')
+    def _sync_priority_rank(self, key, value):
+        self.priority_rank = priority_rank(value)
+        return value
+    
     def to_dict(self):
         return {
             'id': self.id,
@@ -166,6 +285,45 @@ class Alert(db.Model):
             'process_title': self.process.title if self.process else None
         }
 
+class AlertArchive(db.Model):
+    """Modelo para alertas resueltas o descartadas trasladadas al archivo histórico"""
+    __tablename__ = 'alerts_archive'
+    __table_args__ = (
+        db.Index('ix_alerts_archive_process', 'process_id'),
+        db.Index('ix_alerts_archive_created', 'created_date'),
+        db.Index('ix_alerts_archive_alert', 'alert_id'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    alert_id = db.Column(db.Integer)  # Id que tenía en alerts (SQLite reutiliza los ids eliminados)
+    title = db.Column(db.String(200), nullable=False)
+    message = db.Column(db.Text, nullable=False)
+    alert_type = db.Column(db.String(50), nullable=False)
+    priority = db.Column(db.String(20))
+    priority_rank = db.Column(db.Integer)
+    status = db.Column(db.String(20))
+    process_id = db.Column(db.Integer)  # Sin clave foránea: el proceso puede eliminarse después
+    created_date = db.Column(db.DateTime)
+    due_date = db.Column(db.DateTime)
+    resolved_date = db.Column(db.DateTime)
+    archived_date = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'alert_id': self.alert_id,
+            'title': self.title,
+            'message': self.message,
+            'alert_type': self.alert_type,
+            'priority': self.priority,
+            'status': self.status,
+            'process_id': self.process_id,
+            'created_date': self.created_date.isoformat() if self.created_date else None,
+            'due_date': self.due_date.isoformat() if self.due_date else None,
+            'resolved_date': self.resolved_date.isoformat() if self.resolved_date else None,
+            'archived_date': self.archived_date.isoformat() if self.archived_date else None
+        }
+
 
 class EvaluationCriteria(db.Model):
     """Modelo para criterios de evaluación"""
@@ -261,3 +419,51 @@ class BidRanking(db.Model):
             'bid_amount': self.bid.bid_amount if self.bid else None
         }
 
+class SchedulerLock(db.Model):
+    """Modelo para el arrendamiento de liderazgo del scheduler entre workers"""
+    __tablename__ = 'scheduler_locks'
+    
+    name = db.Column(db.String(50), primary_key=True)
+    owner = db.Column(db.String(100), nullable=False)
+    acquired_date = db.Column(db.DateTime, default=datetime.utcnow)
+    expires_at = db.Column(db.DateTime, nullable=False)
+    
+    def to_dict(self):
+        return {
+            'name': self.name,
+            'owner': self.owner,
+            'acquired_date': self.acquired_date.isoformat() if self.acquired_date else None,
+            'expires_at': self.expires_at.isoformat() if self.expires_at else None
+        }
+
+class SchedulerJobRun(db.Model):
+    """Modelo para el historial de ejecuciones de tareas programadas"""
+    __tablename__ = 'scheduler_job_runs'
+    __table_args__ = (
+        db.Index('ix_scheduler_job_runs_job_started', 'job_id', 'started_date'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    job_id = db.Column(db.String(100), nullable=False)
+    trigger = db.Column(db.String(20), default='scheduled')  # scheduled, manual
+    worker = db.Column(db.String(100))
+    status = db.Column(db.String(20), default='running')  # running, success, error
+    started_date = db.Column(db.DateTime, default=datetime.utcnow)
+    finished_date = db.Column(db.DateTime)
+    duration_ms = db.Column(db.Float)
+    result = db.Column(db.Text)
+    error = db.Column(db.Text)
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'job_id': self.job_id,
+            'trigger': self.trigger,
+            'worker': self.worker,
+            'status': self.status,
+            'started_date': self.started_date.isoformat() if self.started_date else None,
+            'finished_date': self.finished_date.isoformat() if self.finished_date else None,
+            'duration_ms': self.duration_ms,
+            'result': self.result,
+            'error': self.error
+        }
@@ -1,12 +1,22 @@
 from flask import Blueprint, request, jsonify
+from sqlalchemy.exc import IntegrityError
 from src.models.database import db
-from src.models.models import Alert, Process
-from datetime import datetime, timedelta
+from src.models.models import Alert, AlertArchive, Process
+from src.services.deadline_engine import run_deadline_check
+from src.services.event_bus import publish
+from src.services.alert_store import archive_alerts, bulk_alert_action, priority_order
+from datetime import datetime
 import logging
 
 logger = logging.getLogger(__name__)
 alerts_bp = Blueprint('alerts', __name__)
 
+# Evento publicado según el estado final de una alerta actualizada
+ALERT_STATUS_EVENTS = {
+    'resolved': 'alert.resolved',
+    'dismissed': 'alert.dismissed',
+}
+
 @alerts_bp.route('/', methods=['GET'])
 def get_alerts():
     """Obtener lista de alertas"""
@@ -28,15 +38,8 @@ def get_alerts():
         if priority:
             query = query.filter(Alert.priority == priority)
         
-        # Ordenar por prioridad y fecha de creación
-        priority_order = db.case(
-            (Alert.priority == 'critical', 1),
-            (Alert.priority == 'high', 2),
-            (Alert.priority == 'medium', 3),
-            (Alert.priority == 'low', 4),
-            else_=5
-        )
-        query = query.order_by(priority_order, Alert.created_date.desc())
+        # Ordenar por prioridad y fecha de creación (columna indexada priority_rank)
+        query = query.order_by(*priority_order())
         
         alerts = query.paginate(
             page=page, per_page=per_page, error_out=False
@@ -93,9 +96,15 @@ def create_alert():
         db.session.add(alert)
         db.session.commit()
         
+        alert_data = alert.to_dict()
+        publish('alert.created', alert_data)
+        
         logger.info(f"Alert created: {alert.title}")
-        return jsonify(alert.to_dict()), 201
+        return jsonify(alert_data), 201
         
+    except IntegrityError:
+        db.session.rollback()
+        return jsonify({'error': 'Ya existe una alerta activa de este tipo para el proceso'}), 409
     except Exception as e:
         db.session.rollback()
         logger.error(f"Error creating alert: {str(e)}")
@@ -143,9 +152,15 @@ def update_alert(alert_id):
         
         db.session.commit()
         
+        alert_data = alert.to_dict()
+        publish(ALERT_STATUS_EVENTS.get(alert.status, 'alert.updated'), alert_data)
+        
         logger.info(f"Alert updated: {alert_id}")
-        return jsonify(alert.to_dict())
+        return jsonify(alert_data)
         
+    except IntegrityError:
+        db.session.rollback()
+        return jsonify({'error': 'Ya existe una alerta activa de este tipo para el proceso'}), 409
     except Exception as e:
         db.session.rollback()
         logger.error(f"Error updating alert {alert_id}: {str(e)}")
@@ -159,6 +174,7 @@ def delete_alert(alert_id):
         
         db.session.delete(alert)
         db.session.commit()
+        publish('alert.deleted', {'id': alert_id})
         
         logger.info(f"Alert deleted: {alert_id}")
         return jsonify({'message': 'Alerta eliminada exitosamente'})
@@ -168,6 +184,38 @@ def delete_alert(alert_id):
         logger.error(f"Error deleting alert {alert_id}: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+@alerts_bp.route('/bulk', methods=['POST'])
+def bulk_alerts():
+    """Descartar, resolver o eliminar varias alertas por ids o por filtro"""
+    try:
+        data = request.get_json() or {}
+        action = data.get('action')
+        ids = data.get('ids')
+        filters = data.get('filter')
+        
+        if ids is not None and not isinstance(ids, list):
+            return jsonify({'error': 'ids debe ser una lista'}), 400
+        if filters is not None and not isinstance(filters, dict):
+            return jsonify({'error': 'filter debe ser un objeto'}), 400
+        
+        affected = bulk_alert_action(action, ids=ids, filters=filters)
+        if affected:
+            publish('alerts.bulk', {'action': action, 'affected': affected})
+        
+        logger.info(f"Bulk alert action {action}: {affected} alerts")
+        return jsonify({
+            'message': f'{affected} alertas actualizadas' if action != 'delete' else f'{affected} alertas eliminadas',
+            'action': action,
+            'affected': affected
+        })
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Error in bulk alert action: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
 @alerts_bp.route('/stats', methods=['GET'])
 def get_alert_stats():
     """Obtener estadísticas de alertas"""
@@ -217,17 +265,9 @@ def get_active_alerts():
     try:
         limit = request.args.get('limit', 10, type=int)
         
-        # Ordenar por prioridad y fecha de creación
-        priority_order = db.case(
-            (Alert.priority == 'critical', 1),
-            (Alert.priority == 'high', 2),
-            (Alert.priority == 'medium', 3),
-            (Alert.priority == 'low', 4),
-            else_=5
-        )
-        
+        # Ordenar por prioridad y fecha de creación (columna indexada priority_rank)
         alerts = Alert.query.filter_by(status='active').order_by(
-            priority_order, Alert.created_date.desc()
+            *priority_order()
         ).limit(limit).all()
         
         return jsonify([alert.to_dict() for alert in alerts])
@@ -239,68 +279,7 @@ def get_active_alerts():
 def check_deadlines():
     """Verificar vencimientos y crear alertas automáticas"""
     try:
-        alerts_created = 0
-        
-        # Verificar procesos que vencen pronto
-        warning_days = 7  # Alertar 7 días antes del vencimiento
-        warning_date = datetime.utcnow() + timedelta(days=warning_days)
-        
-        processes_ending_soon = Process.query.filter(
-            Process.end_date <= warning_date,
-            Process.end_date > datetime.utcnow(),
-            Process.status.in_(['active', 'evaluation'])
-        ).all()
-        
-        for process in processes_ending_soon:
-            # Verificar si ya existe una alerta para este proceso
-            existing_alert = Alert.query.filter_by(
-                process_id=process.id,
-                alert_type='deadline',
-                status='active'
-            ).first()
-            
-            if not existing_alert:
-                days_remaining = (process.end_date - datetime.utcnow()).days
-                
-                alert = Alert(
-                    title=f'Proceso próximo a vencer: {process.process_number}',
-                    message=f'El proceso "{process.title}" vence en {days_remaining} días ({process.end_date.strftime("%d/%m/%Y")})',
-                    alert_type='deadline',
-                    priority='high' if days_remaining <= 3 else 'medium',
-                    process_id=process.id,
-                    due_date=process.end_date
-                )
-                
-                db.session.add(alert)
-                alerts_created += 1
-        
-        # Verificar procesos vencidos
-        expired_processes = Process.query.filter(
-            Process.end_date < datetime.utcnow(),
-            Process.status.in_(['active', 'evaluation'])
-        ).all()
-        
-        for process in expired_processes:
-            # Verificar si ya existe una alerta para este proceso
-            existing_alert = Alert.query.filter_by(
-                process_id=process.id,
-                alert_type='process_expired',
-                status='active'
-            ).first()
-            
-            if not existing_alert:
-                alert = Alert(
-                    title=f'Proceso vencido: {process.process_number}',
-                    message=f'El proceso "{process.title}" venció el {process.end_date.strftime("%d/%m/%Y")} y requiere atención',
-                    alert_type='process_expired',
-                    priority='critical',
-                    process_id=process.id
-                )
-                
-                db.session.add(alert)
-                alerts_created += 1
-        
-        db.session.commit()
+        alerts_created = run_deadline_check()
         
         logger.info(f"Deadline check completed: {alerts_created} alerts created")
         return jsonify({
@@ -313,3 +292,52 @@ def check_deadlines():
         logger.error(f"Error checking deadlines: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+
+@alerts_bp.route('/archive', methods=['POST'])
+def archive_closed_alerts():
+    """Trasladar al archivo las alertas resueltas o descartadas antiguas"""
+    try:
+        data = request.get_json(silent=True) or {}
+        older_than_days = data.get('older_than_days')
+        
+        archived = archive_alerts(int(older_than_days) if older_than_days is not None else None)
+        if archived:
+            publish('alerts.archived', {'archived': archived})
+        
+        return jsonify({
+            'message': f'{archived} alertas archivadas',
+            'archived': archived
+        })
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Error archiving alerts: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@alerts_bp.route('/archive', methods=['GET'])
+def get_archived_alerts():
+    """Obtener alertas archivadas"""
+    try:
+        page = request.args.get('page', 1, type=int)
+        per_page = request.args.get('per_page', 10, type=int)
+        process_id = request.args.get('process_id', type=int)
+        
+        query = AlertArchive.query
+        if process_id:
+            query = query.filter(AlertArchive.process_id == process_id)
+        
+        alerts = query.order_by(AlertArchive.created_date.desc()).paginate(
+            page=page, per_page=per_page, error_out=False
+        )
+        
+        return jsonify({
+            'alerts': [alert.to_dict() for alert in alerts.items],
+            'total': alerts.total,
+            'pages': alerts.pages,
+            'current_page': page
+        })
+    except Exception as e:
+        logger.error(f"Error getting archived alerts: {str(e)}")
+        return jsonify({'error': str(e)}), 500
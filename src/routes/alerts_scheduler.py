@@ -1,136 +1,87 @@
-from flask import Blueprint, jsonify
-from apscheduler.schedulers.background import BackgroundScheduler
+from flask import Blueprint, jsonify, current_app
 from apscheduler.triggers.cron import CronTrigger
-from src.models.database import db
-from src.models.models import Alert, Process
-from datetime import datetime, timedelta
+from src.services import scheduler as scheduler_service
+from src.services.deadline_engine import run_deadline_check
+from src.services.deadline_timer import deadline_timer
+from src.services.alert_store import archive_alerts
+from src.services.event_bus import publish
 import logging
-import atexit
 
 logger = logging.getLogger(__name__)
 alerts_scheduler_bp = Blueprint('alerts_scheduler', __name__)
 
-# Scheduler global
-scheduler = None
+DEADLINE_JOB_ID = 'deadline_check'
+ARCHIVE_JOB_ID = 'alert_archive'
 
-def check_process_deadlines():
+def check_process_deadlines(trigger='scheduled'):
     """Función para verificar vencimientos de procesos automáticamente"""
     try:
-        with db.app.app_context():
-            alerts_created = 0
-            
-            # Verificar procesos que vencen pronto
-            warning_days = 7
-            warning_date = datetime.utcnow() + timedelta(days=warning_days)
-            
-            processes_ending_soon = Process.query.filter(
-                Process.end_date <= warning_date,
-                Process.end_date > datetime.utcnow(),
-                Process.status.in_(['active', 'evaluation'])
-            ).all()
-            
-            for process in processes_ending_soon:
-                existing_alert = Alert.query.filter_by(
-                    process_id=process.id,
-                    alert_type='deadline',
-                    status='active'
-                ).first()
-                
-                if not existing_alert:
-                    days_remaining = (process.end_date - datetime.utcnow()).days
-                    
-                    alert = Alert(
-                        title=f'Proceso próximo a vencer: {process.process_number}',
-                        message=f'El proceso "{process.title}" vence en {days_remaining} días ({process.end_date.strftime("%d/%m/%Y")})',
-                        alert_type='deadline',
-                        priority='high' if days_remaining <= 3 else 'medium',
-                        process_id=process.id,
-                        due_date=process.end_date
-                    )
-                    
-                    db.session.add(alert)
-                    alerts_created += 1
-            
-            # Verificar procesos vencidos
-            expired_processes = Process.query.filter(
-                Process.end_date < datetime.utcnow(),
-                Process.status.in_(['active', 'evaluation'])
-            ).all()
-            
-            for process in expired_processes:
-                existing_alert = Alert.query.filter_by(
-                    process_id=process.id,
-                    alert_type='process_expired',
-                    status='active'
-                ).first()
-                
-                if not existing_alert:
-                    alert = Alert(
-                        title=f'Proceso vencido: {process.process_number}',
-                        message=f'El proceso "{process.title}" venció el {process.end_date.strftime("%d/%m/%Y")} y requiere atención',
-                        alert_type='process_expired',
-                        priority='critical',
-                        process_id=process.id
-                    )
-                    
-                    db.session.add(alert)
-                    alerts_created += 1
-            
-            db.session.commit()
-            logger.info(f"Automatic deadline check: {alerts_created} alerts created")
+        with scheduler_service.app_context():
+            result = scheduler_service.run_job(
+                DEADLINE_JOB_ID,
+                lambda: {'alerts_created': run_deadline_check()},
+                trigger=trigger
+            )
+            logger.info(f"Automatic deadline check: {result['alerts_created']} alerts created")
+            return result
             
     except Exception as e:
         logger.error(f"Error in automatic deadline check: {str(e)}")
-        if db.session:
-            db.session.rollback()
+        return None
+
+def archive_closed_alerts(trigger='scheduled'):
+    """Trasladar al archivo las alertas cerradas más antiguas que la retención configurada"""
+    try:
+        with scheduler_service.app_context():
+            result = scheduler_service.run_job(
+                ARCHIVE_JOB_ID,
+                lambda: {'archived': archive_alerts()},
+                trigger=trigger
+            )
+            if result['archived']:
+                publish('alerts.archived', result)
+            return result
+            
+    except Exception as e:
+        logger.error(f"Error in alert archival: {str(e)}")
+        return None
 
 def init_scheduler(app):
     """Inicializar el scheduler de alertas"""
-    global scheduler
+    if not scheduler_service.SCHEDULER_ENABLED:
+        logger.info("Alert scheduler disabled by configuration")
+        return
     
-    if scheduler is None:
-        scheduler = BackgroundScheduler()
-        
-        # Programar verificación diaria a las 9:00 AM
-        scheduler.add_job(
-            func=check_process_deadlines,
-            trigger=CronTrigger(hour=9, minute=0),
-            id='deadline_check',
-            name='Check process deadlines',
-            replace_existing=True
-        )
-        
-        scheduler.start()
-        logger.info("Alert scheduler started")
-        
-        # Asegurar que el scheduler se cierre al terminar la aplicación
-        atexit.register(lambda: scheduler.shutdown())
+    # Programar verificación diaria a las 9:00 AM (la ejecuta solo el worker líder)
+    scheduler_service.register_job(
+        DEADLINE_JOB_ID,
+        check_process_deadlines,
+        CronTrigger(hour=9, minute=0),
+        name='Check process deadlines'
+    )
+    
+    # Archivar diariamente las alertas cerradas antiguas, fuera del horario de uso
+    scheduler_service.register_job(
+        ARCHIVE_JOB_ID,
+        archive_closed_alerts,
+        CronTrigger(hour=3, minute=0),
+        name='Archive closed alerts'
+    )
+    
+    scheduler_service.start(app)
+    logger.info("Alert scheduler started")
 
 @alerts_scheduler_bp.route('/status', methods=['GET'])
 def get_scheduler_status():
-    """Obtener estado del scheduler"""
+    """Obtener estado del scheduler, liderazgo e historial de ejecuciones"""
     try:
-        global scheduler
+        status = scheduler_service.get_status()
+        status['deadline_timer'] = deadline_timer.pending()
         
-        if scheduler is None:
-            return jsonify({
-                'running': False,
-                'message': 'Scheduler no inicializado'
-            })
+        if not status['running']:
+            status['message'] = 'Scheduler no inicializado'
         
-        jobs = []
-        for job in scheduler.get_jobs():
-            jobs.append({
-                'id': job.id,
-                'name': job.name,
-                'next_run': job.next_run_time.isoformat() if job.next_run_time else None,
-                'trigger': str(job.trigger)
-            })
-        
-        return jsonify({
-            'running': scheduler.running,
-            'jobs': jobs
-        })
+        return jsonify(status)
     except Exception as e:
         logger.error(f"Error getting scheduler status: {str(e)}")
         return jsonify({'error': str(e)}), 500
@@ -139,8 +90,15 @@ def get_scheduler_status():
 def run_manual_check():
     """Ejecutar verificación manual de vencimientos"""
     try:
-        check_process_deadlines()
-        return jsonify({'message': 'Verificación manual ejecutada exitosamente'})
+        result = scheduler_service.run_job(
+            DEADLINE_JOB_ID,
+            lambda: {'alerts_created': run_deadline_check()},
+            trigger='manual'
+        )
+        return jsonify({
+            'message': 'Verificación manual ejecutada exitosamente',
+            'alerts_created': result['alerts_created']
+        })
     except Exception as e:
         logger.error(f"Error in manual check: {str(e)}")
         return jsonify({'error': str(e)}), 500
@@ -149,34 +107,25 @@ def run_manual_check():
 def start_scheduler():
     """Iniciar el scheduler"""
     try:
-        global scheduler
-        
-        if scheduler is None:
-            from flask import current_app
-            init_scheduler(current_app)
-            return jsonify({'message': 'Scheduler iniciado exitosamente'})
-        elif not scheduler.running:
-            scheduler.start()
-            return jsonify({'message': 'Scheduler reiniciado exitosamente'})
-        else:
+        if scheduler_service.is_running():
             return jsonify({'message': 'Scheduler ya está ejecutándose'})
+        
+        init_scheduler(current_app._get_current_object())
+        if not scheduler_service.is_running():
+            return jsonify({'error': 'Scheduler deshabilitado por configuración'}), 409
+        return jsonify({'message': 'Scheduler iniciado exitosamente'})
     except Exception as e:
         logger.error(f"Error starting scheduler: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
 @alerts_scheduler_bp.route('/stop', methods=['POST'])
 def stop_scheduler():
-    """Detener el scheduler"""
+    """Detener el scheduler de este worker"""
     try:
-        global scheduler
-        
-        if scheduler and scheduler.running:
-            scheduler.shutdown()
-            scheduler = None
+        if scheduler_service.stop():
             return jsonify({'message': 'Scheduler detenido exitosamente'})
         else:
             return jsonify({'message': 'Scheduler no está ejecutándose'})
     except Exception as e:
         logger.error(f"Error stopping scheduler: {str(e)}")
         return jsonify({'error': str(e)}), 500
-
@@ -1,6 +1,7 @@
 from flask import Blueprint, request, jsonify
 from src.models.database import db
 from src.models.models import Bid, Process, Supplier
+from src.services.event_bus import publish
 from datetime import datetime
 import logging
 
@@ -92,6 +93,7 @@ def create_bid():
         
         db.session.add(bid)
         db.session.commit()
+        publish('bid.created', {'id': bid.id, 'process_id': bid.process_id, 'supplier_id': bid.supplier_id})
         
         logger.info(f"Bid created: Process {process.process_number}, Supplier {supplier.name}")
         return jsonify(bid.to_dict()), 201
@@ -135,6 +137,7 @@ def update_bid(bid_id):
             bid.total_score = (bid.technical_score + bid.commercial_score) / 2
         
         db.session.commit()
+        publish('bid.updated', {'id': bid.id, 'process_id': bid.process_id, 'status': bid.status})
         
         logger.info(f"Bid updated: {bid_id}")
         return jsonify(bid.to_dict())
@@ -152,6 +155,7 @@ def delete_bid(bid_id):
         
         db.session.delete(bid)
         db.session.commit()
+        publish('bid.deleted', {'id': bid_id})
         
         logger.info(f"Bid deleted: {bid_id}")
         return jsonify({'message': 'Oferta eliminada exitosamente'})
@@ -1,8 +1,11 @@
 import os
-from flask import Blueprint, request, jsonify, send_file
+from flask import Blueprint, request, jsonify, Response, stream_with_context
 from werkzeug.utils import secure_filename
 from src.models.database import db
-from src.models.models import Document, Process, Supplier
+from src.models.models import Document, DocumentText, Process, StorageUsage, Supplier, UploadSession
+from src.services.blob_store import store_stream, release_blob
+from src.services import upload_sessions, document_search, storage_usage
+from src.services.document_delivery import send_document, stream_documents_zip
 from datetime import datetime
 import logging
 
@@ -14,6 +17,13 @@ ALLOWED_EXTENSIONS = {'txt', 'pdf', 'png', 'jpg', 'jpeg', 'gif', 'doc', 'docx',
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+def queue_text_extraction(document):
+    """Encolar la indexación del texto sin afectar la respuesta de la subida"""
+    try:
+        document_search.submit(document)
+    except Exception as e:
+        logger.warning(f"Could not queue text extraction for document {document.id}: {str(e)}")
+
 @documents_bp.route('/', methods=['GET'])
 def get_documents():
     """Obtener lista de documentos"""
@@ -91,45 +101,242 @@ def upload_document():
         # Generar nombre de archivo seguro
         original_filename = file.filename
         filename = secure_filename(original_filename)
+        file_type = original_filename.rsplit('.', 1)[1].lower() if '.' in original_filename else ''
         
-        # Agregar timestamp para evitar conflictos
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S_')
-        filename = timestamp + filename
+        # Guardar el contenido una sola vez por huella y registrar el documento
+        with store_stream(file.stream) as blob:
+            storage_usage.check_quota(process_id, supplier_id, blob.size)
+            
+            document = Document(
+                filename=filename,
+                original_filename=original_filename,
+                file_path=blob.path,
+                file_size=blob.size,
+                file_type=file_type,
+                content_hash=blob.digest,
+                document_type=document_type,
+                process_id=process_id,
+                supplier_id=supplier_id,
+                description=description
+            )
+            
+            db.session.add(document)
+            storage_usage.record_added(document)
+            db.session.commit()
+        
+        if blob.deduplicated:
+            logger.info(f"Document content already stored: {blob.digest}")
+        
+        queue_text_extraction(document)
         
-        # Crear directorio si no existe
-        upload_folder = request.current_app.config['UPLOAD_FOLDER']
-        os.makedirs(upload_folder, exist_ok=True)
+        logger.info(f"Document uploaded: {original_filename}")
+        return jsonify(document.to_dict()), 201
         
-        # Guardar archivo
-        file_path = os.path.join(upload_folder, filename)
-        file.save(file_path)
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Error uploading document: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@documents_bp.route('/search', methods=['GET'])
+def search_documents():
+    """Buscar documentos por su contenido, con fragmentos resaltados"""
+    try:
+        page = request.args.get('page', 1, type=int)
+        per_page = min(request.args.get('per_page', 10, type=int), 100)
+        query = request.args.get('q', '')
+        
+        results, total = document_search.search_documents(
+            query,
+            process_id=request.args.get('process_id', type=int),
+            supplier_id=request.args.get('supplier_id', type=int),
+            document_type=request.args.get('document_type', ''),
+            page=page,
+            per_page=per_page
+        )
         
-        # Obtener información del archivo
-        file_size = os.path.getsize(file_path)
-        file_type = original_filename.rsplit('.', 1)[1].lower() if '.' in original_filename else ''
+        return jsonify({
+            'documents': results,
+            'total': total,
+            'pages': (total + per_page - 1) // per_page if per_page > 0 else 0,
+            'current_page': page,
+            'query': query
+        })
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error searching documents: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@documents_bp.route('/search/status', methods=['GET'])
+def get_search_index_status():
+    """Estado de la indexación de texto de los documentos"""
+    try:
+        return jsonify(document_search.index_status())
+    except Exception as e:
+        logger.error(f"Error getting search index status: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@documents_bp.route('/storage/usage', methods=['GET'])
+def get_storage_usage():
+    """Uso de almacenamiento total, de un proceso o proveedor, o los que más ocupan"""
+    try:
+        scope = request.args.get('scope', '')
+        scope_id = request.args.get('scope_id', type=int)
+        
+        if scope:
+            if scope not in storage_usage.SCOPES or not scope_id:
+                return jsonify({'error': 'Indique scope (process o supplier) y scope_id'}), 400
+            usage = storage_usage.get_usage(scope, scope_id)
+            usage['quota_bytes'] = storage_usage.quota_bytes(scope)
+            return jsonify(usage)
+        
+        limit = min(request.args.get('limit', 10, type=int), 100)
+        top = {
+            name: [
+                usage.to_dict() for usage in StorageUsage.query.filter_by(scope=name)
+                .order_by(StorageUsage.total_bytes.desc()).limit(limit)
+            ]
+            for name in storage_usage.SCOPES
+        }
+        
+        return jsonify({'total': storage_usage.get_usage(), 'top': top})
+    except Exception as e:
+        logger.error(f"Error getting storage usage: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@documents_bp.route('/storage/reconcile', methods=['POST'])
+def reconcile_storage():
+    """Conciliar archivos en disco con los documentos registrados"""
+    try:
+        data = request.get_json(silent=True) or {}
+        report = storage_usage.reconcile_storage(remove_orphans=bool(data.get('remove_orphans')))
+        return jsonify(report)
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Error reconciling storage: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@documents_bp.route('/uploads', methods=['POST'])
+def create_upload():
+    """Iniciar una subida por partes para archivos grandes"""
+    try:
+        data = request.get_json() or {}
+        original_filename = data.get('filename', '')
+        
+        if not original_filename:
+            return jsonify({'error': 'No se indicó el nombre del archivo'}), 400
+        
+        if not allowed_file(original_filename):
+            return jsonify({'error': 'Tipo de archivo no permitido'}), 400
+        
+        process_id = data.get('process_id')
+        supplier_id = data.get('supplier_id')
+        
+        # Validar que al menos uno de process_id o supplier_id esté presente
+        if not process_id and not supplier_id:
+            return jsonify({'error': 'Debe especificar un proceso o proveedor'}), 400
         
-        # Crear registro en base de datos
-        document = Document(
-            filename=filename,
+        if process_id and not Process.query.get(process_id):
+            return jsonify({'error': 'El proceso especificado no existe'}), 404
+        
+        if supplier_id and not Supplier.query.get(supplier_id):
+            return jsonify({'error': 'El proveedor especificado no existe'}), 404
+        
+        upload = upload_sessions.create_session(
             original_filename=original_filename,
-            file_path=file_path,
-            file_size=file_size,
-            file_type=file_type,
-            document_type=document_type,
+            file_type=original_filename.rsplit('.', 1)[1].lower(),
+            total_size=data.get('total_size'),
+            chunk_size=data.get('chunk_size'),
+            checksum=data.get('checksum'),
+            document_type=data.get('document_type', ''),
+            description=data.get('description', ''),
             process_id=process_id,
-            supplier_id=supplier_id,
-            description=description
+            supplier_id=supplier_id
         )
         
-        db.session.add(document)
-        db.session.commit()
+        logger.info(f"Upload session created: {upload.id} ({original_filename}, {upload.total_parts} parts)")
+        return jsonify(upload.to_dict()), 201
         
-        logger.info(f"Document uploaded: {original_filename}")
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Error creating upload session: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@documents_bp.route('/uploads/<upload_id>', methods=['GET'])
+def get_upload(upload_id):
+    """Estado de una subida por partes (partes recibidas y faltantes)"""
+    try:
+        upload = db.session.get(UploadSession, upload_id)
+        if upload is None:
+            return jsonify({'error': 'Subida no encontrada o expirada'}), 404
+        
+        return jsonify(upload_sessions.session_status(upload))
+    except Exception as e:
+        logger.error(f"Error getting upload {upload_id}: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@documents_bp.route('/uploads/<upload_id>/parts/<int:part_number>', methods=['PUT'])
+def upload_part(upload_id, part_number):
+    """Recibir una parte como cuerpo binario (X-Part-Checksum: sha256=<hex> opcional)"""
+    try:
+        upload = upload_sessions.get_pending_session(upload_id)
+        checksum = upload_sessions.parse_checksum(request.headers.get('X-Part-Checksum'))
+        
+        part = upload_sessions.write_part(upload, part_number, request.stream, checksum)
+        return jsonify(part)
+        
+    except LookupError as e:
+        return jsonify({'error': str(e)}), 404
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error uploading part {part_number} of {upload_id}: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@documents_bp.route('/uploads/<upload_id>/complete', methods=['POST'])
+def complete_upload(upload_id):
+    """Unir las partes recibidas y registrar el documento"""
+    try:
+        upload = upload_sessions.get_pending_session(upload_id)
+        document = upload_sessions.complete_session(upload, secure_filename(upload.original_filename))
+        
+        logger.info(f"Document uploaded in {upload.total_parts} parts: {upload.original_filename}")
+        queue_text_extraction(document)
         return jsonify(document.to_dict()), 201
         
+    except LookupError as e:
+        return jsonify({'error': str(e)}), 404
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         db.session.rollback()
-        logger.error(f"Error uploading document: {str(e)}")
+        logger.error(f"Error completing upload {upload_id}: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@documents_bp.route('/uploads/<upload_id>', methods=['DELETE'])
+def abort_upload(upload_id):
+    """Cancelar una subida por partes y eliminar las partes recibidas"""
+    try:
+        upload = upload_sessions.get_pending_session(upload_id)
+        upload_sessions.abort_session(upload)
+        
+        logger.info(f"Upload session aborted: {upload_id}")
+        return jsonify({'message': 'Subida cancelada'})
+        
+    except LookupError as e:
+        return jsonify({'error': str(e)}), 404
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Error aborting upload {upload_id}: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
 @documents_bp.route('/<int:document_id>', methods=['GET'])
@@ -151,21 +358,46 @@ def download_document(document_id):
         if not os.path.exists(document.file_path):
             return jsonify({'error': 'Archivo no encontrado en el sistema'}), 404
         
-        return send_file(
-            document.file_path,
-            as_attachment=True,
-            download_name=document.original_filename
-        )
+        # Soporta Range, If-None-Match y envío delegado al servidor web
+        return send_document(document)
     except Exception as e:
         logger.error(f"Error downloading document {document_id}: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+@documents_bp.route('/process/<int:process_id>/zip', methods=['GET'])
+def download_process_documents(process_id):
+    """Descargar todos los documentos de un proceso en un ZIP transmitido en streaming"""
+    try:
+        process = Process.query.get_or_404(process_id)
+        documents = Document.query.with_entities(
+            Document.original_filename, Document.file_path, Document.document_type
+        ).filter_by(process_id=process_id).order_by(Document.upload_date).all()
+        
+        if not documents:
+            return jsonify({'error': 'El proceso no tiene documentos'}), 404
+        
+        filename = secure_filename(
+            f"documentos_{process.process_number}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.zip"
+        )
+        logger.info(f"Streaming documents ZIP for process {process_id}: {len(documents)} files")
+        
+        return Response(
+            stream_with_context(stream_documents_zip(documents)),
+            mimetype='application/zip',
+            headers={'Content-Disposition': f'attachment; filename="{filename}"'}
+        )
+    except Exception as e:
+        logger.error(f"Error building documents ZIP for process {process_id}: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
 @documents_bp.route('/<int:document_id>', methods=['PUT'])
 def update_document(document_id):
     """Actualizar información de documento"""
     try:
         document = Document.query.get_or_404(document_id)
         data = request.get_json()
+        old_process_id = document.process_id
+        old_supplier_id = document.supplier_id
         
         # Actualizar campos editables
         document.document_type = data.get('document_type', document.document_type)
@@ -186,6 +418,7 @@ def update_document(document_id):
                     return jsonify({'error': 'El proveedor especificado no existe'}), 404
             document.supplier_id = data['supplier_id']
         
+        storage_usage.record_moved(document, old_process_id, old_supplier_id)
         db.session.commit()
         
         logger.info(f"Document updated: {document_id}")
@@ -201,15 +434,21 @@ def delete_document(document_id):
     """Eliminar documento"""
     try:
         document = Document.query.get_or_404(document_id)
+        content_hash = document.content_hash
+        file_path = document.file_path
         
-        # Eliminar archivo físico
-        if os.path.exists(document.file_path):
-            os.remove(document.file_path)
-        
-        # Eliminar registro de base de datos
+        # Eliminar registro de base de datos y su texto indexado
+        DocumentText.query.filter_by(document_id=document_id).delete()
+        storage_usage.record_removed(document)
         db.session.delete(document)
         db.session.commit()
         
+        # Eliminar archivo físico si ningún otro documento lo referencia
+        if content_hash:
+            release_blob(content_hash)
+        elif os.path.exists(file_path):
+            os.remove(file_path)
+        
         logger.info(f"Document deleted: {document_id}")
         return jsonify({'message': 'Documento eliminado exitosamente'})
         
@@ -222,7 +461,9 @@ def delete_document(document_id):
 def get_document_stats():
     """Obtener estadísticas de documentos"""
     try:
-        total = Document.query.count()
+        # Totales desde los contadores de uso (sin sumar la tabla completa)
+        usage = storage_usage.get_usage()
+        total = usage['document_count']
         
         # Estadísticas por tipo
         tender_specs = Document.query.filter_by(document_type='tender_specs').count()
@@ -232,7 +473,7 @@ def get_document_stats():
         other = total - (tender_specs + technical_proposal + commercial_proposal + contract)
         
         # Tamaño total de archivos
-        total_size = db.session.query(db.func.sum(Document.file_size)).scalar() or 0
+        total_size = usage['total_bytes']
         
         return jsonify({
             'total': total,
@@ -0,0 +1,149 @@
+from flask import Blueprint, request, jsonify, Response, current_app, stream_with_context
+from src.models.database import web_concurrency
+from src.services.event_bus import event_bus
+from src.services import live_counters
+import json
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+events_bp = Blueprint('events', __name__)
+
+HEARTBEAT_SECONDS = 15
+STREAM_MAX_SECONDS = 300  # El navegador reconecta solo; evita ocupar un worker indefinidamente
+RETRY_MILLISECONDS = 3000
+POLL_MAX_TIMEOUT = 30
+FALLBACK_RETRY_SECONDS = 60  # Cuándo volver a intentar el flujo tras un 503
+
+# Conexiones que esperan eventos ocupando un hilo del worker (flujos SSE y
+# long-polls); por defecto, la mitad de WEB_THREADS para no bloquear el resto
+MAX_LIVE_CONNECTIONS = int(os.environ.get('LIVE_MAX_CONNECTIONS', 0)) or max(web_concurrency()[1] // 2, 1)
+_live_slots = threading.BoundedSemaphore(MAX_LIVE_CONNECTIONS)
+
+def release_once(semaphore):
+    """Función que libera el semáforo una sola vez (cierre de la respuesta o error)"""
+    lock = threading.Lock()
+    released = []
+
+    def release():
+        with lock:
+            if not released:
+                released.append(True)
+                semaphore.release()
+    return release
+
+def format_sse(event):
+    """Serializar un evento en el formato text/event-stream"""
+    data = json.dumps(event['data'], default=str, ensure_ascii=False)
+    return f"id: {event['id']}\nevent: {event['type']}\ndata: {data}\n\n"
+
+def counters_event(app):
+    """Evento con los contadores vigentes para el estado inicial del cliente"""
+    return {'id': event_bus.last_id(), 'type': 'counters', 'data': live_counters.get_snapshot(app)}
+
+@events_bp.route('/stream', methods=['GET'])
+def stream_events():
+    """Flujo SSE con alertas, cambios de ofertas y procesos, y contadores"""
+    if not _live_slots.acquire(blocking=False):
+        # Sin hilos libres para otro flujo: el cliente pasa a consultar /poll
+        response = jsonify({'error': 'Demasiadas conexiones en vivo', 'fallback': 'poll'})
+        response.status_code = 503
+        response.headers['Retry-After'] = str(FALLBACK_RETRY_SECONDS)
+        return response
+    release = release_once(_live_slots)
+
+    app = current_app._get_current_object()
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    sequence = event_bus.parse_id(last_event_id)
+
+    def generate():
+        event_bus.add_listener()
+        try:
+            yield f'retry: {RETRY_MILLISECONDS}\n\n'
+
+            current = sequence
+            if current is None:
+                # Cliente nuevo o de otro worker: enviar el estado completo
+                if last_event_id:
+                    yield format_sse({'id': event_bus.last_id(), 'type': 'resync', 'data': {}})
+                yield format_sse(counters_event(app))
+                current = event_bus.parse_id(event_bus.last_id())
+
+            deadline = time.monotonic() + STREAM_MAX_SECONDS
+            while time.monotonic() < deadline:
+                events, current = event_bus.wait(current, timeout=HEARTBEAT_SECONDS)
+
+                if events is None:
+                    yield format_sse({'id': event_bus.last_id(), 'type': 'resync', 'data': {}})
+                    yield format_sse(counters_event(app))
+                    continue
+
+                if not events:
+                    yield ': keepalive\n\n'
+                    continue
+
+                for event in events:
+                    yield format_sse(event)
+        finally:
+            event_bus.remove_listener()
+
+    try:
+        response = Response(
+            stream_with_context(generate()),
+            mimetype='text/event-stream',
+            headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+        )
+    except Exception:
+        release()
+        raise
+    # El servidor cierra la respuesta aunque el generador no llegue a empezar
+    response.call_on_close(release)
+    return response
+
+@events_bp.route('/poll', methods=['GET'])
+def poll_events():
+    """Long-poll: devolver los eventos posteriores a 'after' o esperar hasta timeout segundos"""
+    try:
+        app = current_app._get_current_object()
+        after = request.args.get('after')
+        timeout = min(max(request.args.get('timeout', 25, type=float), 0), POLL_MAX_TIMEOUT)
+
+        sequence = event_bus.parse_id(after)
+        if sequence is None:
+            return jsonify({
+                'resync': bool(after),
+                'events': [counters_event(app)],
+                'last_event_id': event_bus.last_id()
+            })
+
+        # Sin hilos libres para esperar, responder de inmediato con lo que haya
+        waiting = bool(timeout) and _live_slots.acquire(blocking=False)
+
+        event_bus.add_listener()
+        try:
+            events, _ = event_bus.wait(sequence, timeout=timeout if waiting else 0)
+        finally:
+            event_bus.remove_listener()
+            if waiting:
+                _live_slots.release()
+
+        if events is None:
+            return jsonify({
+                'resync': True,
+                'events': [counters_event(app)],
+                'last_event_id': event_bus.last_id()
+            })
+
+        return jsonify({
+            'resync': False,
+            'events': [
+                {'id': event['id'], 'type': event['type'], 'data': event['data']}
+                for event in events
+            ],
+            'last_event_id': events[-1]['id'] if events else after
+        })
+    except Exception as e:
+        logger.error(f"Error polling events: {str(e)}")
+        return jsonify({'error': str(e)}), 500
@@ -4,14 +4,27 @@ from flask import Blueprint, request, jsonify, send_file, current_app
 from werkzeug.utils import secure_filename
 from src.models.database import db
 from src.models.excel_models import *
+from src.services.excel_rollups import refresh_rollups, get_rollups, rollup_average, average
+from src.services.excel_templates import TEMPLATES, TEMPLATES_LAST_MODIFIED, get_template
+from src.services.excel_query import query_excel_data
 from datetime import datetime
-import tempfile
+import io
 import logging
 
 logger = logging.getLogger(__name__)
 excel_bp = Blueprint('excel', __name__)
 
 ALLOWED_EXTENSIONS = {'xlsx', 'xls'}
+TEMPLATE_MAX_AGE = 3600  # segundos
+
+EXCEL_MODELS = {
+    'process_tracking': ExcelProcessTracking,
+    'technical_evaluation': ExcelTechnicalEvaluation,
+    'commercial_comparison': ExcelCommercialComparison,
+    'supplier_evaluation': ExcelSupplierEvaluation,
+    'savings_analysis': ExcelSavingsAnalysis,
+    'questions_answers': ExcelQuestionsAnswers
+}
 
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
@@ -170,6 +183,7 @@ def process_tracking_data(df):
 def process_technical_evaluation_data(df):
     """Procesar datos de evaluación técnica"""
     records_created = 0
+    records = []
     
     for _, row in df.iterrows():
         try:
@@ -188,18 +202,21 @@ def process_technical_evaluation_data(df):
             )
             
             db.session.add(record)
+            records.append(record)
             records_created += 1
             
         except Exception as e:
             logger.warning(f"Error processing row: {str(e)}")
             continue
     
+    refresh_rollups('technical_evaluation', records)
     db.session.commit()
     return records_created
 
 def process_commercial_comparison_data(df):
     """Procesar datos de comparación comercial"""
     records_created = 0
+    records = []
     
     for _, row in df.iterrows():
         try:
@@ -216,18 +233,21 @@ def process_commercial_comparison_data(df):
             )
             
             db.session.add(record)
+            records.append(record)
             records_created += 1
             
         except Exception as e:
             logger.warning(f"Error processing row: {str(e)}")
             continue
     
+    refresh_rollups('commercial_comparison', records)
     db.session.commit()
     return records_created
 
 def process_supplier_evaluation_data(df):
     """Procesar datos de evaluación de proveedores"""
     records_created = 0
+    records = []
     
     for _, row in df.iterrows():
         try:
@@ -251,18 +271,21 @@ def process_supplier_evaluation_data(df):
             )
             
             db.session.add(record)
+            records.append(record)
             records_created += 1
             
         except Exception as e:
             logger.warning(f"Error processing row: {str(e)}")
             continue
     
+    refresh_rollups('supplier_evaluation', records)
     db.session.commit()
     return records_created
 
 def process_savings_analysis_data(df):
     """Procesar datos de análisis de ahorros"""
     records_created = 0
+    records = []
     
     for _, row in df.iterrows():
         try:
@@ -282,12 +305,14 @@ def process_savings_analysis_data(df):
             )
             
             db.session.add(record)
+            records.append(record)
             records_created += 1
             
         except Exception as e:
             logger.warning(f"Error processing row: {str(e)}")
             continue
     
+    refresh_rollups('savings_analysis', records)
     db.session.commit()
     return records_created
 
@@ -333,69 +358,21 @@ def process_questions_answers_data(df):
 def download_template(table_type):
     """Descargar plantilla Excel para un tipo de tabla específico"""
     try:
-        templates = {
-            'process_tracking': {
-                'filename': 'plantilla_seguimiento_procesos.xlsx',
-                'columns': [
-                    'Número de Proceso', 'Nombre del Proceso', 'Tipo', 'Estado',
-                    'Presupuesto', 'Fecha de Inicio', 'Fecha de Fin', 'Responsable', 'Notas'
-                ]
-            },
-            'technical_evaluation': {
-                'filename': 'plantilla_evaluacion_tecnica.xlsx',
-                'columns': [
-                    'Número de Proceso', 'Proveedor', 'Criterio', 'Peso (%)',
-                    'Puntuación', 'Comentarios'
-                ]
-            },
-            'commercial_comparison': {
-                'filename': 'plantilla_comparacion_comercial.xlsx',
-                'columns': [
-                    'Número de Proceso', 'Descripción del Ítem', 'Cantidad', 'Unidad',
-                    'Proveedor', 'Precio Unitario', 'Precio Total', 'Tiempo de Entrega', 'Garantía'
-                ]
-            },
-            'supplier_evaluation': {
-                'filename': 'plantilla_evaluacion_proveedores.xlsx',
-                'columns': [
-                    'Proveedor', 'Categoría', 'Criterio', 'Puntuación',
-                    'Puntuación Máxima', 'Comentarios', 'Fecha de Evaluación'
-                ]
-            },
-            'savings_analysis': {
-                'filename': 'plantilla_analisis_ahorros.xlsx',
-                'columns': [
-                    'Número de Proceso', 'Categoría', 'Presupuesto Inicial',
-                    'Precio Final', 'Valor Agregado'
-                ]
-            },
-            'questions_answers': {
-                'filename': 'plantilla_consultas_respuestas.xlsx',
-                'columns': [
-                    'Número de Proceso', 'Número de Pregunta', 'Fecha de Pregunta',
-                    'Proveedor', 'Pregunta', 'Respuesta', 'Fecha de Respuesta'
-                ]
-            }
-        }
-        
-        if table_type not in templates:
+        if table_type not in TEMPLATES:
             return jsonify({'error': 'Tipo de plantilla no soportado'}), 400
         
-        template_info = templates[table_type]
-        
-        # Crear DataFrame vacío con las columnas
-        df = pd.DataFrame(columns=template_info['columns'])
-        
-        # Crear archivo temporal
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.xlsx') as tmp:
-            df.to_excel(tmp.name, index=False, sheet_name='Datos')
-            tmp_path = tmp.name
+        content, etag, filename = get_template(table_type)
         
+        # send_file responde 304 si If-None-Match/If-Modified-Since coinciden
         return send_file(
-            tmp_path,
+            io.BytesIO(content),
             as_attachment=True,
-            download_name=template_info['filename'],
-            mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+            download_name=filename,
+            mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+            etag=etag,
+            last_modified=TEMPLATES_LAST_MODIFIED,
+            max_age=TEMPLATE_MAX_AGE,
+            conditional=True
         )
         
     except Exception as e:
@@ -404,38 +381,18 @@ def download_template(table_type):
 
 @excel_bp.route('/data/<table_type>', methods=['GET'])
 def get_excel_data(table_type):
-    """Obtener datos de Excel procesados"""
+    """Obtener datos de Excel procesados (filtros, orden, proyección y cursor)"""
     try:
-        page = request.args.get('page', 1, type=int)
-        per_page = request.args.get('per_page', 10, type=int)
-        
-        model_map = {
-            'process_tracking': ExcelProcessTracking,
-            'technical_evaluation': ExcelTechnicalEvaluation,
-            'commercial_comparison': ExcelCommercialComparison,
-            'supplier_evaluation': ExcelSupplierEvaluation,
-            'savings_analysis': ExcelSavingsAnalysis,
-            'questions_answers': ExcelQuestionsAnswers
-        }
-        
-        if table_type not in model_map:
+        if table_type not in EXCEL_MODELS:
             return jsonify({'error': 'Tipo de tabla no soportado'}), 400
         
-        model = model_map[table_type]
-        
-        query = model.query.order_by(model.upload_date.desc())
-        
-        data = query.paginate(
-            page=page, per_page=per_page, error_out=False
-        )
+        try:
+            result = query_excel_data(EXCEL_MODELS[table_type], request.args)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
-        return jsonify({
-            'data': [item.to_dict() for item in data.items],
-            'total': data.total,
-            'pages': data.pages,
-            'current_page': page,
-            'table_type': table_type
-        })
+        result['table_type'] = table_type
+        return jsonify(result)
         
     except Exception as e:
         logger.error(f"Error getting Excel data {table_type}: {str(e)}")
@@ -462,61 +419,53 @@ def get_excel_analysis(table_type):
 
 def get_technical_evaluation_analysis():
     """Análisis de evaluación técnica"""
-    # Obtener datos agrupados por proveedor
-    supplier_scores = db.session.query(
-        ExcelTechnicalEvaluation.supplier_name,
-        db.func.sum(ExcelTechnicalEvaluation.weighted_score).label('total_score')
-    ).group_by(ExcelTechnicalEvaluation.supplier_name).all()
+    # Puntajes acumulados por proveedor
+    supplier_scores = get_rollups('technical_evaluation', 'supplier').order_by(
+        ExcelAnalysisRollup.key
+    ).all()
     
     # Obtener criterios más importantes
-    top_criteria = db.session.query(
-        ExcelTechnicalEvaluation.criterion,
-        db.func.avg(ExcelTechnicalEvaluation.weight).label('avg_weight')
-    ).group_by(ExcelTechnicalEvaluation.criterion).order_by(
-        db.func.avg(ExcelTechnicalEvaluation.weight).desc()
+    top_criteria = get_rollups('technical_evaluation', 'criterion').order_by(
+        rollup_average().desc()
     ).limit(5).all()
     
     return jsonify({
         'supplier_scores': [
-            {'supplier': item.supplier_name, 'total_score': float(item.total_score)}
+            {'supplier': item.key, 'total_score': float(item.value_sum)}
             for item in supplier_scores
         ],
         'top_criteria': [
-            {'criterion': item.criterion, 'avg_weight': float(item.avg_weight)}
+            {'criterion': item.key, 'avg_weight': average(item.value_sum, item.value_count)}
             for item in top_criteria
         ]
     })
 
 def get_commercial_comparison_analysis():
     """Análisis de comparación comercial"""
-    # Obtener mejores ofertas por ítem
-    best_offers = db.session.query(
-        ExcelCommercialComparison.item_description,
-        db.func.min(ExcelCommercialComparison.unit_price).label('best_price'),
-        ExcelCommercialComparison.supplier_name
-    ).group_by(ExcelCommercialComparison.item_description).all()
+    # Mejores ofertas por ítem
+    best_offers = get_rollups('commercial_comparison', 'item').order_by(
+        ExcelAnalysisRollup.key
+    ).all()
     
-    # Obtener estadísticas por proveedor
-    supplier_stats = db.session.query(
-        ExcelCommercialComparison.supplier_name,
-        db.func.avg(ExcelCommercialComparison.unit_price).label('avg_price'),
-        db.func.count(ExcelCommercialComparison.id).label('item_count')
-    ).group_by(ExcelCommercialComparison.supplier_name).all()
+    # Estadísticas por proveedor
+    supplier_stats = get_rollups('commercial_comparison', 'supplier').order_by(
+        ExcelAnalysisRollup.key
+    ).all()
     
     return jsonify({
         'best_offers': [
             {
-                'item': item.item_description,
-                'best_price': float(item.best_price),
-                'supplier': item.supplier_name
+                'item': item.key,
+                'best_price': float(item.min_value),
+                'supplier': item.min_label
             }
             for item in best_offers
         ],
         'supplier_stats': [
             {
-                'supplier': item.supplier_name,
-                'avg_price': float(item.avg_price),
-                'item_count': item.item_count
+                'supplier': item.key,
+                'avg_price': average(item.value_sum, item.value_count),
+                'item_count': item.row_count
             }
             for item in supplier_stats
         ]
@@ -524,31 +473,26 @@ def get_commercial_comparison_analysis():
 
 def get_supplier_evaluation_analysis():
     """Análisis de evaluación de proveedores"""
-    # Obtener ranking de proveedores
-    supplier_ranking = db.session.query(
-        ExcelSupplierEvaluation.supplier_name,
-        db.func.avg(ExcelSupplierEvaluation.percentage).label('avg_percentage')
-    ).group_by(ExcelSupplierEvaluation.supplier_name).order_by(
-        db.func.avg(ExcelSupplierEvaluation.percentage).desc()
+    # Ranking de proveedores
+    supplier_ranking = get_rollups('supplier_evaluation', 'supplier').order_by(
+        rollup_average().desc()
     ).all()
     
-    # Obtener análisis por categoría
-    category_analysis = db.session.query(
-        ExcelSupplierEvaluation.evaluation_category,
-        db.func.avg(ExcelSupplierEvaluation.percentage).label('avg_percentage'),
-        db.func.count(ExcelSupplierEvaluation.id).label('evaluation_count')
-    ).group_by(ExcelSupplierEvaluation.evaluation_category).all()
+    # Análisis por categoría
+    category_analysis = get_rollups('supplier_evaluation', 'category').order_by(
+        ExcelAnalysisRollup.key
+    ).all()
     
     return jsonify({
         'supplier_ranking': [
-            {'supplier': item.supplier_name, 'avg_percentage': float(item.avg_percentage)}
+            {'supplier': item.key, 'avg_percentage': average(item.value_sum, item.value_count)}
             for item in supplier_ranking
         ],
         'category_analysis': [
             {
-                'category': item.evaluation_category,
-                'avg_percentage': float(item.avg_percentage),
-                'evaluation_count': item.evaluation_count
+                'category': item.key,
+                'avg_percentage': average(item.value_sum, item.value_count),
+                'evaluation_count': item.row_count
             }
             for item in category_analysis
         ]
@@ -556,29 +500,24 @@ def get_supplier_evaluation_analysis():
 
 def get_savings_analysis_analysis():
     """Análisis de ahorros"""
-    # Obtener ahorros totales
-    total_savings = db.session.query(
-        db.func.sum(ExcelSavingsAnalysis.savings_amount).label('total_savings'),
-        db.func.avg(ExcelSavingsAnalysis.savings_percentage).label('avg_percentage')
-    ).first()
+    # Ahorros totales
+    total_savings = get_rollups('savings_analysis', 'total').first()
     
-    # Obtener ahorros por categoría
-    category_savings = db.session.query(
-        ExcelSavingsAnalysis.category,
-        db.func.sum(ExcelSavingsAnalysis.savings_amount).label('category_savings'),
-        db.func.avg(ExcelSavingsAnalysis.savings_percentage).label('avg_percentage')
-    ).group_by(ExcelSavingsAnalysis.category).all()
+    # Ahorros por categoría
+    category_savings = get_rollups('savings_analysis', 'category').order_by(
+        ExcelAnalysisRollup.key
+    ).all()
     
     return jsonify({
         'total_savings': {
-            'amount': float(total_savings.total_savings) if total_savings.total_savings else 0,
-            'avg_percentage': float(total_savings.avg_percentage) if total_savings.avg_percentage else 0
+            'amount': float(total_savings.value_sum) if total_savings else 0,
+            'avg_percentage': (average(total_savings.secondary_sum, total_savings.secondary_count) or 0) if total_savings else 0
         },
         'category_savings': [
             {
-                'category': item.category,
-                'savings_amount': float(item.category_savings),
-                'avg_percentage': float(item.avg_percentage)
+                'category': item.key,
+                'savings_amount': float(item.value_sum),
+                'avg_percentage': average(item.secondary_sum, item.secondary_count)
             }
             for item in category_savings
         ]
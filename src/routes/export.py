@@ -1,20 +1,32 @@
-from flask import Blueprint, request, jsonify, send_file, render_template_string, current_app
+from flask import Blueprint, request, jsonify, send_file, render_template_string, current_app, Response, stream_with_context
+from werkzeug.utils import secure_filename
 from src.models.database import db
 from src.models.models import Process, Bid, Supplier, Document, Alert, EvaluationCriteria, BidEvaluation, BidRanking
-from datetime import datetime
-import tempfile
+from datetime import date, datetime, timedelta
 import os
 import logging
-from xhtml2pdf import pisa
 import openpyxl
-from openpyxl.styles import Font, Alignment, PatternFill, Border, Side
-from openpyxl.chart import BarChart, PieChart, Reference
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font, PatternFill, Border, Side, NamedStyle
+from openpyxl.utils import get_column_letter
 import io
 import base64
+import itertools
+from concurrent.futures import wait, FIRST_COMPLETED
+from jinja2 import Template
+from src.services.report_service import (
+    REPORT_WORKERS, cached_report_path, report_key, report_status, submit_pdf, clear_failure,
+    wait_for_report, get_job
+)
+from src.services.zip_stream import stream_zip, stream_from_writer
 
 logger = logging.getLogger(__name__)
 export_bp = Blueprint('export', __name__)
 
+PDF_WAIT_TIMEOUT = 120  # segundos de espera en modo síncrono
+PDF_RETRY_AFTER = 2  # segundos sugeridos al cliente en modo asíncrono
+EXCEL_BATCH_SIZE = 1000  # filas leídas por lote al construir informes Excel
+
 # Template HTML para PDF
 PDF_TEMPLATE = """
 <!DOCTYPE html>
@@ -175,71 +187,101 @@ PDF_TEMPLATE = """
 </html>
 """
 
+# Plantilla compilada una sola vez al importar el módulo
+PDF_TEMPLATE_COMPILED = Template(PDF_TEMPLATE)
+
+def build_pdf_context(process):
+    """Preparar los datos del informe PDF de un proceso"""
+    bids = Bid.query.filter_by(process_id=process.id).all()
+    documents = Document.query.filter_by(process_id=process.id).all()
+    criteria = EvaluationCriteria.query.filter_by(process_id=process.id).all()
+    ranking = BidRanking.query.filter_by(process_id=process.id)\
+                             .order_by(BidRanking.ranking_position).all()
+    
+    template_data = {
+        'process': process.to_dict(),
+        'process_type_label': 'Compra Simple' if process.process_type == 'simple_purchase' else 'Licitación Grande',
+        'budget_formatted': format_currency(process.budget) if process.budget else 'N/A',
+        'start_date_formatted': process.start_date.strftime('%d/%m/%Y') if process.start_date else 'N/A',
+        'end_date_formatted': process.end_date.strftime('%d/%m/%Y') if process.end_date else 'N/A',
+        'created_date_formatted': process.created_date.strftime('%d/%m/%Y') if process.created_date else 'N/A',
+        'bids': [],
+        'documents': [],
+        'criteria': [c.to_dict() for c in criteria],
+        'ranking': []
+    }
+    
+    # Formatear ofertas
+    for bid in bids:
+        bid_data = bid.to_dict()
+        bid_data['bid_amount_formatted'] = format_currency(bid.bid_amount) if bid.bid_amount else 'N/A'
+        bid_data['submission_date_formatted'] = bid.submission_date.strftime('%d/%m/%Y') if bid.submission_date else 'N/A'
+        template_data['bids'].append(bid_data)
+    
+    # Formatear documentos
+    for doc in documents:
+        doc_data = doc.to_dict()
+        doc_data['file_size_formatted'] = format_file_size(doc.file_size) if doc.file_size else 'N/A'
+        doc_data['upload_date_formatted'] = doc.upload_date.strftime('%d/%m/%Y') if doc.upload_date else 'N/A'
+        template_data['documents'].append(doc_data)
+    
+    # Formatear ranking
+    for rank in ranking:
+        rank_data = rank.to_dict()
+        rank_data['bid_amount_formatted'] = format_currency(rank.bid_amount) if rank.bid_amount else 'N/A'
+        template_data['ranking'].append(rank_data)
+    
+    return template_data
+
+def prepare_process_pdf(process):
+    """Obtener la ruta en caché del PDF de un proceso y encolarlo si no existe"""
+    template_data = build_pdf_context(process)
+    
+    # La clave depende solo de los datos, no de la fecha de generación
+    path = cached_report_path('process', process.id, report_key(template_data))
+    status = report_status(path)
+    
+    if status is None:
+        html_content = PDF_TEMPLATE_COMPILED.render(
+            current_date=datetime.now().strftime('%d/%m/%Y %H:%M'),
+            **template_data
+        )
+        submit_pdf(path, html_content)
+        status = 'pending'
+    
+    return path, status
+
 @export_bp.route('/process/<int:process_id>/pdf', methods=['GET'])
 def export_process_pdf(process_id):
     """Exportar informe completo de proceso a PDF"""
     try:
-        # Obtener datos del proceso
         process = Process.query.get_or_404(process_id)
-        bids = Bid.query.filter_by(process_id=process_id).all()
-        documents = Document.query.filter_by(process_id=process_id).all()
-        criteria = EvaluationCriteria.query.filter_by(process_id=process_id).all()
-        ranking = BidRanking.query.filter_by(process_id=process_id)\
-                                 .order_by(BidRanking.ranking_position).all()
-        
-        # Preparar datos para el template
-        template_data = {
-            'process': process,
-            'current_date': datetime.now().strftime('%d/%m/%Y %H:%M'),
-            'process_type_label': 'Compra Simple' if process.process_type == 'simple_purchase' else 'Licitación Grande',
-            'budget_formatted': format_currency(process.budget) if process.budget else 'N/A',
-            'start_date_formatted': process.start_date.strftime('%d/%m/%Y') if process.start_date else 'N/A',
-            'end_date_formatted': process.end_date.strftime('%d/%m/%Y') if process.end_date else 'N/A',
-            'created_date_formatted': process.created_date.strftime('%d/%m/%Y') if process.created_date else 'N/A',
-            'bids': [],
-            'documents': [],
-            'criteria': [c.to_dict() for c in criteria],
-            'ranking': []
-        }
-        
-        # Formatear ofertas
-        for bid in bids:
-            bid_data = bid.to_dict()
-            bid_data['bid_amount_formatted'] = format_currency(bid.bid_amount) if bid.bid_amount else 'N/A'
-            bid_data['submission_date_formatted'] = bid.submission_date.strftime('%d/%m/%Y') if bid.submission_date else 'N/A'
-            template_data['bids'].append(bid_data)
+        path, status = prepare_process_pdf(process)
         
-        # Formatear documentos
-        for doc in documents:
-            doc_data = doc.to_dict()
-            doc_data['file_size_formatted'] = format_file_size(doc.file_size) if doc.file_size else 'N/A'
-            doc_data['upload_date_formatted'] = doc.upload_date.strftime('%d/%m/%Y') if doc.upload_date else 'N/A'
-            template_data['documents'].append(doc_data)
-        
-        # Formatear ranking
-        for rank in ranking:
-            rank_data = rank.to_dict()
-            rank_data['bid_amount_formatted'] = format_currency(rank.bid_amount) if rank.bid_amount else 'N/A'
-            template_data['ranking'].append(rank_data)
-        
-        # Renderizar HTML
-        from jinja2 import Template
-        template = Template(PDF_TEMPLATE)
-        html_content = template.render(**template_data)
-        
-        # Generar PDF
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as tmp_file:
-            pisa_status = pisa.CreatePDF(html_content, dest=tmp_file)
-            
-            if pisa_status.err:
-                return jsonify({'error': 'Error generando PDF'}), 500
+        if status == 'pending':
+            # async=1: no bloquear el worker, el cliente reintenta más tarde
+            if request.args.get('async', type=int):
+                response = jsonify({
+                    'status': 'pending',
+                    'message': 'El informe se está generando'
+                })
+                response.headers['Retry-After'] = str(PDF_RETRY_AFTER)
+                return response, 202
             
-            tmp_file_path = tmp_file.name
+            status = wait_for_report(path, PDF_WAIT_TIMEOUT)
+            if status is None:
+                # El worker que lo generaba terminó sin completarlo: encolarlo de nuevo
+                path, status = prepare_process_pdf(process)
+                status = wait_for_report(path, PDF_WAIT_TIMEOUT)
+        
+        if status != 'ready':
+            clear_failure(path)
+            return jsonify({'error': 'Error generando PDF'}), 500
         
         filename = f"proceso_{process.process_number}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
         
         return send_file(
-            tmp_file_path,
+            path,
             as_attachment=True,
             download_name=filename,
             mimetype='application/pdf'
@@ -253,160 +295,300 @@ def export_process_pdf(process_id):
 def export_process_excel(process_id):
     """Exportar informe completo de proceso a Excel"""
     try:
-        # Obtener datos del proceso
         process = Process.query.get_or_404(process_id)
-        bids = Bid.query.filter_by(process_id=process_id).all()
-        documents = Document.query.filter_by(process_id=process_id).all()
-        criteria = EvaluationCriteria.query.filter_by(process_id=process_id).all()
-        ranking = BidRanking.query.filter_by(process_id=process_id)\
-                                 .order_by(BidRanking.ranking_position).all()
+        wb = build_process_workbook(process)
         
-        # Crear workbook
-        wb = openpyxl.Workbook()
+        filename = f"proceso_{process.process_number}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
         
-        # Estilos
-        header_font = Font(bold=True, color="FFFFFF")
-        header_fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
-        border = Border(
-            left=Side(style='thin'),
-            right=Side(style='thin'),
-            top=Side(style='thin'),
-            bottom=Side(style='thin')
+        # Los bytes del XLSX se envían a medida que openpyxl los escribe
+        return Response(
+            stream_from_writer(wb.save),
+            mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+            headers={'Content-Disposition': f'attachment; filename="{secure_filename(filename)}"'}
         )
         
-        # Hoja 1: Información General
-        ws1 = wb.active
-        ws1.title = "Información General"
-        
-        # Título
-        ws1['A1'] = f"Informe de Proceso: {process.process_number}"
-        ws1['A1'].font = Font(bold=True, size=16)
-        ws1.merge_cells('A1:B1')
+    except Exception as e:
+        logger.error(f"Error exporting process Excel: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+def add_report_styles(wb):
+    """Registrar una sola vez por libro los estilos con nombre del informe"""
+    border = Border(
+        left=Side(style='thin'),
+        right=Side(style='thin'),
+        top=Side(style='thin'),
+        bottom=Side(style='thin')
+    )
+    
+    styles = {
+        'report_title': {'font': Font(bold=True, size=16)},
+        'report_label': {'font': Font(bold=True), 'border': border},
+        'report_header': {
+            'font': Font(bold=True, color="FFFFFF"),
+            'fill': PatternFill(start_color="366092", end_color="366092", fill_type="solid"),
+            'border': border
+        },
+        'report_cell': {'border': border},
+        'report_winner': {
+            'fill': PatternFill(start_color="D4EDDA", end_color="D4EDDA", fill_type="solid"),
+            'border': border
+        },
+    }
+    
+    for name, attributes in styles.items():
+        style = NamedStyle(name=name)
+        for attribute, value in attributes.items():
+            setattr(style, attribute, value)
+        wb.add_named_style(style)
+
+def styled_row(ws, values, style):
+    """Construir una fila de celdas write-only con un estilo con nombre"""
+    row = []
+    for value in values:
+        cell = WriteOnlyCell(ws, value=value)
+        cell.style = style
+        row.append(cell)
+    return row
+
+def add_table_sheet(wb, title, headers, widths, rows, row_style=None):
+    """Agregar una hoja tabular solo si hay filas, escribiéndolas en streaming"""
+    rows = iter(rows)
+    first_row = next(rows, None)
+    if first_row is None:
+        return None
+    
+    ws = wb.create_sheet(title=title)
+    for col, width in enumerate(widths, start=1):
+        ws.column_dimensions[get_column_letter(col)].width = width
+    ws.freeze_panes = 'A2'
+    
+    ws.append(styled_row(ws, headers, 'report_header'))
+    for values in itertools.chain([first_row], rows):
+        style = row_style(values) if row_style else 'report_cell'
+        ws.append(styled_row(ws, values, style))
+    return ws
+
+def build_process_workbook(process):
+    """Construir el informe Excel de un proceso en modo write-only (memoria constante)"""
+    process_id = process.id
+    
+    wb = openpyxl.Workbook(write_only=True)
+    add_report_styles(wb)
+    
+    # Hoja 1: Información General
+    ws1 = wb.create_sheet(title="Información General")
+    ws1.column_dimensions['A'].width = 20
+    ws1.column_dimensions['B'].width = 40
+    
+    ws1.append(styled_row(ws1, [f"Informe de Proceso: {process.process_number}"], 'report_title'))
+    ws1.append([])
+    
+    info_data = [
+        ['Número de Proceso', process.process_number],
+        ['Título', process.title],
+        ['Descripción', process.description or 'N/A'],
+        ['Tipo', 'Compra Simple' if process.process_type == 'simple_purchase' else 'Licitación Grande'],
+        ['Estado', process.status],
+        ['Presupuesto', process.budget or 'N/A'],
+        ['Fecha de Inicio', process.start_date.strftime('%d/%m/%Y') if process.start_date else 'N/A'],
+        ['Fecha de Fin', process.end_date.strftime('%d/%m/%Y') if process.end_date else 'N/A'],
+        ['Fecha de Creación', process.created_date.strftime('%d/%m/%Y') if process.created_date else 'N/A'],
+        ['Generado el', datetime.now().strftime('%d/%m/%Y %H:%M')]
+    ]
+    
+    for label, value in info_data:
+        ws1.append(styled_row(ws1, [label], 'report_label') + styled_row(ws1, [value], 'report_cell'))
+    
+    # Hoja 2: Ofertas (nombre del proveedor por join, sin cargas perezosas por fila)
+    bids = db.session.query(
+        Supplier.name, Bid.bid_amount, Bid.total_score, Bid.status, Bid.submission_date
+    ).outerjoin(Supplier, Bid.supplier_id == Supplier.id)\
+     .filter(Bid.process_id == process_id)\
+     .order_by(Bid.id).yield_per(EXCEL_BATCH_SIZE)
+    
+    add_table_sheet(
+        wb, "Ofertas",
+        ['Proveedor', 'Monto', 'Puntaje Total', 'Estado', 'Fecha de Envío'],
+        [15] * 5,
+        (
+            [
+                name or 'N/A',
+                amount or 0,
+                total_score or 'N/A',
+                status,
+                submission_date.strftime('%d/%m/%Y') if submission_date else 'N/A'
+            ]
+            for name, amount, total_score, status, submission_date in bids
+        )
+    )
+    
+    # Hoja 3: Ranking
+    ranking = db.session.query(
+        BidRanking.ranking_position, Supplier.name, Bid.bid_amount,
+        BidRanking.technical_score, BidRanking.commercial_score, BidRanking.financial_score,
+        BidRanking.weighted_total_score, BidRanking.recommendation
+    ).join(Bid, BidRanking.bid_id == Bid.id)\
+     .outerjoin(Supplier, Bid.supplier_id == Supplier.id)\
+     .filter(BidRanking.process_id == process_id)\
+     .order_by(BidRanking.ranking_position).yield_per(EXCEL_BATCH_SIZE)
+    
+    add_table_sheet(
+        wb, "Ranking",
+        ['Posición', 'Proveedor', 'Monto', 'Puntaje Técnico', 'Puntaje Comercial', 'Puntaje Financiero', 'Puntaje Total', 'Recomendación'],
+        [12] * 8,
+        (
+            [position, name, amount or 0, technical or 0, commercial or 0, financial or 0, total, recommendation]
+            for position, name, amount, technical, commercial, financial, total, recommendation in ranking
+        ),
+        # Resaltar ganador
+        row_style=lambda values: 'report_winner' if values[0] == 1 else 'report_cell'
+    )
+    
+    # Hoja 4: Criterios de Evaluación
+    criteria = db.session.query(
+        EvaluationCriteria.name, EvaluationCriteria.criteria_type, EvaluationCriteria.weight,
+        EvaluationCriteria.max_score, EvaluationCriteria.description
+    ).filter(EvaluationCriteria.process_id == process_id)\
+     .order_by(EvaluationCriteria.id).yield_per(EXCEL_BATCH_SIZE)
+    
+    add_table_sheet(
+        wb, "Criterios",
+        ['Criterio', 'Tipo', 'Peso (%)', 'Puntaje Máximo', 'Descripción'],
+        [20, 12, 10, 12, 30],
+        (
+            [name, criteria_type, weight, max_score, description or 'N/A']
+            for name, criteria_type, weight, max_score, description in criteria
+        )
+    )
+    
+    return wb
+
+def build_process_excel(process):
+    """Construir el informe Excel de un proceso y devolverlo como bytes"""
+    buffer = io.BytesIO()
+    build_process_workbook(process).save(buffer)
+    return buffer.getvalue()
+
+def parse_bundle_filters(params):
+    """Construir la consulta de procesos para un paquete de informes"""
+    query = db.session.query(Process.id)
+    
+    ids = params.get('ids')
+    if ids:
+        if isinstance(ids, str):
+            ids = ids.split(',')
+        query = query.filter(Process.id.in_([int(i) for i in ids]))
+    
+    status = params.get('status')
+    if status:
+        if isinstance(status, str):
+            status = status.split(',')
+        query = query.filter(Process.status.in_(status))
+    
+    if params.get('date_from'):
+        query = query.filter(Process.created_date >= datetime.fromisoformat(params['date_from'].replace('Z', '+00:00')))
+    
+    if params.get('date_to'):
+        try:
+            # Solo fecha: incluir los procesos creados durante todo ese día
+            day_after = date.fromisoformat(params['date_to']) + timedelta(days=1)
+            query = query.filter(Process.created_date < datetime.combine(day_after, datetime.min.time()))
+        except ValueError:
+            query = query.filter(Process.created_date <= datetime.fromisoformat(params['date_to'].replace('Z', '+00:00')))
+    
+    return query.order_by(Process.id)
+
+def iter_bundle_entries(process_ids, formats):
+    """Producir (nombre, ruta o bytes) de cada informe a medida que termina"""
+    in_flight = {}
+    failures = []
+    window = max(REPORT_WORKERS * 2, 1)
+    
+    def finished(futures):
+        for future in futures:
+            arcname, path = in_flight.pop(future)
+            if wait_for_report(path, PDF_WAIT_TIMEOUT) == 'ready':
+                yield arcname, path
+            else:
+                clear_failure(path)
+                failures.append(arcname)
+    
+    for process_id in process_ids:
+        process = db.session.get(Process, process_id)
+        if process is None:
+            continue
+        base_name = secure_filename(f"proceso_{process.process_number}") or f"proceso_{process.id}"
         
-        # Información del proceso
-        info_data = [
-            ['Número de Proceso', process.process_number],
-            ['Título', process.title],
-            ['Descripción', process.description or 'N/A'],
-            ['Tipo', 'Compra Simple' if process.process_type == 'simple_purchase' else 'Licitación Grande'],
-            ['Estado', process.status],
-            ['Presupuesto', process.budget or 'N/A'],
-            ['Fecha de Inicio', process.start_date.strftime('%d/%m/%Y') if process.start_date else 'N/A'],
-            ['Fecha de Fin', process.end_date.strftime('%d/%m/%Y') if process.end_date else 'N/A'],
-            ['Fecha de Creación', process.created_date.strftime('%d/%m/%Y') if process.created_date else 'N/A'],
-            ['Generado el', datetime.now().strftime('%d/%m/%Y %H:%M')]
-        ]
+        if 'excel' in formats:
+            yield f"{base_name}.xlsx", build_process_excel(process)
         
-        for i, (label, value) in enumerate(info_data, start=3):
-            ws1[f'A{i}'] = label
-            ws1[f'B{i}'] = value
-            ws1[f'A{i}'].font = Font(bold=True)
-            ws1[f'A{i}'].border = border
-            ws1[f'B{i}'].border = border
+        if 'pdf' in formats:
+            path, status = prepare_process_pdf(process)
+            future = get_job(path)
+            
+            if status == 'ready':
+                yield f"{base_name}.pdf", path
+            elif future is not None:
+                in_flight[future] = (f"{base_name}.pdf", path)
+            else:
+                # Generado por otro worker: esperar a que aparezca en la caché
+                if wait_for_report(path, PDF_WAIT_TIMEOUT) == 'ready':
+                    yield f"{base_name}.pdf", path
+                else:
+                    clear_failure(path)
+                    failures.append(f"{base_name}.pdf")
         
-        # Ajustar ancho de columnas
-        ws1.column_dimensions['A'].width = 20
-        ws1.column_dimensions['B'].width = 40
+        # Evitar que la sesión acumule miles de objetos
+        db.session.expunge_all()
         
-        # Hoja 2: Ofertas
-        if bids:
-            ws2 = wb.create_sheet(title="Ofertas")
-            
-            # Headers
-            headers = ['Proveedor', 'Monto', 'Puntaje Total', 'Estado', 'Fecha de Envío']
-            for col, header in enumerate(headers, start=1):
-                cell = ws2.cell(row=1, column=col, value=header)
-                cell.font = header_font
-                cell.fill = header_fill
-                cell.border = border
-            
-            # Datos
-            for row, bid in enumerate(bids, start=2):
-                ws2.cell(row=row, column=1, value=bid.supplier.name if bid.supplier else 'N/A').border = border
-                ws2.cell(row=row, column=2, value=bid.bid_amount or 0).border = border
-                ws2.cell(row=row, column=3, value=bid.total_score or 'N/A').border = border
-                ws2.cell(row=row, column=4, value=bid.status).border = border
-                ws2.cell(row=row, column=5, value=bid.submission_date.strftime('%d/%m/%Y') if bid.submission_date else 'N/A').border = border
-            
-            # Ajustar ancho de columnas
-            for col in range(1, 6):
-                ws2.column_dimensions[chr(64 + col)].width = 15
+        # Entregar lo que ya terminó y limitar los informes en curso
+        done = [future for future in in_flight if future.done()]
+        if len(in_flight) - len(done) >= window:
+            done_set, _ = wait(list(in_flight), return_when=FIRST_COMPLETED)
+            done = list(done_set)
+        yield from finished(done)
+    
+    while in_flight:
+        done_set, _ = wait(list(in_flight), return_when=FIRST_COMPLETED)
+        yield from finished(done_set)
+    
+    if failures:
+        yield 'errores.txt', ('No se pudieron generar los siguientes informes:\n' + '\n'.join(failures)).encode('utf-8')
+
+@export_bp.route('/processes/bundle', methods=['GET', 'POST'])
+def export_processes_bundle():
+    """Exportar informes de varios procesos en un único ZIP transmitido en streaming"""
+    try:
+        if request.method == 'POST':
+            params = request.get_json(silent=True) or {}
+        else:
+            params = request.args.to_dict()
         
-        # Hoja 3: Ranking
-        if ranking:
-            ws3 = wb.create_sheet(title="Ranking")
-            
-            # Headers
-            headers = ['Posición', 'Proveedor', 'Monto', 'Puntaje Técnico', 'Puntaje Comercial', 'Puntaje Financiero', 'Puntaje Total', 'Recomendación']
-            for col, header in enumerate(headers, start=1):
-                cell = ws3.cell(row=1, column=col, value=header)
-                cell.font = header_font
-                cell.fill = header_fill
-                cell.border = border
-            
-            # Datos
-            for row, rank in enumerate(ranking, start=2):
-                ws3.cell(row=row, column=1, value=rank.ranking_position).border = border
-                ws3.cell(row=row, column=2, value=rank.supplier_name).border = border
-                ws3.cell(row=row, column=3, value=rank.bid_amount or 0).border = border
-                ws3.cell(row=row, column=4, value=rank.technical_score or 0).border = border
-                ws3.cell(row=row, column=5, value=rank.commercial_score or 0).border = border
-                ws3.cell(row=row, column=6, value=rank.financial_score or 0).border = border
-                ws3.cell(row=row, column=7, value=rank.weighted_total_score).border = border
-                ws3.cell(row=row, column=8, value=rank.recommendation).border = border
-                
-                # Resaltar ganador
-                if rank.ranking_position == 1:
-                    for col in range(1, 9):
-                        ws3.cell(row=row, column=col).fill = PatternFill(start_color="D4EDDA", end_color="D4EDDA", fill_type="solid")
-            
-            # Ajustar ancho de columnas
-            for col in range(1, 9):
-                ws3.column_dimensions[chr(64 + col)].width = 12
+        formats = params.get('formats', 'pdf')
+        if isinstance(formats, str):
+            formats = [f.strip() for f in formats.split(',') if f.strip()]
+        if not formats or any(f not in ('pdf', 'excel') for f in formats):
+            return jsonify({'error': 'Formato no soportado. Use pdf y/o excel'}), 400
         
-        # Hoja 4: Criterios de Evaluación
-        if criteria:
-            ws4 = wb.create_sheet(title="Criterios")
-            
-            # Headers
-            headers = ['Criterio', 'Tipo', 'Peso (%)', 'Puntaje Máximo', 'Descripción']
-            for col, header in enumerate(headers, start=1):
-                cell = ws4.cell(row=1, column=col, value=header)
-                cell.font = header_font
-                cell.fill = header_fill
-                cell.border = border
-            
-            # Datos
-            for row, criterion in enumerate(criteria, start=2):
-                ws4.cell(row=row, column=1, value=criterion.name).border = border
-                ws4.cell(row=row, column=2, value=criterion.criteria_type).border = border
-                ws4.cell(row=row, column=3, value=criterion.weight).border = border
-                ws4.cell(row=row, column=4, value=criterion.max_score).border = border
-                ws4.cell(row=row, column=5, value=criterion.description or 'N/A').border = border
-            
-            # Ajustar ancho de columnas
-            ws4.column_dimensions['A'].width = 20
-            ws4.column_dimensions['B'].width = 12
-            ws4.column_dimensions['C'].width = 10
-            ws4.column_dimensions['D'].width = 12
-            ws4.column_dimensions['E'].width = 30
+        try:
+            process_ids = [row.id for row in parse_bundle_filters(params).all()]
+        except ValueError:
+            return jsonify({'error': 'Filtros inválidos'}), 400
         
-        # Guardar archivo temporal
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.xlsx') as tmp_file:
-            wb.save(tmp_file.name)
-            tmp_file_path = tmp_file.name
+        if not process_ids:
+            return jsonify({'error': 'No hay procesos que coincidan con el filtro'}), 404
         
-        filename = f"proceso_{process.process_number}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
+        filename = f"informes_procesos_{datetime.now().strftime('%Y%m%d_%H%M%S')}.zip"
+        logger.info(f"Streaming report bundle: {len(process_ids)} processes, formats={formats}")
         
-        return send_file(
-            tmp_file_path,
-            as_attachment=True,
-            download_name=filename,
-            mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+        return Response(
+            stream_with_context(stream_zip(iter_bundle_entries(process_ids, formats))),
+            mimetype='application/zip',
+            headers={'Content-Disposition': f'attachment; filename="{filename}"'}
         )
         
     except Exception as e:
-        logger.error(f"Error exporting process Excel: {str(e)}")
+        logger.error(f"Error exporting process bundle: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
 def format_currency(amount):
@@ -1,6 +1,9 @@
 from flask import Blueprint, request, jsonify
 from src.models.database import db
 from src.models.models import Process
+from src.services.deadline_timer import deadline_timer
+from src.services.event_bus import publish
+from src.services.storage_usage import clear_scope
 from datetime import datetime
 import logging
 
@@ -100,6 +103,8 @@ def create_process():
         
         db.session.add(process)
         db.session.commit()
+        deadline_timer.track(process)
+        publish('process.created', {'id': process.id, 'status': process.status})
         
         logger.info(f"Process created: {process.process_number}")
         return jsonify(process.to_dict()), 201
@@ -155,6 +160,8 @@ def update_process(process_id):
         process.notes = data.get('notes', process.notes)
         
         db.session.commit()
+        deadline_timer.track(process)
+        publish('process.updated', {'id': process.id, 'status': process.status})
         
         logger.info(f"Process updated: {process.process_number}")
         return jsonify(process.to_dict())
@@ -175,7 +182,10 @@ def delete_process(process_id):
             return jsonify({'error': 'No se puede eliminar un proceso con ofertas asociadas'}), 400
         
         db.session.delete(process)
+        clear_scope('process', process_id)
         db.session.commit()
+        deadline_timer.forget(process_id)
+        publish('process.deleted', {'id': process_id})
         
         logger.info(f"Process deleted: {process.process_number}")
         return jsonify({'message': 'Proceso eliminado exitosamente'})
@@ -1,6 +1,7 @@
 from flask import Blueprint, request, jsonify
 from src.models.database import db
 from src.models.models import Supplier
+from src.services.storage_usage import clear_scope
 from datetime import datetime
 import logging
 
@@ -137,6 +138,7 @@ def delete_supplier(supplier_id):
             return jsonify({'error': 'No se puede eliminar un proveedor con ofertas asociadas'}), 400
         
         db.session.delete(supplier)
+        clear_scope('supplier', supplier_id)
         db.session.commit()
         
         logger.info(f"Supplier deleted: {supplier.name}")
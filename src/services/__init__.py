@@ -0,0 +1,2 @@
+# Archivo __init__.py para el paquete services
+
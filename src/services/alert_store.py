@@ -0,0 +1,183 @@
+"""
+Almacenamiento de alertas.
+
+La tabla alerts guarda solo alertas vigentes: las resueltas o descartadas
+con más de ALERT_RETENTION_DAYS se trasladan por lotes a alerts_archive, de
+modo que las consultas habituales recorren únicamente alertas activas y
+recientes. El orden por prioridad usa la columna numérica priority_rank
+(indexada junto con status y created_date) en lugar de una expresión CASE.
+Las acciones masivas (descartar, resolver, eliminar) se ejecutan como una
+única sentencia UPDATE o DELETE sobre el conjunto seleccionado.
+"""
+
+from datetime import datetime, timedelta
+import logging
+import os
+
+from src.models.database import db
+from src.models.models import Alert, AlertArchive, PRIORITY_RANKS, DEFAULT_PRIORITY_RANK
+
+logger = logging.getLogger(__name__)
+
+ALERT_RETENTION_DAYS = int(os.environ.get('ALERT_RETENTION_DAYS', 90))
+ARCHIVE_BATCH_SIZE = 1000
+ARCHIVABLE_STATUSES = ('resolved', 'dismissed')
+ARCHIVED_COLUMNS = [
+    'title', 'message', 'alert_type', 'priority', 'priority_rank', 'status',
+    'process_id', 'created_date', 'due_date', 'resolved_date'
+]
+
+def priority_order():
+    """Orden de alertas: más urgentes primero y, dentro de cada prioridad, más recientes"""
+    return (Alert.priority_rank, Alert.created_date.desc())
+
+def backfill_priority_ranks():
+    """Calcular el rango de las alertas que aún no lo tienen (bases de datos existentes)"""
+    rank = db.case(
+        *[(Alert.priority == priority, value) for priority, value in PRIORITY_RANKS.items()],
+        else_=DEFAULT_PRIORITY_RANK
+    )
+
+    updated = Alert.query.filter(Alert.priority_rank.is_(None)).update(
+        {'priority_rank': rank}, synchronize_session=False
+    )
+    db.session.commit()
+
+    if updated:
+        logger.info(f"Priority rank calculated for {updated} alerts")
+    return updated
+
+def backfill_archive_alert_ids():
+    """Migrar archivos creados cuando alerts_archive.id era el id de la alerta"""
+    if db.engine.dialect.name == 'postgresql':
+        # La columna id se creó sin secuencia: darle una que continúe desde el máximo
+        with db.engine.begin() as connection:
+            default = connection.execute(db.text(
+                "SELECT column_default FROM information_schema.columns "
+                "WHERE table_name = 'alerts_archive' AND column_name = 'id'"
+            )).scalar()
+            if default is None:
+                connection.execute(db.text('CREATE SEQUENCE IF NOT EXISTS alerts_archive_id_seq OWNED BY alerts_archive.id'))
+                connection.execute(db.text(
+                    "SELECT setval('alerts_archive_id_seq', COALESCE((SELECT MAX(id) FROM alerts_archive), 0) + 1, false)"
+                ))
+                connection.execute(db.text(
+                    "ALTER TABLE alerts_archive ALTER COLUMN id SET DEFAULT nextval('alerts_archive_id_seq')"
+                ))
+                logger.info("Sequence added to alerts_archive.id")
+
+    updated = AlertArchive.query.filter(AlertArchive.alert_id.is_(None)).update(
+        {'alert_id': AlertArchive.id}, synchronize_session=False
+    )
+    db.session.commit()
+
+    if updated:
+        logger.info(f"Alert id copied for {updated} archived alerts")
+    return updated
+
+def archivable_alerts(cutoff):
+    """Alertas resueltas o descartadas anteriores a la fecha de corte"""
+    age = db.func.coalesce(Alert.resolved_date, Alert.created_date)
+    return Alert.query.filter(Alert.status.in_(ARCHIVABLE_STATUSES), age < cutoff)
+
+def archive_alerts(older_than_days=None, now=None):
+    """Trasladar al archivo las alertas cerradas antiguas; devuelve cuántas se movieron"""
+    now = now or datetime.utcnow()
+    days = ALERT_RETENTION_DAYS if older_than_days is None else older_than_days
+    if days < 0:
+        raise ValueError('La antigüedad debe ser un número de días positivo')
+    cutoff = now - timedelta(days=days)
+
+    archived = 0
+    while True:
+        # Lotes cortos por id para no bloquear la tabla durante todo el traslado
+        ids = [
+            alert_id for (alert_id,) in archivable_alerts(cutoff).with_entities(Alert.id)
+            .order_by(Alert.id).limit(ARCHIVE_BATCH_SIZE)
+        ]
+        if not ids:
+            break
+
+        source = db.select(
+            Alert.id, *[getattr(Alert, name) for name in ARCHIVED_COLUMNS], db.literal(now)
+        ).where(Alert.id.in_(ids))
+
+        db.session.execute(
+            db.insert(AlertArchive).from_select(['alert_id'] + ARCHIVED_COLUMNS + ['archived_date'], source)
+        )
+        Alert.query.filter(Alert.id.in_(ids)).delete(synchronize_session=False)
+        db.session.commit()
+
+        archived += len(ids)
+
+    if archived:
+        logger.info(f"Archived {archived} alerts closed before {cutoff.isoformat()}")
+    return archived
+
+BULK_ACTIONS = {
+    'dismiss': 'dismissed',
+    'resolve': 'resolved',
+    'delete': None,
+}
+BULK_FILTERS = ('process_id', 'alert_type', 'priority', 'status', 'older_than_days')
+MAX_BULK_IDS = 10000
+
+def _as_list(value):
+    """Aceptar un valor único o una lista"""
+    return value if isinstance(value, list) else [value]
+
+def bulk_alert_query(ids=None, filters=None):
+    """Consulta de alertas seleccionadas por lista de ids y/o filtros"""
+    filters = filters or {}
+
+    unknown = set(filters) - set(BULK_FILTERS)
+    if unknown:
+        raise ValueError(f'Filtro no válido: {", ".join(sorted(unknown))}')
+
+    if not ids and not any(value not in (None, '', []) for value in filters.values()):
+        # Evitar modificar toda la tabla por un pedido incompleto
+        raise ValueError('Debe indicar ids o al menos un filtro')
+
+    query = Alert.query
+
+    if ids:
+        if len(ids) > MAX_BULK_IDS:
+            raise ValueError(f'Máximo {MAX_BULK_IDS} ids por operación')
+        try:
+            query = query.filter(Alert.id.in_([int(alert_id) for alert_id in ids]))
+        except (TypeError, ValueError):
+            raise ValueError('Los ids deben ser números enteros')
+
+    for name in ('process_id', 'alert_type', 'priority', 'status'):
+        value = filters.get(name)
+        if value not in (None, '', []):
+            query = query.filter(getattr(Alert, name).in_(_as_list(value)))
+
+    older_than_days = filters.get('older_than_days')
+    if older_than_days not in (None, ''):
+        try:
+            days = float(older_than_days)
+        except (TypeError, ValueError):
+            raise ValueError('older_than_days debe ser numérico')
+        query = query.filter(Alert.created_date < datetime.utcnow() - timedelta(days=days))
+
+    return query
+
+def bulk_alert_action(action, ids=None, filters=None):
+    """Descartar, resolver o eliminar en una sola sentencia; devuelve la cantidad afectada"""
+    if action not in BULK_ACTIONS:
+        raise ValueError(f'Acción no válida: {action}')
+
+    query = bulk_alert_query(ids, filters)
+
+    if action == 'delete':
+        affected = query.delete(synchronize_session=False)
+    else:
+        status = BULK_ACTIONS[action]
+        affected = query.filter(Alert.status != status).update({
+            'status': status,
+            'resolved_date': datetime.utcnow() if status == 'resolved' else None,
+        }, synchronize_session=False)
+
+    db.session.commit()
+    return affected
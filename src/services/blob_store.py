@@ -0,0 +1,183 @@
+"""
+Almacén de documentos direccionado por contenido.
+
+Cada archivo se copia a un temporal calculando su SHA-256 mientras se lee y
+luego se guarda una sola vez bajo su huella, repartido en subdirectorios por
+los primeros caracteres (UPLOAD_FOLDER/blobs/ab/cd/<sha256>) para que ningún
+directorio acumule cientos de miles de entradas.
+Los registros Document apuntan a la huella mediante content_hash: la cantidad
+de documentos con la misma huella es el contador de referencias, y el archivo
+solo se elimina cuando ya no lo referencia ningún documento.
+
+Las operaciones sobre una misma huella se serializan con un bloqueo de
+archivo (compartido entre workers) que cubre desde la colocación del archivo
+hasta el commit del documento, de modo que una subida y un borrado
+simultáneos no pueden dejar un documento sin su archivo.
+"""
+
+from collections import namedtuple
+from contextlib import contextmanager
+import hashlib
+import logging
+import os
+import threading
+import uuid
+
+from flask import current_app
+
+from src.models.database import db
+from src.models.models import Document
+
+try:
+    import fcntl
+except ImportError:  # Windows: bloqueo solo dentro del proceso
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 1024 * 1024  # 1MB
+BLOB_DIR = 'blobs'
+TMP_DIR = 'tmp'
+LOCK_DIR = 'locks'
+SHARD_LEVELS = 2  # blobs/ab/cd/<sha256>: hasta 65536 directorios
+
+StoredBlob = namedtuple('StoredBlob', ['digest', 'path', 'size', 'deduplicated'])
+
+_thread_locks = {}
+_thread_locks_guard = threading.Lock()
+
+def storage_root():
+    """Directorio raíz de los archivos subidos"""
+    return current_app.config['UPLOAD_FOLDER']
+
+def storage_dir(name):
+    """Subdirectorio del almacén (se crea si no existe)"""
+    path = os.path.join(storage_root(), name)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+def is_digest(name):
+    """Indica si un nombre de archivo es una huella SHA-256"""
+    return len(name) == 64 and all(c in '0123456789abcdef' for c in name)
+
+def blob_path(digest):
+    """Ruta del archivo correspondiente a una huella"""
+    shards = [digest[level * 2:level * 2 + 2] for level in range(SHARD_LEVELS)]
+    return os.path.join(storage_dir(BLOB_DIR), *shards, digest)
+
+@contextmanager
+def digest_lock(digest):
+    """Bloqueo exclusivo por huella (repartido en 256 archivos de bloqueo)"""
+    stripe = digest[:2]
+
+    with _thread_locks_guard:
+        thread_lock = _thread_locks.setdefault(stripe, threading.Lock())
+
+    with thread_lock:
+        if fcntl is None:
+            yield
+            return
+
+        with open(os.path.join(storage_dir(LOCK_DIR), f'{stripe}.lock'), 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+def write_temp(stream, chunk_size=CHUNK_SIZE):
+    """Copiar un flujo a un archivo temporal calculando su huella; devuelve (ruta, huella, tamaño)"""
+    tmp_path = os.path.join(storage_dir(TMP_DIR), f'{uuid.uuid4().hex}.upload')
+    digest = hashlib.sha256()
+    size = 0
+
+    try:
+        with open(tmp_path, 'wb') as tmp_file:
+            while True:
+                chunk = stream.read(chunk_size)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                tmp_file.write(chunk)
+                size += len(chunk)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    return tmp_path, digest.hexdigest(), size
+
+def ref_count(digest):
+    """Cantidad de documentos que referencian una huella"""
+    return db.session.query(db.func.count(Document.id)).filter(Document.content_hash == digest).scalar()
+
+def _remove_unreferenced(digest):
+    """Eliminar el archivo de una huella sin referencias (llamar con el bloqueo tomado)"""
+    if ref_count(digest):
+        return False
+
+    path = blob_path(digest)
+    if os.path.exists(path):
+        os.remove(path)
+        logger.info(f"Blob removed: {digest}")
+    return True
+
+@contextmanager
+def store_file(tmp_path, digest, size):
+    """Colocar un temporal ya calculado en el almacén y mantener el bloqueo mientras se registra"""
+    try:
+        with digest_lock(digest):
+            path = blob_path(digest)
+            deduplicated = os.path.exists(path)
+            if deduplicated:
+                os.remove(tmp_path)
+            else:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                os.replace(tmp_path, path)
+
+            try:
+                yield StoredBlob(digest, path, size, deduplicated)
+            except Exception:
+                # El documento no llegó a registrarse: no dejar un archivo huérfano
+                db.session.rollback()
+                _remove_unreferenced(digest)
+                raise
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+@contextmanager
+def store_stream(stream, chunk_size=CHUNK_SIZE):
+    """Guardar un flujo en el almacén; el Document debe confirmarse dentro del bloque"""
+    tmp_path, digest, size = write_temp(stream, chunk_size)
+    with store_file(tmp_path, digest, size) as blob:
+        yield blob
+
+def release_blob(digest):
+    """Eliminar el archivo de una huella si ya no la referencia ningún documento"""
+    with digest_lock(digest):
+        return _remove_unreferenced(digest)
+
+def shard_flat_blobs():
+    """Mover al esquema de subdirectorios los archivos guardados sin repartir; devuelve cuántos"""
+    moved = 0
+
+    with os.scandir(storage_dir(BLOB_DIR)) as entries:
+        flat = [entry.name for entry in entries if entry.is_file() and is_digest(entry.name)]
+
+    for digest in flat:
+        with digest_lock(digest):
+            source = os.path.join(storage_dir(BLOB_DIR), digest)
+            target = blob_path(digest)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            os.replace(source, target)
+
+            Document.query.filter_by(content_hash=digest).update(
+                {'file_path': target}, synchronize_session=False
+            )
+            db.session.commit()
+        moved += 1
+
+    if moved:
+        logger.info(f"Moved {moved} blobs into sharded directories")
+    return moved
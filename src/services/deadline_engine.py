@@ -0,0 +1,166 @@
+"""
+Verificación de vencimientos de procesos basada en conjuntos.
+
+Una sola consulta obtiene los procesos que necesitan alerta y todavía no la
+tienen (anti-join NOT EXISTS), y las alertas se insertan en una única
+sentencia. El índice único parcial uq_alerts_active_auto_process_type
+garantiza que dos verificaciones concurrentes no dupliquen alertas activas
+(solo para los tipos automáticos; las alertas manuales pueden repetirse).
+"""
+
+from datetime import datetime, timedelta
+import logging
+
+from src.models.database import db, dialect_insert
+from src.models.models import AUTOMATIC_ALERT_TYPES, Alert, Process, priority_rank
+from src.services.event_bus import publish
+
+logger = logging.getLogger(__name__)
+
+WARNING_DAYS = 7  # Alertar 7 días antes del vencimiento
+HIGH_PRIORITY_DAYS = 3
+MONITORED_STATUSES = ('active', 'evaluation')
+
+def deadline_alert_type(now):
+    """Expresión SQL con el tipo de alerta que corresponde a cada proceso"""
+    return db.case((Process.end_date < now, 'process_expired'), else_='deadline')
+
+def build_deadline_alert(process_id, process_number, title, end_date, now):
+    """Construir los valores de la alerta de un proceso (mismo texto que la verificación manual)"""
+    if end_date < now:
+        return {
+            'title': f'Proceso vencido: {process_number}',
+            'message': f'El proceso "{title}" venció el {end_date.strftime("%d/%m/%Y")} y requiere atención',
+            'alert_type': 'process_expired',
+            'priority': 'critical',
+            'priority_rank': priority_rank('critical'),
+            'status': 'active',
+            'process_id': process_id,
+            'created_date': now,
+        }
+
+    days_remaining = (end_date - now).days
+    priority = 'high' if days_remaining <= HIGH_PRIORITY_DAYS else 'medium'
+    return {
+        'title': f'Proceso próximo a vencer: {process_number}',
+        'message': f'El proceso "{title}" vence en {days_remaining} días ({end_date.strftime("%d/%m/%Y")})',
+        'alert_type': 'deadline',
+        'priority': priority,
+        'priority_rank': priority_rank(priority),
+        'status': 'active',
+        'process_id': process_id,
+        'created_date': now,
+        'due_date': end_date,
+    }
+
+def find_missing_alerts(now, process_ids=None):
+    """Procesos vencidos o por vencer sin alerta activa del tipo correspondiente"""
+    alert_type = deadline_alert_type(now)
+
+    has_alert = db.exists().where(
+        Alert.process_id == Process.id,
+        Alert.alert_type == alert_type,
+        Alert.status == 'active'
+    )
+
+    query = db.session.query(
+        Process.id, Process.process_number, Process.title, Process.end_date
+    ).filter(
+        Process.status.in_(MONITORED_STATUSES),
+        Process.end_date <= now + timedelta(days=WARNING_DAYS),
+        Process.end_date != now,
+        ~has_alert
+    )
+
+    if process_ids is not None:
+        query = query.filter(Process.id.in_(process_ids))
+
+    return query.all()
+
+def insert_alerts(rows):
+    """Insertar las alertas en una sola sentencia, ignorando las que ya existan"""
+    if not rows:
+        return 0
+
+    stmt = dialect_insert(Alert)
+    if stmt is not None:
+        stmt = stmt.values(rows).on_conflict_do_nothing(
+            index_elements=['process_id', 'alert_type'],
+            index_where=db.and_(Alert.status == 'active', Alert.alert_type.in_(AUTOMATIC_ALERT_TYPES))
+        )
+        return db.session.execute(stmt).rowcount
+
+    # Motores sin ON CONFLICT: inserción múltiple (el anti-join ya filtró las existentes)
+    db.session.execute(db.insert(Alert), rows)
+    return len(rows)
+
+def escalate_deadline_alerts(now, process_ids=None):
+    """Subir a prioridad alta las alertas de vencimiento que entraron en los últimos días"""
+    query = db.session.query(
+        Alert.id, Process.process_number, Process.title, Process.end_date
+    ).join(Process, Alert.process_id == Process.id).filter(
+        Alert.alert_type == 'deadline',
+        Alert.status == 'active',
+        Alert.priority == 'medium',
+        Process.status.in_(MONITORED_STATUSES),
+        Process.end_date > now,
+        Process.end_date <= now + timedelta(days=HIGH_PRIORITY_DAYS + 1)
+    )
+
+    if process_ids is not None:
+        query = query.filter(Process.id.in_(process_ids))
+
+    updates = []
+    for alert_id, process_number, title, end_date in query:
+        values = build_deadline_alert(None, process_number, title, end_date, now)
+        if values['priority'] == 'high':
+            updates.append({
+                'id': alert_id, 'priority': 'high', 'priority_rank': values['priority_rank'],
+                'message': values['message']
+            })
+
+    if updates:
+        # Actualización por clave primaria en una sola sentencia (executemany)
+        db.session.execute(db.update(Alert), updates)
+    return len(updates)
+
+def run_deadline_check(now=None, process_ids=None):
+    """Crear las alertas de vencimiento que falten y devolver cuántas se crearon"""
+    now = now or datetime.utcnow()
+
+    rows = [
+        build_deadline_alert(process_id, process_number, title, end_date, now)
+        for process_id, process_number, title, end_date in find_missing_alerts(now, process_ids)
+    ]
+
+    alerts_created = insert_alerts(rows)
+    alerts_escalated = escalate_deadline_alerts(now, process_ids)
+    db.session.commit()
+
+    if alerts_escalated:
+        logger.info(f"Deadline check escalated {alerts_escalated} alerts to high priority")
+    if alerts_created or alerts_escalated:
+        publish('alerts.generated', {'created': alerts_created, 'escalated': alerts_escalated})
+    return alerts_created
+
+def dismiss_duplicate_alerts():
+    """Descartar alertas automáticas activas repetidas (proceso y tipo) conservando la más reciente"""
+    newer = db.aliased(Alert)
+    has_newer = db.exists().where(
+        newer.process_id == Alert.process_id,
+        newer.alert_type == Alert.alert_type,
+        newer.status == 'active',
+        newer.id > Alert.id
+    )
+
+    dismissed = Alert.query.filter(
+        Alert.status == 'active',
+        Alert.alert_type.in_(AUTOMATIC_ALERT_TYPES),
+        Alert.process_id.isnot(None),
+        has_newer
+    ).update({'status': 'dismissed'}, synchronize_session=False)
+    db.session.commit()
+
+    if dismissed:
+        logger.info(f"Dismissed {dismissed} duplicate active alerts")
+    return dismissed
@@ -0,0 +1,195 @@
+"""
+Temporizador de vencimientos de procesos.
+
+Mantiene en memoria un heap con los instantes en que cada proceso cruza un
+umbral de alerta (7 días antes, paso a prioridad alta y vencimiento). Un hilo
+duerme hasta el próximo umbral y entonces ejecuta la verificación solo para
+los procesos afectados, de modo que la alerta aparece en el momento exacto
+sin recorrer la tabla completa. Las rutas de procesos actualizan el heap al
+crear, modificar o eliminar; las entradas obsoletas se descartan al salir
+del heap comparando con la fecha vigente de cada proceso.
+
+Cada worker mantiene su propio heap: al disparar se vuelve a consultar la
+base de datos y el índice único de alertas evita duplicados entre workers.
+La verificación diaria del scheduler sigue actuando como respaldo.
+"""
+
+from datetime import datetime, timedelta, timezone
+import heapq
+import logging
+import os
+import threading
+
+from src.models.database import db
+from src.models.models import Process
+from src.services.deadline_engine import (
+    run_deadline_check, MONITORED_STATUSES, WARNING_DAYS, HIGH_PRIORITY_DAYS
+)
+
+logger = logging.getLogger(__name__)
+
+DEADLINE_TIMER_ENABLED = os.environ.get('DEADLINE_TIMER_ENABLED', 'true').lower() == 'true'
+MAX_SLEEP_SECONDS = 3600  # Despertar al menos cada hora (cambios de reloj del sistema)
+
+# Umbral -> antelación respecto a Process.end_date (coinciden con las reglas de prioridad)
+THRESHOLDS = (
+    ('warning', timedelta(days=WARNING_DAYS)),
+    ('high', timedelta(days=HIGH_PRIORITY_DAYS + 1)),
+    ('expired', timedelta(0)),
+)
+
+def _as_utc_naive(value):
+    """Normalizar fechas con zona horaria al formato naive UTC usado en la base de datos"""
+    if value is not None and value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+class DeadlineTimer:
+    """Heap de umbrales de vencimiento con un hilo que los dispara a su hora"""
+
+    def __init__(self):
+        self._heap = []
+        self._deadlines = {}
+        self._condition = threading.Condition()
+        self._thread = None
+        self._stopped = False
+        self._app = None
+
+    def start(self, app):
+        """Cargar los procesos vigilados y arrancar el hilo del temporizador"""
+        with self._condition:
+            if self._thread is not None:
+                return
+            self._app = app
+            self._stopped = False
+
+        with app.app_context():
+            self.load()
+
+        with self._condition:
+            self._thread = threading.Thread(target=self._run, name='deadline-timer', daemon=True)
+            self._thread.start()
+
+        logger.info(f"Deadline timer started with {len(self._deadlines)} processes")
+
+    def stop(self):
+        """Detener el hilo del temporizador"""
+        with self._condition:
+            self._stopped = True
+            thread, self._thread = self._thread, None
+            self._condition.notify()
+
+        if thread is not None:
+            thread.join(timeout=5)
+
+    def load(self):
+        """Programar los procesos vigilados cuyo vencimiento aún no llegó"""
+        rows = db.session.query(Process.id, Process.end_date, Process.status).filter(
+            Process.status.in_(MONITORED_STATUSES),
+            Process.end_date > datetime.utcnow()
+        ).all()
+
+        for process_id, end_date, status in rows:
+            self.schedule(process_id, end_date, status)
+
+    def schedule(self, process_id, end_date, status):
+        """Registrar (o reemplazar) los umbrales de un proceso"""
+        end_date = _as_utc_naive(end_date)
+
+        with self._condition:
+            if end_date is None or status not in MONITORED_STATUSES:
+                self._deadlines.pop(process_id, None)
+                return
+
+            if self._deadlines.get(process_id) == end_date:
+                return
+            self._deadlines[process_id] = end_date
+
+            now = datetime.utcnow()
+            passed = None
+            for threshold, offset in THRESHOLDS:
+                fire_at = end_date - offset
+                if fire_at > now:
+                    heapq.heappush(self._heap, (fire_at, process_id, end_date, threshold))
+                else:
+                    passed = threshold
+
+            # Umbral ya cruzado (fecha nueva dentro de la ventana): verificar de inmediato
+            if passed is not None:
+                heapq.heappush(self._heap, (now, process_id, end_date, passed))
+
+            if self._heap[0][1] == process_id:
+                # El nuevo umbral es el más próximo: despertar al hilo
+                self._condition.notify()
+
+    def track(self, process):
+        """Actualizar el temporizador con el estado actual de un proceso"""
+        if self._thread is None:
+            return
+        self.schedule(process.id, process.end_date, process.status)
+
+    def forget(self, process_id):
+        """Dejar de vigilar un proceso (las entradas del heap se descartan al salir)"""
+        with self._condition:
+            self._deadlines.pop(process_id, None)
+
+    def pending(self):
+        """Cantidad de procesos vigilados y próximo disparo"""
+        with self._condition:
+            next_fire = self._heap[0][0] if self._heap else None
+            return {
+                'processes': len(self._deadlines),
+                'queued': len(self._heap),
+                'next_fire': next_fire.isoformat() if next_fire else None
+            }
+
+    def _pop_due(self):
+        """Esperar al próximo umbral y devolver los procesos que lo cruzaron"""
+        with self._condition:
+            while not self._stopped:
+                now = datetime.utcnow()
+                due = {}
+                while self._heap and self._heap[0][0] <= now:
+                    _, process_id, end_date, threshold = heapq.heappop(self._heap)
+                    # Entrada obsoleta si la fecha del proceso cambió o dejó de vigilarse
+                    if self._deadlines.get(process_id) == end_date:
+                        due[process_id] = threshold
+                        if threshold == 'expired':
+                            self._deadlines.pop(process_id, None)
+
+                if due:
+                    return due
+
+                timeout = MAX_SLEEP_SECONDS
+                if self._heap:
+                    timeout = min(timeout, (self._heap[0][0] - now).total_seconds())
+                self._condition.wait(timeout=max(timeout, 0.01))
+
+        return None
+
+    def _run(self):
+        """Bucle del hilo: disparar la verificación de los procesos que cruzan un umbral"""
+        while True:
+            due = self._pop_due()
+            if due is None:
+                return
+
+            with self._app.app_context():
+                try:
+                    alerts_created = run_deadline_check(process_ids=list(due))
+                    logger.info(
+                        f"Deadline timer fired for {len(due)} processes "
+                        f"({', '.join(sorted(set(due.values())))}): {alerts_created} alerts created"
+                    )
+                except Exception as e:
+                    db.session.rollback()
+                    logger.error(f"Error in deadline timer: {str(e)}")
+
+deadline_timer = DeadlineTimer()
+
+def init_deadline_timer(app):
+    """Arrancar el temporizador de vencimientos si está habilitado"""
+    if not DEADLINE_TIMER_ENABLED:
+        logger.info("Deadline timer disabled by configuration")
+        return
+    deadline_timer.start(app)
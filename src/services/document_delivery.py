@@ -0,0 +1,110 @@
+"""
+Entrega de documentos a los clientes.
+
+Las descargas responden a peticiones condicionales (If-None-Match con la
+huella SHA-256 del contenido como ETag) y a peticiones Range, de modo que un
+navegador o un gestor de descargas puede reanudar transferencias grandes.
+
+Si la aplicación está detrás de un servidor web, DOCUMENT_OFFLOAD permite
+delegarle el envío del archivo y liberar el worker de inmediato:
+- 'x-accel-redirect' (nginx): se responde con la URI interna
+  DOCUMENT_ACCEL_PREFIX + ruta relativa dentro de UPLOAD_FOLDER, que debe
+  declararse como location 'internal' apuntando a ese directorio.
+- 'x-sendfile' (Apache mod_xsendfile, lighttpd): se responde con la ruta
+  absoluta del archivo.
+En ambos casos el servidor web atiende los rangos; la aplicación solo
+resuelve el 304 cuando el ETag coincide.
+"""
+
+import logging
+import os
+from urllib.parse import quote
+
+from flask import current_app, request
+from werkzeug.utils import secure_filename, send_file
+
+from src.services.zip_stream import stream_zip
+
+logger = logging.getLogger(__name__)
+
+OFFLOAD_MODES = ('x-accel-redirect', 'x-sendfile')
+DOCUMENT_OFFLOAD = os.environ.get('DOCUMENT_OFFLOAD', '').lower()
+DOCUMENT_ACCEL_PREFIX = os.environ.get('DOCUMENT_ACCEL_PREFIX', '/protected-uploads/')
+
+if DOCUMENT_OFFLOAD and DOCUMENT_OFFLOAD not in OFFLOAD_MODES:
+    logger.warning(f"Unknown DOCUMENT_OFFLOAD '{DOCUMENT_OFFLOAD}', serving documents from the application")
+    DOCUMENT_OFFLOAD = ''
+
+def document_etag(document):
+    """ETag del documento: la huella del contenido, o None para los archivos anteriores al almacén"""
+    return document.content_hash or None
+
+def accel_uri(path):
+    """URI interna de nginx para un archivo dentro de UPLOAD_FOLDER"""
+    root = os.path.realpath(current_app.config['UPLOAD_FOLDER'])
+    relative = os.path.relpath(os.path.realpath(path), root)
+    if relative.startswith('..'):
+        raise ValueError('El archivo está fuera del directorio de documentos')
+    return DOCUMENT_ACCEL_PREFIX.rstrip('/') + '/' + quote(relative.replace(os.sep, '/'))
+
+def send_document(document):
+    """Respuesta de descarga con ETag, rangos y envío delegado opcional"""
+    etag = document_etag(document)
+    offload = DOCUMENT_OFFLOAD
+
+    response = send_file(
+        document.file_path,
+        request.environ,
+        as_attachment=True,
+        download_name=document.original_filename,
+        etag=etag if etag else True,
+        # Con envío delegado los rangos los resuelve el servidor web
+        conditional=not offload,
+        use_x_sendfile=bool(offload)
+    )
+    response.cache_control.private = True
+
+    if offload:
+        response = response.make_conditional(request.environ)
+        if response.status_code == 304:
+            response.headers.pop('X-Sendfile', None)
+        elif offload == 'x-accel-redirect':
+            response.headers.pop('X-Sendfile', None)
+            response.headers['X-Accel-Redirect'] = accel_uri(document.file_path)
+
+    return response
+
+def unique_arcname(name, used):
+    """Nombre dentro del ZIP sin repetir (agrega un sufijo numérico a los duplicados)"""
+    base, ext = os.path.splitext(name)
+    candidate = name
+    counter = 1
+    while candidate.lower() in used:
+        counter += 1
+        candidate = f"{base} ({counter}){ext}"
+    used.add(candidate.lower())
+    return candidate
+
+def iter_document_entries(documents):
+    """Entradas (nombre, ruta) para el ZIP, con un listado de los archivos no encontrados"""
+    used = set()
+    missing = []
+
+    for document in documents:
+        # Nombres provistos por el usuario: sin rutas ni '..' (zip-slip al extraer)
+        folder = secure_filename(document.document_type or '') or 'otros'
+        name = secure_filename(document.original_filename or '') or os.path.basename(document.filename)
+        arcname = unique_arcname(f"{folder}/{name}", used)
+
+        if os.path.exists(document.file_path):
+            yield arcname, document.file_path
+        else:
+            missing.append(arcname)
+
+    if missing:
+        logger.warning(f"{len(missing)} document files missing while building ZIP")
+        yield 'faltantes.txt', ('No se encontraron los siguientes archivos:\n' + '\n'.join(missing)).encode('utf-8')
+
+def stream_documents_zip(documents):
+    """ZIP en streaming con los documentos indicados (sin recomprimir)"""
+    return stream_zip(iter_document_entries(documents))
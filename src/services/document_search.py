@@ -0,0 +1,389 @@
+"""
+Extracción de texto de documentos e índice de búsqueda de texto completo.
+
+Después de cada subida el documento se encola para extraer su texto (PDF,
+XLSX, DOCX y TXT) en un pool de procesos, fuera del hilo de la petición. El
+resultado se guarda en document_texts; en SQLite una tabla FTS5 de contenido
+externo (document_texts_fts) se mantiene sincronizada mediante triggers, y en
+PostgreSQL se usa to_tsvector sobre la misma columna. Los documentos con una
+huella ya procesada reutilizan el texto sin volver a extraerlo.
+
+Un barrido periódico (index_pending) encola los documentos que todavía no
+tienen texto, de modo que la indexación es incremental y se recupera sola
+tras un reinicio.
+"""
+
+import atexit
+import html
+import logging
+import multiprocessing
+import os
+import threading
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from xml.etree import ElementTree
+
+from apscheduler.triggers.interval import IntervalTrigger
+
+from src.models.database import db
+from src.models.models import Document, DocumentText
+from src.services import scheduler as scheduler_service
+
+logger = logging.getLogger(__name__)
+
+SEARCH_WORKERS = int(os.environ.get('SEARCH_WORKERS', 1))
+SEARCH_INDEX_ENABLED = os.environ.get('SEARCH_INDEX_ENABLED', 'true').lower() == 'true'
+MAX_TEXT_CHARS = 2 * 1000 * 1000  # Texto indexado por documento como máximo
+INDEX_BATCH_SIZE = 200
+INDEX_JOB_ID = 'document_index'
+INDEX_INTERVAL_MINUTES = 10
+SNIPPET_TOKENS = 16
+FTS_TABLE = 'document_texts_fts'
+EXTRACTABLE_TYPES = ('pdf', 'xlsx', 'docx', 'txt')
+
+# Marcadores temporales del resaltado (se reemplazan después de escapar el HTML)
+_MARK_START = '\x02'
+_MARK_END = '\x03'
+
+WORD_NAMESPACE = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
+
+_app = None
+_executor = None
+_executor_lock = threading.Lock()
+_in_flight = set()
+
+def extract_pdf(path):
+    """Texto de todas las páginas de un PDF"""
+    from pypdf import PdfReader
+
+    reader = PdfReader(path)
+    return '\n'.join(page.extract_text() or '' for page in reader.pages)
+
+def extract_xlsx(path):
+    """Valores de todas las hojas de un libro Excel"""
+    import openpyxl
+
+    # Los archivos del almacén no tienen extensión: openpyxl la exige si recibe una ruta
+    with open(path, 'rb') as workbook_file:
+        workbook = openpyxl.load_workbook(workbook_file, read_only=True, data_only=True)
+        try:
+            lines = []
+            for sheet in workbook.worksheets:
+                lines.append(sheet.title)
+                for row in sheet.iter_rows(values_only=True):
+                    values = [str(value) for value in row if value is not None]
+                    if values:
+                        lines.append(' '.join(values))
+            return '\n'.join(lines)
+        finally:
+            workbook.close()
+
+def extract_docx(path):
+    """Texto de los párrafos de un documento Word (sin dependencias adicionales)"""
+    paragraphs = []
+    current = []
+
+    with zipfile.ZipFile(path) as archive, archive.open('word/document.xml') as xml_file:
+        for _, element in ElementTree.iterparse(xml_file):
+            if element.tag == f'{WORD_NAMESPACE}t' and element.text:
+                current.append(element.text)
+            elif element.tag == f'{WORD_NAMESPACE}p':
+                if current:
+                    paragraphs.append(''.join(current))
+                    current = []
+                element.clear()
+
+    return '\n'.join(paragraphs)
+
+def extract_txt(path):
+    """Contenido de un archivo de texto"""
+    with open(path, 'rb') as text_file:
+        return text_file.read(MAX_TEXT_CHARS * 4).decode('utf-8', errors='replace')
+
+EXTRACTORS = {
+    'pdf': extract_pdf,
+    'xlsx': extract_xlsx,
+    'docx': extract_docx,
+    'txt': extract_txt,
+}
+
+def extract_text(path, file_type):
+    """Extraer el texto de un archivo (se ejecuta dentro del pool); devuelve (estado, texto, error)"""
+    extractor = EXTRACTORS.get((file_type or '').lower())
+    if extractor is None:
+        return 'unsupported', None, None
+
+    try:
+        text = extractor(path)
+    except Exception as e:
+        return 'failed', None, f'{type(e).__name__}: {str(e)}'[:500]
+
+    text = text[:MAX_TEXT_CHARS].strip()
+    return ('indexed' if text else 'empty'), text or None, None
+
+def get_executor():
+    """Pool de procesos de extracción, creado en el primer uso"""
+    global _executor
+
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(
+                max_workers=SEARCH_WORKERS,
+                mp_context=multiprocessing.get_context('spawn')
+            )
+            atexit.register(_executor.shutdown, wait=False, cancel_futures=True)
+        return _executor
+
+def ensure_search_index():
+    """Crear la tabla FTS5 y sus triggers de sincronización (solo SQLite)"""
+    if db.engine.dialect.name != 'sqlite':
+        return
+
+    statements = [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+        "content, content='document_texts', content_rowid='document_id', "
+        "tokenize='unicode61 remove_diacritics 2')",
+        f"CREATE TRIGGER IF NOT EXISTS document_texts_ai AFTER INSERT ON document_texts BEGIN "
+        f"INSERT INTO {FTS_TABLE}(rowid, content) VALUES (new.document_id, new.content); END",
+        f"CREATE TRIGGER IF NOT EXISTS document_texts_ad AFTER DELETE ON document_texts BEGIN "
+        f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, content) VALUES ('delete', old.document_id, old.content); END",
+        f"CREATE TRIGGER IF NOT EXISTS document_texts_au AFTER UPDATE ON document_texts BEGIN "
+        f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, content) VALUES ('delete', old.document_id, old.content); "
+        f"INSERT INTO {FTS_TABLE}(rowid, content) VALUES (new.document_id, new.content); END",
+    ]
+
+    try:
+        with db.engine.begin() as connection:
+            for statement in statements:
+                connection.execute(db.text(statement))
+    except Exception as e:
+        logger.warning(f"Could not create full-text index: {str(e)}")
+
+def save_text(document_id, status, content, error=None):
+    """Guardar (o reemplazar) el texto extraído de un documento"""
+    if db.session.get(Document, document_id) is None:
+        return
+
+    entry = db.session.get(DocumentText, document_id) or DocumentText(document_id=document_id)
+    entry.status = status
+    entry.content = content
+    entry.error = error
+    entry.extracted_date = datetime.utcnow()
+    db.session.add(entry)
+    db.session.commit()
+
+def _reuse_text(document):
+    """Copiar el texto de otro documento con la misma huella, si ya fue extraído"""
+    if not document.content_hash:
+        return False
+
+    source = db.session.query(DocumentText).join(
+        Document, Document.id == DocumentText.document_id
+    ).filter(
+        Document.content_hash == document.content_hash,
+        Document.id != document.id
+    ).first()
+
+    if source is None:
+        return False
+
+    save_text(document.id, source.status, source.content, source.error)
+    return True
+
+def _on_extracted(document_id, future):
+    """Registrar el resultado de una extracción (callback del pool)"""
+    try:
+        status, content, error = future.result()
+    except Exception as e:
+        status, content, error = 'failed', None, f'{type(e).__name__}: {str(e)}'[:500]
+
+    try:
+        with _app.app_context():
+            save_text(document_id, status, content, error)
+        if status == 'failed':
+            logger.warning(f"Text extraction failed for document {document_id}: {error}")
+    except Exception as e:
+        logger.error(f"Could not save extracted text for document {document_id}: {str(e)}")
+    finally:
+        with _executor_lock:
+            _in_flight.discard(document_id)
+
+def submit(document):
+    """Encolar la extracción de texto de un documento (no bloquea la petición)"""
+    if _app is None:
+        return False
+
+    if _reuse_text(document):
+        return True
+
+    file_type = (document.file_type or '').lower()
+    if file_type not in EXTRACTABLE_TYPES:
+        save_text(document.id, 'unsupported', None)
+        return True
+
+    with _executor_lock:
+        if document.id in _in_flight:
+            return False
+        _in_flight.add(document.id)
+
+    try:
+        future = get_executor().submit(extract_text, os.path.abspath(document.file_path), file_type)
+    except Exception:
+        with _executor_lock:
+            _in_flight.discard(document.id)
+        raise
+
+    future.add_done_callback(lambda done, document_id=document.id: _on_extracted(document_id, done))
+    return True
+
+def index_pending(limit=INDEX_BATCH_SIZE):
+    """Encolar los documentos que todavía no tienen texto; devuelve cuántos se encolaron"""
+    pending = Document.query.outerjoin(
+        DocumentText, DocumentText.document_id == Document.id
+    ).filter(DocumentText.document_id.is_(None)).order_by(Document.id).limit(limit).all()
+
+    queued = 0
+    for document in pending:
+        try:
+            if submit(document):
+                queued += 1
+        except Exception as e:
+            logger.warning(f"Could not queue text extraction for document {document.id}: {str(e)}")
+
+    if queued:
+        logger.info(f"Queued text extraction for {queued} documents")
+    return queued
+
+def index_status():
+    """Cantidad de documentos por estado de indexación"""
+    counts = dict(
+        db.session.query(DocumentText.status, db.func.count(DocumentText.document_id))
+        .group_by(DocumentText.status).all()
+    )
+    counts['pending'] = Document.query.count() - sum(counts.values())
+    counts['in_progress'] = len(_in_flight)
+    return counts
+
+def fts_query(text):
+    """Convertir el texto del usuario en una consulta FTS5 segura (todas las palabras, por prefijo)"""
+    terms = [term.replace('"', '""') for term in text.split() if term.strip('"')]
+    return ' '.join(f'"{term}"*' for term in terms)
+
+def highlight(snippet):
+    """Escapar el fragmento y marcar las coincidencias con <mark>"""
+    return html.escape(snippet or '').replace(_MARK_START, '<mark>').replace(_MARK_END, '</mark>')
+
+def _like_snippet(content, terms, radius=80):
+    """Fragmento alrededor de la primera coincidencia (motores sin índice de texto)"""
+    lowered = content.lower()
+    position = min((lowered.find(term) for term in terms if term in lowered), default=0)
+    start = max(position - radius, 0)
+    fragment = content[start:position + radius * 2]
+    for term in terms:
+        index = fragment.lower().find(term)
+        if index >= 0:
+            fragment = (fragment[:index] + _MARK_START + fragment[index:index + len(term)]
+                        + _MARK_END + fragment[index + len(term):])
+    return ('…' if start else '') + fragment + '…'
+
+def search_documents(text, process_id=None, supplier_id=None, document_type=None, page=1, per_page=10):
+    """Buscar documentos por su contenido; devuelve (resultados, total)"""
+    text = (text or '').strip()
+    if len(text) < 2:
+        raise ValueError('La búsqueda debe tener al menos 2 caracteres')
+
+    dialect = db.engine.dialect.name
+    filters = []
+    params = {}
+
+    for name, value in (('process_id', process_id), ('supplier_id', supplier_id), ('document_type', document_type)):
+        if value:
+            filters.append(f'd.{name} = :{name}')
+            params[name] = value
+
+    where = ''.join(f' AND {condition}' for condition in filters)
+    params['limit'] = per_page
+    params['offset'] = (page - 1) * per_page
+
+    if dialect == 'sqlite':
+        params['query'] = fts_query(text)
+        if not params['query']:
+            raise ValueError('La búsqueda no contiene palabras')
+        base = (
+            f"FROM {FTS_TABLE} JOIN documents d ON d.id = {FTS_TABLE}.rowid "
+            f"WHERE {FTS_TABLE} MATCH :query{where}"
+        )
+        select = (
+            f"SELECT d.id, snippet({FTS_TABLE}, 0, '{_MARK_START}', '{_MARK_END}', '…', {SNIPPET_TOKENS}) "
+            f"{base} ORDER BY bm25({FTS_TABLE}) LIMIT :limit OFFSET :offset"
+        )
+    elif dialect == 'postgresql':
+        params['query'] = text
+        base = (
+            "FROM document_texts t JOIN documents d ON d.id = t.document_id "
+            "WHERE to_tsvector('spanish', t.content) @@ plainto_tsquery('spanish', :query)" + where
+        )
+        select = (
+            "SELECT d.id, ts_headline('spanish', t.content, plainto_tsquery('spanish', :query), "
+            f"'StartSel={_MARK_START}, StopSel={_MARK_END}, MaxWords=35, MinWords=15') {base} "
+            "ORDER BY ts_rank(to_tsvector('spanish', t.content), plainto_tsquery('spanish', :query)) DESC "
+            "LIMIT :limit OFFSET :offset"
+        )
+    else:
+        terms = [term.lower() for term in text.split()]
+        like = ' AND '.join(f'LOWER(t.content) LIKE :term{i}' for i in range(len(terms)))
+        params.update({f'term{i}': f'%{term}%' for i, term in enumerate(terms)})
+        base = f"FROM document_texts t JOIN documents d ON d.id = t.document_id WHERE {like}{where}"
+        select = f"SELECT d.id, t.content {base} ORDER BY d.upload_date DESC LIMIT :limit OFFSET :offset"
+
+    total = db.session.execute(db.text(f'SELECT COUNT(*) {base}'), params).scalar()
+    rows = db.session.execute(db.text(select), params).all()
+
+    if dialect not in ('sqlite', 'postgresql'):
+        rows = [(document_id, _like_snippet(content, terms)) for document_id, content in rows]
+
+    documents = {
+        document.id: document
+        for document in Document.query.filter(Document.id.in_([row[0] for row in rows]))
+    }
+
+    results = []
+    for document_id, snippet in rows:
+        document = documents.get(document_id)
+        if document is not None:
+            data = document.to_dict()
+            data['snippet'] = highlight(snippet)
+            results.append(data)
+
+    return results, total
+
+def index_pending_documents(trigger='scheduled'):
+    """Tarea programada: encolar los documentos pendientes de indexar"""
+    try:
+        with scheduler_service.app_context():
+            return scheduler_service.run_job(
+                INDEX_JOB_ID,
+                lambda: {'queued': index_pending()},
+                trigger=trigger
+            )
+    except Exception as e:
+        logger.error(f"Error in document indexing sweep: {str(e)}")
+        return None
+
+def start(app):
+    """Habilitar la indexación y registrar el barrido periódico de pendientes"""
+    global _app
+
+    if not SEARCH_INDEX_ENABLED:
+        logger.info("Document text indexing disabled")
+        return
+
+    _app = app
+
+    scheduler_service.register_job(
+        INDEX_JOB_ID,
+        index_pending_documents,
+        IntervalTrigger(minutes=INDEX_INTERVAL_MINUTES),
+        name='Index document text'
+    )
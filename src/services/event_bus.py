@@ -0,0 +1,99 @@
+"""
+Bus de eventos en memoria para notificaciones en vivo.
+
+Las rutas publican eventos después de confirmar sus cambios (alertas,
+ofertas, procesos). Los eventos se guardan en un buffer circular con un
+identificador creciente; los clientes SSE y de long-poll leen a partir del
+último identificador recibido, por lo que no hay colas por suscriptor que
+puedan desbordarse. Si un cliente quedó más atrás que el buffer (o el worker
+se reinició) recibe un evento 'resync' y vuelve a cargar los datos.
+"""
+
+from collections import deque
+from datetime import datetime
+import threading
+import uuid
+
+BUFFER_SIZE = 500
+
+class EventBus:
+    """Buffer circular de eventos con espera bloqueante por identificador"""
+
+    def __init__(self, size=BUFFER_SIZE):
+        self._events = deque(maxlen=size)
+        self._condition = threading.Condition()
+        self._sequence = 0
+        self._listeners = 0
+        # Prefijo de los identificadores: cambia en cada arranque del worker
+        self.instance = uuid.uuid4().hex[:8]
+
+    def publish(self, event_type, data=None):
+        """Publicar un evento y despertar a los clientes en espera"""
+        with self._condition:
+            self._sequence += 1
+            event = {
+                'id': f'{self.instance}-{self._sequence}',
+                'seq': self._sequence,
+                'type': event_type,
+                'data': data if data is not None else {},
+                'timestamp': datetime.utcnow().isoformat()
+            }
+            self._events.append(event)
+            self._condition.notify_all()
+            return event
+
+    def last_id(self):
+        """Identificador del último evento publicado"""
+        with self._condition:
+            return f'{self.instance}-{self._sequence}'
+
+    def parse_id(self, event_id):
+        """Convertir un identificador de cliente en secuencia (None si no es de este worker)"""
+        if not event_id:
+            return None
+        instance, _, sequence = event_id.rpartition('-')
+        if instance != self.instance or not sequence.isdigit():
+            return None
+        return int(sequence)
+
+    def _since(self, sequence):
+        """Eventos posteriores a una secuencia (None si ya salieron del buffer)"""
+        if sequence > self._sequence:
+            return None
+        if self._events and sequence < self._events[0]['seq'] - 1:
+            return None
+        return [event for event in self._events if event['seq'] > sequence]
+
+    def wait(self, sequence, timeout):
+        """Esperar eventos posteriores a sequence; devuelve (eventos, última secuencia)"""
+        with self._condition:
+            if sequence is None:
+                return None, self._sequence
+
+            events = self._since(sequence)
+            if events == []:
+                self._condition.wait(timeout)
+                events = self._since(sequence)
+
+            return events, self._sequence
+
+    def add_listener(self):
+        """Registrar un cliente conectado"""
+        with self._condition:
+            self._listeners += 1
+
+    def remove_listener(self):
+        """Dar de baja un cliente conectado"""
+        with self._condition:
+            self._listeners = max(self._listeners - 1, 0)
+
+    def listeners(self):
+        """Cantidad de clientes conectados a este worker"""
+        with self._condition:
+            return self._listeners
+
+event_bus = EventBus()
+
+def publish(event_type, data=None):
+    """Publicar un evento en el bus del worker"""
+    return event_bus.publish(event_type, data)
@@ -0,0 +1,233 @@
+"""
+Consultas del lado del servidor sobre las tablas Excel de staging.
+
+Parámetros soportados por /api/excel/data/<table_type>:
+- Filtros exactos (valores separados por coma para varios): process_number,
+  supplier_name, category, status
+- Rangos de fecha sobre cualquier columna de fecha: <columna>_from, <columna>_to
+- Orden multi-columna: sort=-upload_date,supplier_name
+- Proyección: fields=id,process_number,supplier_name
+- Paginación por cursor: cursor= (vacío en la primera página) y per_page
+"""
+
+import base64
+import json
+from datetime import datetime, timedelta
+
+from src.models.database import db
+
+MAX_PER_PAGE = 500
+DEFAULT_SORT = '-upload_date'
+
+# Nombre de filtro público -> columna por modelo (si difiere del nombre)
+FILTER_ALIASES = {
+    'category': {'excel_supplier_evaluation': 'evaluation_category'},
+}
+FILTERABLE = ('process_number', 'supplier_name', 'category', 'status')
+
+def _columns(model):
+    """Columnas del modelo indexadas por nombre"""
+    return {column.key: column for column in model.__table__.columns}
+
+def _model_column(model, name):
+    """Obtener el atributo de columna o fallar con un mensaje de validación"""
+    if name not in _columns(model):
+        raise ValueError(f'Campo no válido: {name}')
+    return getattr(model, name)
+
+def _is_datetime(model, name):
+    """Indicar si una columna es de tipo fecha"""
+    return isinstance(_columns(model)[name].type, db.DateTime)
+
+def _parse_date(value):
+    """Parsear una fecha ISO o fallar con un mensaje de validación"""
+    try:
+        return datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        raise ValueError(f'Formato de fecha inválido: {value}')
+
+def parse_sort(model, sort_param):
+    """Convertir 'sort=-a,b' en [(columna, descendente)] con id como desempate"""
+    keys = []
+    for part in (sort_param or DEFAULT_SORT).split(','):
+        part = part.strip()
+        if not part:
+            continue
+        descending = part.startswith('-')
+        name = part.lstrip('-+')
+        keys.append((name, descending))
+
+    if not any(name == 'id' for name, _ in keys):
+        keys.append(('id', keys[0][1] if keys else True))
+
+    for name, _ in keys:
+        _model_column(model, name)
+    return keys
+
+def apply_filters(model, query, args):
+    """Aplicar filtros exactos y rangos de fechas"""
+    table_name = model.__tablename__
+
+    for name in FILTERABLE:
+        value = args.get(name)
+        if not value:
+            continue
+        column_name = FILTER_ALIASES.get(name, {}).get(table_name, name)
+        if column_name not in _columns(model):
+            raise ValueError(f'Filtro no disponible para esta tabla: {name}')
+        values = [v.strip() for v in value.split(',') if v.strip()]
+        column = getattr(model, column_name)
+        query = query.filter(column == values[0] if len(values) == 1 else column.in_(values))
+
+    for name, column in _columns(model).items():
+        if not isinstance(column.type, db.DateTime):
+            continue
+        date_from = args.get(f'{name}_from')
+        date_to = args.get(f'{name}_to')
+        attribute = getattr(model, name)
+        if date_from:
+            query = query.filter(attribute >= _parse_date(date_from))
+        if date_to:
+            # Una fecha sin hora incluye el día completo
+            if len(date_to) == 10:
+                query = query.filter(attribute < _parse_date(date_to) + timedelta(days=1))
+            else:
+                query = query.filter(attribute <= _parse_date(date_to))
+
+    return query
+
+def apply_sort(model, query, sort_keys):
+    """Ordenar por las claves pedidas dejando los NULL al final"""
+    order = []
+    for name, descending in sort_keys:
+        column = getattr(model, name)
+        clause = column.desc() if descending else column.asc()
+        # NULLS LAST solo donde hace falta, para no impedir el uso de índices
+        order.append(clause.nulls_last() if _columns(model)[name].nullable else clause)
+    return query.order_by(*order)
+
+def encode_cursor(sort_keys, row):
+    """Codificar los valores de orden de la última fila entregada"""
+    values = []
+    for name, _ in sort_keys:
+        value = getattr(row, name)
+        values.append(value.isoformat() if isinstance(value, datetime) else value)
+    raw = json.dumps(values, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+def decode_cursor(model, sort_keys, cursor):
+    """Recuperar los valores de orden codificados en el cursor"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except (ValueError, TypeError):
+        raise ValueError('Cursor inválido')
+
+    if not isinstance(values, list) or len(values) != len(sort_keys):
+        raise ValueError('El cursor no corresponde al orden solicitado')
+
+    return [
+        _parse_date(value) if value is not None and _is_datetime(model, name) else value
+        for (name, _), value in zip(sort_keys, values)
+    ]
+
+def _after_branches(model, sort_keys, values):
+    """Condiciones keyset 'fila posterior al cursor', en el orden en que aparecen las filas.
+
+    Cada rama es una búsqueda por rango en el índice (igualdad en las claves
+    previas más un rango, o IS NULL para la cola de nulos, que van al final en
+    ambos sentidos). Cuando las claves siguientes no admiten NULL y comparten
+    sentido, el tramo no nulo se resume en una comparación de filas
+    (a, id) < (x, z), que SQLite y PostgreSQL resuelven con un solo rango.
+    """
+    (name, descending), value = sort_keys[0], values[0]
+    column = getattr(model, name)
+    rest_keys, rest_values = sort_keys[1:], values[1:]
+    nullable = _columns(model)[name].nullable
+
+    if value is None:
+        rest = _after_branches(model, rest_keys, rest_values) if rest_keys else []
+        return [db.and_(column.is_(None), branch) for branch in rest]
+
+    null_tail = [column.is_(None)] if nullable else []
+
+    if rest_keys and None not in rest_values and all(
+        key_descending == descending and not _columns(model)[key].nullable for key, key_descending in rest_keys
+    ):
+        columns = db.tuple_(column, *[getattr(model, key) for key, _ in rest_keys])
+        cursor = db.tuple_(*[db.literal(v) for v in values])
+        return [columns < cursor if descending else columns > cursor] + null_tail
+
+    rest = _after_branches(model, rest_keys, rest_values) if rest_keys else []
+    beyond = column < value if descending else column > value
+    return [db.and_(column == value, branch) for branch in rest] + [beyond] + null_tail
+
+def fetch_after(query, branches, limit):
+    """Ejecutar las ramas keyset en orden hasta completar limit filas"""
+    rows = []
+    for branch in branches:
+        rows.extend(query.filter(branch).limit(limit - len(rows)).all())
+        if len(rows) >= limit:
+            break
+    return rows
+
+def parse_fields(model, fields_param):
+    """Validar la lista de campos de la proyección"""
+    if not fields_param:
+        return None
+    fields = [f.strip() for f in fields_param.split(',') if f.strip()]
+    for name in fields:
+        _model_column(model, name)
+    return fields
+
+def serialize(row, fields):
+    """Serializar una fila completa (to_dict) o solo los campos pedidos"""
+    if fields is None:
+        return row.to_dict()
+    result = {}
+    for name in fields:
+        value = getattr(row, name)
+        result[name] = value.isoformat() if isinstance(value, datetime) else value
+    return result
+
+def query_excel_data(model, args):
+    """Ejecutar la consulta descrita por los parámetros de la petición"""
+    per_page = min(max(args.get('per_page', 10, type=int), 1), MAX_PER_PAGE)
+    sort_keys = parse_sort(model, args.get('sort'))
+    fields = parse_fields(model, args.get('fields'))
+
+    if fields is None:
+        query = model.query
+    else:
+        # Proyección: solo las columnas pedidas más las necesarias para el cursor
+        selected = list(dict.fromkeys(fields + [name for name, _ in sort_keys]))
+        query = db.session.query(*[getattr(model, name) for name in selected])
+
+    query = apply_sort(model, apply_filters(model, query, args), sort_keys)
+
+    if 'cursor' in args:
+        cursor = args.get('cursor')
+        if cursor:
+            branches = _after_branches(model, sort_keys, decode_cursor(model, sort_keys, cursor))
+            rows = fetch_after(query, branches, per_page + 1)
+        else:
+            rows = query.limit(per_page + 1).all()
+        has_more = len(rows) > per_page
+        rows = rows[:per_page]
+
+        return {
+            'data': [serialize(row, fields) for row in rows],
+            'next_cursor': encode_cursor(sort_keys, rows[-1]) if has_more else None,
+            'has_more': has_more,
+            'per_page': per_page
+        }
+
+    page = args.get('page', 1, type=int)
+    data = query.paginate(page=page, per_page=per_page, error_out=False)
+
+    return {
+        'data': [serialize(row, fields) for row in data.items],
+        'total': data.total,
+        'pages': data.pages,
+        'current_page': page
+    }
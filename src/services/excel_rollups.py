@@ -0,0 +1,194 @@
+"""
+Agregados precalculados para los análisis de datos Excel.
+
+Las tablas excel_* solo reciben inserciones, por lo que cada importación suma
+sus propios agregados a excel_analysis_rollups y los endpoints de análisis
+leen directamente esos valores en lugar de reagrupar las tablas completas.
+Los promedios se calculan sobre los valores no nulos (value_count y
+secondary_count), igual que AVG en SQL.
+"""
+
+from datetime import datetime
+import logging
+
+from src.models.database import db, dialect_insert
+from src.models.excel_models import (
+    ExcelAnalysisRollup, ExcelTechnicalEvaluation, ExcelCommercialComparison,
+    ExcelSupplierEvaluation, ExcelSavingsAnalysis
+)
+
+logger = logging.getLogger(__name__)
+
+# Por cada tipo de tabla: dimensión -> (columna clave, métrica principal,
+# métrica secundaria, columna para el mínimo, etiqueta del mínimo)
+ROLLUP_SPECS = {
+    'technical_evaluation': {
+        'supplier': ('supplier_name', 'weighted_score', None, None, None),
+        'criterion': ('criterion', 'weight', None, None, None),
+    },
+    'commercial_comparison': {
+        'item': ('item_description', 'unit_price', None, 'unit_price', 'supplier_name'),
+        'supplier': ('supplier_name', 'unit_price', None, None, None),
+    },
+    'supplier_evaluation': {
+        'supplier': ('supplier_name', 'percentage', None, None, None),
+        'category': ('evaluation_category', 'percentage', None, None, None),
+    },
+    'savings_analysis': {
+        'total': (None, 'savings_amount', 'savings_percentage', None, None),
+        'category': ('category', 'savings_amount', 'savings_percentage', None, None),
+    },
+}
+
+ROLLUP_MODELS = {
+    'technical_evaluation': ExcelTechnicalEvaluation,
+    'commercial_comparison': ExcelCommercialComparison,
+    'supplier_evaluation': ExcelSupplierEvaluation,
+    'savings_analysis': ExcelSavingsAnalysis,
+}
+
+def aggregate_records(table_type, records):
+    """Agregar un lote de registros en memoria por dimensión y clave"""
+    spec = ROLLUP_SPECS[table_type]
+    buckets = {}
+
+    for record in records:
+        for dimension, (key_attr, value_attr, secondary_attr, min_attr, label_attr) in spec.items():
+            key = str(getattr(record, key_attr) or '') if key_attr else ''
+            bucket = buckets.setdefault((dimension, key), {
+                'row_count': 0, 'value_sum': 0.0, 'value_count': 0, 'secondary_sum': 0.0,
+                'secondary_count': 0, 'min_value': None, 'min_label': None
+            })
+
+            bucket['row_count'] += 1
+            value = getattr(record, value_attr)
+            if value is not None:
+                bucket['value_sum'] += value
+                bucket['value_count'] += 1
+            if secondary_attr:
+                secondary = getattr(record, secondary_attr)
+                if secondary is not None:
+                    bucket['secondary_sum'] += secondary
+                    bucket['secondary_count'] += 1
+
+            if min_attr:
+                candidate = getattr(record, min_attr)
+                if candidate is not None and (bucket['min_value'] is None or candidate < bucket['min_value']):
+                    bucket['min_value'] = candidate
+                    bucket['min_label'] = getattr(record, label_attr)
+
+    return buckets
+
+def _merge_buckets(table_type, buckets):
+    """Sumar los agregados de un lote a los ya almacenados"""
+    now = datetime.utcnow()
+    rows = [
+        dict(table_type=table_type, dimension=dimension, key=key, updated_date=now, **values)
+        for (dimension, key), values in buckets.items()
+    ]
+
+    if not rows:
+        return
+
+    stmt = dialect_insert(ExcelAnalysisRollup)
+    if stmt is not None:
+        current = ExcelAnalysisRollup.__table__.c
+        stmt = stmt.values(rows)
+        excluded = stmt.excluded
+        takes_new_min = db.and_(
+            excluded.min_value.isnot(None),
+            db.or_(current.min_value.is_(None), excluded.min_value < current.min_value)
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['table_type', 'dimension', 'key'],
+            set_={
+                'row_count': current.row_count + excluded.row_count,
+                'value_sum': current.value_sum + excluded.value_sum,
+                'value_count': current.value_count + excluded.value_count,
+                'secondary_sum': current.secondary_sum + excluded.secondary_sum,
+                'secondary_count': current.secondary_count + excluded.secondary_count,
+                'min_value': db.case((takes_new_min, excluded.min_value), else_=current.min_value),
+                'min_label': db.case((takes_new_min, excluded.min_label), else_=current.min_label),
+                'updated_date': excluded.updated_date,
+            }
+        )
+        db.session.execute(stmt)
+        return
+
+    # Motores sin ON CONFLICT: leer, combinar y escribir
+    for row in rows:
+        rollup = ExcelAnalysisRollup.query.filter_by(
+            table_type=table_type, dimension=row['dimension'], key=row['key']
+        ).with_for_update().first()
+
+        if rollup is None:
+            db.session.add(ExcelAnalysisRollup(**row))
+            continue
+
+        rollup.row_count += row['row_count']
+        rollup.value_sum += row['value_sum']
+        rollup.value_count += row['value_count']
+        rollup.secondary_sum += row['secondary_sum']
+        rollup.secondary_count += row['secondary_count']
+        if row['min_value'] is not None and (rollup.min_value is None or row['min_value'] < rollup.min_value):
+            rollup.min_value = row['min_value']
+            rollup.min_label = row['min_label']
+        rollup.updated_date = row['updated_date']
+
+def has_rollups(table_type):
+    """Indicar si ya existen agregados para un tipo de tabla (con las cantidades de valores no nulos)"""
+    first = db.session.query(ExcelAnalysisRollup.value_count).filter_by(table_type=table_type).first()
+    # value_count nulo: agregados de antes de que existiera la columna, hay que recalcularlos
+    return first is not None and first.value_count is not None
+
+def rebuild_rollups(table_type):
+    """Recalcular desde cero los agregados de un tipo de tabla"""
+    model = ROLLUP_MODELS[table_type]
+    columns = {attr for dim in ROLLUP_SPECS[table_type].values() for attr in dim if attr}
+
+    ExcelAnalysisRollup.query.filter_by(table_type=table_type).delete(synchronize_session=False)
+
+    rows = db.session.query(*[getattr(model, attr) for attr in sorted(columns)]).yield_per(5000)
+    _merge_buckets(table_type, aggregate_records(table_type, rows))
+
+    logger.info(f"Excel rollups rebuilt for {table_type}")
+
+def refresh_rollups(table_type, records):
+    """Incorporar a los agregados los registros de una importación (sin commit)"""
+    if table_type not in ROLLUP_SPECS:
+        return
+
+    if not has_rollups(table_type):
+        # Primera carga con agregados: incluir también los datos históricos
+        db.session.flush()
+        rebuild_rollups(table_type)
+        return
+
+    _merge_buckets(table_type, aggregate_records(table_type, records))
+
+def ensure_rollups(table_type):
+    """Construir los agregados si la tabla tiene datos previos sin agregar"""
+    if has_rollups(table_type):
+        return
+
+    model = ROLLUP_MODELS[table_type]
+    if db.session.query(model.id).first() is None:
+        return
+
+    rebuild_rollups(table_type)
+    db.session.commit()
+
+def get_rollups(table_type, dimension):
+    """Consulta base de agregados para una dimensión"""
+    ensure_rollups(table_type)
+    return ExcelAnalysisRollup.query.filter_by(table_type=table_type, dimension=dimension)
+
+def rollup_average(column=None, count=None):
+    """Expresión SQL del promedio almacenado (suma / cantidad de valores no nulos)"""
+    column = ExcelAnalysisRollup.value_sum if column is None else column
+    count = ExcelAnalysisRollup.value_count if count is None else count
+    return column / db.func.nullif(count, 0)
+
+def average(total, count):
+    """Promedio de los valores no nulos (None si no hay ninguno, como AVG)"""
+    return total / count if count else None
@@ -0,0 +1,164 @@
+"""
+Plantillas Excel para la carga de datos.
+
+Las plantillas son estáticas: se generan una sola vez con openpyxl (con
+columnas tipadas y listas de validación), se guardan en memoria como bytes y
+se sirven con ETag/Last-Modified para permitir GET condicional.
+"""
+
+from datetime import datetime
+import hashlib
+import io
+import json
+import os
+import threading
+
+import openpyxl
+from openpyxl.styles import Font, PatternFill
+from openpyxl.utils import get_column_letter
+from openpyxl.worksheet.datavalidation import DataValidation
+
+TEMPLATE_ROWS = 1000  # Filas cubiertas por las validaciones
+
+PROCESS_TYPES = ['simple_purchase', 'large_tender']
+PROCESS_STATUSES = ['draft', 'active', 'evaluation', 'completed', 'cancelled']
+
+# Tipos de columna: text, number, percent, integer, date, choice
+TEMPLATES = {
+    'process_tracking': {
+        'filename': 'plantilla_seguimiento_procesos.xlsx',
+        'columns': [
+            ('Número de Proceso', 'text'), ('Nombre del Proceso', 'text'),
+            ('Tipo', 'choice', PROCESS_TYPES), ('Estado', 'choice', PROCESS_STATUSES),
+            ('Presupuesto', 'number'), ('Fecha de Inicio', 'date'), ('Fecha de Fin', 'date'),
+            ('Responsable', 'text'), ('Notas', 'text')
+        ]
+    },
+    'technical_evaluation': {
+        'filename': 'plantilla_evaluacion_tecnica.xlsx',
+        'columns': [
+            ('Número de Proceso', 'text'), ('Proveedor', 'text'), ('Criterio', 'text'),
+            ('Peso (%)', 'percent'), ('Puntuación', 'number'), ('Comentarios', 'text')
+        ]
+    },
+    'commercial_comparison': {
+        'filename': 'plantilla_comparacion_comercial.xlsx',
+        'columns': [
+            ('Número de Proceso', 'text'), ('Descripción del Ítem', 'text'), ('Cantidad', 'number'),
+            ('Unidad', 'text'), ('Proveedor', 'text'), ('Precio Unitario', 'number'),
+            ('Precio Total', 'number'), ('Tiempo de Entrega', 'text'), ('Garantía', 'text')
+        ]
+    },
+    'supplier_evaluation': {
+        'filename': 'plantilla_evaluacion_proveedores.xlsx',
+        'columns': [
+            ('Proveedor', 'text'), ('Categoría', 'text'), ('Criterio', 'text'),
+            ('Puntuación', 'number'), ('Puntuación Máxima', 'number'), ('Comentarios', 'text'),
+            ('Fecha de Evaluación', 'date')
+        ]
+    },
+    'savings_analysis': {
+        'filename': 'plantilla_analisis_ahorros.xlsx',
+        'columns': [
+            ('Número de Proceso', 'text'), ('Categoría', 'text'), ('Presupuesto Inicial', 'number'),
+            ('Precio Final', 'number'), ('Valor Agregado', 'text')
+        ]
+    },
+    'questions_answers': {
+        'filename': 'plantilla_consultas_respuestas.xlsx',
+        'columns': [
+            ('Número de Proceso', 'text'), ('Número de Pregunta', 'integer'),
+            ('Fecha de Pregunta', 'date'), ('Proveedor', 'text'), ('Pregunta', 'text'),
+            ('Respuesta', 'text'), ('Fecha de Respuesta', 'date')
+        ]
+    }
+}
+
+NUMBER_FORMATS = {
+    'number': '#,##0.00',
+    'percent': '0.00',
+    'integer': '0',
+    'date': 'DD/MM/YYYY',
+    'text': '@',
+}
+
+# Marca de tiempo común a todos los workers de un mismo despliegue
+TEMPLATES_LAST_MODIFIED = datetime.utcfromtimestamp(int(os.path.getmtime(__file__)))
+
+_cache = {}
+_cache_lock = threading.Lock()
+
+def _column_validation(column_type, options, cell_range):
+    """Crear la validación de datos asociada a un tipo de columna"""
+    if column_type == 'choice':
+        validation = DataValidation(type='list', formula1='"' + ','.join(options) + '"', allow_blank=True)
+    elif column_type == 'number':
+        validation = DataValidation(type='decimal', operator='greaterThanOrEqual', formula1='0', allow_blank=True)
+    elif column_type == 'percent':
+        validation = DataValidation(type='decimal', operator='between', formula1='0', formula2='100', allow_blank=True)
+    elif column_type == 'integer':
+        validation = DataValidation(type='whole', operator='greaterThanOrEqual', formula1='0', allow_blank=True)
+    elif column_type == 'date':
+        validation = DataValidation(type='date', operator='greaterThan', formula1='1', allow_blank=True)
+    else:
+        return None
+
+    validation.error = 'Valor no válido para esta columna'
+    validation.errorTitle = 'Dato inválido'
+    validation.add(cell_range)
+    return validation
+
+def build_template(table_type):
+    """Construir el archivo XLSX de una plantilla y devolverlo como bytes"""
+    template_info = TEMPLATES[table_type]
+
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.title = 'Datos'
+    ws.freeze_panes = 'A2'
+    wb.properties.created = TEMPLATES_LAST_MODIFIED
+    wb.properties.modified = TEMPLATES_LAST_MODIFIED
+
+    header_font = Font(bold=True, color="FFFFFF")
+    header_fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
+
+    for col, column in enumerate(template_info['columns'], start=1):
+        name, column_type = column[0], column[1]
+        options = column[2] if len(column) > 2 else None
+        letter = get_column_letter(col)
+
+        cell = ws.cell(row=1, column=col, value=name)
+        cell.font = header_font
+        cell.fill = header_fill
+        ws.column_dimensions[letter].width = max(15, len(name) + 4)
+
+        # Formato por columna para que Excel respete el tipo en filas nuevas
+        ws.column_dimensions[letter].number_format = NUMBER_FORMATS.get(column_type, 'General')
+
+        validation = _column_validation(column_type, options, f'{letter}2:{letter}{TEMPLATE_ROWS + 1}')
+        if validation is not None:
+            ws.add_data_validation(validation)
+
+    buffer = io.BytesIO()
+    wb.save(buffer)
+    return buffer.getvalue()
+
+def _template_etag(table_type):
+    """ETag estable entre workers, derivada de la definición de la plantilla"""
+    spec = json.dumps([TEMPLATES[table_type], TEMPLATES_LAST_MODIFIED.isoformat()], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(spec.encode('utf-8')).hexdigest()[:32]
+
+def get_template(table_type):
+    """Obtener (bytes, etag, filename) de una plantilla, generándola en el primer uso"""
+    cached = _cache.get(table_type)
+    if cached is not None:
+        return cached
+
+    with _cache_lock:
+        if table_type not in _cache:
+            _cache[table_type] = (
+                build_template(table_type),
+                _template_etag(table_type),
+                TEMPLATES[table_type]['filename']
+            )
+        return _cache[table_type]
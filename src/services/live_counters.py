@@ -0,0 +1,111 @@
+"""
+Contadores del dashboard y de alertas para los clientes conectados en vivo.
+
+Un único hilo por worker recalcula los contadores cuando se publica un evento
+que puede modificarlos (como máximo una vez por MIN_INTERVAL_SECONDS) y, si
+hay clientes conectados, también cada REFRESH_SECONDS para reflejar cambios
+hechos en otros workers. Solo se publica un evento 'counters' cuando los
+valores cambian, de modo que el costo no crece con la cantidad de pestañas.
+"""
+
+import logging
+import threading
+import time
+
+from src.models.database import db
+from src.models.models import Alert, Bid, Process, Supplier
+from src.services.event_bus import event_bus
+
+logger = logging.getLogger(__name__)
+
+MIN_INTERVAL_SECONDS = 1
+REFRESH_SECONDS = 15
+
+_snapshot = None
+_snapshot_time = 0
+_snapshot_lock = threading.Lock()
+_thread = None
+
+def compute_counters():
+    """Calcular los contadores con consultas agrupadas"""
+    by_status = dict(db.session.query(Alert.status, db.func.count(Alert.id)).group_by(Alert.status).all())
+    active = Alert.query.filter_by(status='active')
+    by_priority = dict(
+        active.with_entities(Alert.priority, db.func.count(Alert.id)).group_by(Alert.priority).all()
+    )
+    by_type = dict(
+        active.with_entities(Alert.alert_type, db.func.count(Alert.id)).group_by(Alert.alert_type).all()
+    )
+
+    return {
+        'dashboard': {
+            'total_processes': Process.query.count(),
+            'total_suppliers': Supplier.query.count(),
+            'total_bids': Bid.query.count(),
+            'active_alerts': by_status.get('active', 0)
+        },
+        'alerts': {
+            'total': sum(by_status.values()),
+            'by_status': {status: by_status.get(status, 0) for status in ('active', 'dismissed', 'resolved')},
+            'by_priority': {priority: by_priority.get(priority, 0) for priority in ('critical', 'high', 'medium', 'low')},
+            'by_type': {
+                alert_type: by_type.get(alert_type, 0)
+                for alert_type in ('deadline', 'missing_document', 'process_expired')
+            }
+        },
+        'latest_alert_id': db.session.query(db.func.max(Alert.id)).scalar()
+    }
+
+def refresh(app):
+    """Recalcular los contadores y publicarlos si cambiaron"""
+    global _snapshot, _snapshot_time
+
+    with app.app_context():
+        try:
+            counters = compute_counters()
+        except Exception as e:
+            logger.warning(f"Could not compute live counters: {str(e)}")
+            return
+
+    with _snapshot_lock:
+        _snapshot_time = time.monotonic()
+        if counters == _snapshot:
+            return
+        _snapshot = counters
+
+    event_bus.publish('counters', counters)
+
+def get_snapshot(app):
+    """Contadores vigentes (se recalculan si tienen más de REFRESH_SECONDS)"""
+    if _snapshot is None or time.monotonic() - _snapshot_time > REFRESH_SECONDS:
+        refresh(app)
+    return _snapshot
+
+def _watch(app):
+    """Bucle del hilo: recalcular ante eventos o periódicamente con clientes conectados"""
+    sequence = event_bus.parse_id(event_bus.last_id())
+
+    while True:
+        events, sequence = event_bus.wait(sequence, timeout=REFRESH_SECONDS)
+
+        if events:
+            # Ignorar los propios eventos 'counters'
+            if all(event['type'] == 'counters' for event in events):
+                continue
+        elif events == [] and event_bus.listeners() == 0:
+            continue
+
+        refresh(app)
+
+        # Agrupar ráfagas de escrituras en un solo recálculo
+        time.sleep(MIN_INTERVAL_SECONDS)
+
+def start(app):
+    """Arrancar el hilo de contadores (una vez por worker)"""
+    global _thread
+
+    with _snapshot_lock:
+        if _thread is not None:
+            return
+        _thread = threading.Thread(target=_watch, args=(app,), name='live-counters', daemon=True)
+        _thread.start()
@@ -0,0 +1,305 @@
+"""
+Profiler por muestreo para peticiones en producción.
+
+Un único hilo por proceso toma cada PROFILE_INTERVAL_MS la pila de los hilos
+que se están perfilando (sys._current_frames) y cuenta cuántas veces aparece
+cada pila; los hilos que no se perfilan no pagan ningún costo. Al terminar,
+el perfil se escribe en PROFILE_DIR (junto a los logs) como pilas colapsadas
+(una línea 'a;b;c N' por pila, para flamegraph.pl o speedscope) o como JSON
+de speedscope.
+
+Se activa:
+- por petición, con la cabecera X-Profile ('1', 'collapsed' o 'speedscope')
+  en una sesión autenticada; la respuesta indica el archivo en X-Profile-File;
+- por endpoint, con PROFILE_ENDPOINTS (nombres separados por comas, o 'heavy'
+  para HEAVY_ENDPOINTS) y una fracción PROFILE_SAMPLE_RATE de las peticiones;
+- en cualquier hilo o proceso, con el contexto profiling(label). La
+  generación de PDF en el pool de informes lo usa cuando la petición que la
+  encola se está perfilando.
+
+En las respuestas en streaming el perfil abarca también el envío del cuerpo.
+"""
+
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+import json
+import logging
+import os
+import random
+import re
+import sys
+import threading
+import time
+
+from flask import request, session
+
+logger = logging.getLogger(__name__)
+
+PROFILER_ENABLED = os.environ.get('PROFILER_ENABLED', 'true').lower() == 'true'
+PROFILE_DIR = os.environ.get(
+    'PROFILE_DIR',
+    os.path.join(os.path.dirname(os.path.dirname(__file__)), 'logs', 'profiles')
+)
+PROFILE_INTERVAL_MS = float(os.environ.get('PROFILE_INTERVAL_MS', 5))
+PROFILE_FORMAT = os.environ.get('PROFILE_FORMAT', 'speedscope')
+PROFILE_ENDPOINTS = os.environ.get('PROFILE_ENDPOINTS', '')
+PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', 1.0))
+PROFILE_MAX_SECONDS = 120  # Tope de muestreo por perfil
+PROFILE_MAX_FILES = 200
+PROFILE_HEADER = 'X-Profile'
+FORMATS = ('collapsed', 'speedscope')
+SOURCE_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Rutas más costosas: informes PDF, dashboard, importación Excel y gráficos
+HEAVY_ENDPOINTS = {
+    'export.export_process_pdf',
+    'reports.get_dashboard_data',
+    'excel.upload_excel',
+    'reports.get_process_trends_chart',
+    'reports.get_bid_comparison_chart',
+}
+
+class Profile:
+    """Pilas muestreadas de un hilo"""
+
+    __slots__ = ('label', 'thread_id', 'created', 'started', 'finished', 'stacks', 'samples')
+
+    def __init__(self, label, thread_id):
+        self.label = label
+        self.thread_id = thread_id
+        self.created = datetime.now()
+        self.started = time.monotonic()
+        self.finished = None
+        self.stacks = Counter()
+        self.samples = 0
+
+_active = {}
+_active_lock = threading.Condition()
+_sampler = None
+_endpoints = set()
+_current = ContextVar('profile', default=None)
+
+def _frame_key(frame):
+    code = frame.f_code
+    return code.co_name, code.co_filename, code.co_firstlineno
+
+def _sample_loop():
+    """Hilo de muestreo: solo recorre las pilas de los hilos registrados"""
+    interval = PROFILE_INTERVAL_MS / 1000
+    own_id = threading.get_ident()
+
+    while True:
+        with _active_lock:
+            while not _active:
+                _active_lock.wait()
+            profiles = list(_active.values())
+
+        frames = sys._current_frames()
+        now = time.monotonic()
+        for profile in profiles:
+            frame = frames.get(profile.thread_id)
+            if frame is None or profile.thread_id == own_id or now - profile.started > PROFILE_MAX_SECONDS:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(_frame_key(frame))
+                frame = frame.f_back
+            stack.reverse()
+            profile.stacks[tuple(stack)] += 1
+            profile.samples += 1
+        del frames
+
+        time.sleep(interval)
+
+def start_profile(label, thread_id=None):
+    """Empezar a muestrear un hilo (por defecto, el actual)"""
+    global _sampler
+
+    profile = Profile(label, thread_id or threading.get_ident())
+    with _active_lock:
+        _active[profile.thread_id] = profile
+        if _sampler is None:
+            _sampler = threading.Thread(target=_sample_loop, name='profiler-sampler', daemon=True)
+            _sampler.start()
+        _active_lock.notify()
+    return profile
+
+def stop_profile(profile, fmt=None):
+    """Dejar de muestrear y escribir el perfil; devuelve la ruta del archivo (None si no hubo muestras)"""
+    with _active_lock:
+        if _active.get(profile.thread_id) is profile:
+            del _active[profile.thread_id]
+    profile.finished = time.monotonic()
+
+    if not profile.samples:
+        return None
+    try:
+        return write_profile(profile, fmt if fmt in FORMATS else PROFILE_FORMAT)
+    except OSError as e:
+        logger.warning(f"Could not write profile for {profile.label}: {str(e)}")
+        return None
+
+def _frame_name(key):
+    name, filename, line = key
+    filename = os.path.abspath(filename)
+    if filename.startswith(SOURCE_ROOT):
+        filename = os.path.relpath(filename, SOURCE_ROOT)
+    return name, filename, line
+
+def render_collapsed(profile):
+    """Pilas colapsadas: 'marco;marco;... cantidad' por línea"""
+    lines = []
+    for stack, count in profile.stacks.most_common():
+        frames = ';'.join(
+            f'{name} ({filename}:{line})'.replace(';', ':') for name, filename, line in map(_frame_name, stack)
+        )
+        lines.append(f'{frames} {count}')
+    return '\n'.join(lines) + '\n'
+
+def render_speedscope(profile):
+    """Perfil en el formato de archivo de speedscope (tipo 'sampled')"""
+    frame_index = {}
+    frames = []
+    samples = []
+    weights = []
+    interval = PROFILE_INTERVAL_MS
+
+    for stack, count in profile.stacks.most_common():
+        indexes = []
+        for key in stack:
+            index = frame_index.get(key)
+            if index is None:
+                name, filename, line = _frame_name(key)
+                index = frame_index[key] = len(frames)
+                frames.append({'name': name, 'file': filename, 'line': line})
+            indexes.append(index)
+        samples.append(indexes)
+        weights.append(round(count * interval, 3))
+
+    return json.dumps({
+        '$schema': 'https://www.speedscope.app/file-format-schema.json',
+        'name': profile.label,
+        'exporter': 'procurement_system',
+        'shared': {'frames': frames},
+        'profiles': [{
+            'type': 'sampled',
+            'name': profile.label,
+            'unit': 'milliseconds',
+            'startValue': 0,
+            'endValue': round(sum(weights), 3),
+            'samples': samples,
+            'weights': weights,
+        }],
+    })
+
+def profile_filename(profile, fmt):
+    """Nombre del archivo del perfil (se conoce desde que empieza el muestreo)"""
+    slug = re.sub(r'[^A-Za-z0-9_.-]+', '_', profile.label).strip('_')[:80]
+    timestamp = profile.created.strftime('%Y%m%d_%H%M%S_%f')
+    extension = 'collapsed.txt' if fmt == 'collapsed' else 'speedscope.json'
+    return f'{timestamp}_{slug}_{os.getpid()}.{extension}'
+
+def write_profile(profile, fmt):
+    """Guardar el perfil en PROFILE_DIR y podar los más antiguos"""
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    content = render_collapsed(profile) if fmt == 'collapsed' else render_speedscope(profile)
+
+    path = os.path.join(PROFILE_DIR, profile_filename(profile, fmt))
+    with open(path, 'w', encoding='utf-8') as profile_file:
+        profile_file.write(content)
+
+    duration = (profile.finished or time.monotonic()) - profile.started
+    logger.info(f"Profile written: {path} ({profile.samples} samples, {duration:.2f}s)")
+    _prune()
+    return path
+
+def _prune():
+    try:
+        with os.scandir(PROFILE_DIR) as entries:
+            files = sorted((entry.stat().st_mtime, entry.path) for entry in entries if entry.is_file())
+    except FileNotFoundError:
+        return
+    for _, stale in files[:max(len(files) - PROFILE_MAX_FILES, 0)]:
+        try:
+            os.remove(stale)
+        except OSError:
+            pass
+
+@contextmanager
+def profiling(label, fmt=None):
+    """Perfilar un bloque en el hilo actual (sirve también dentro de procesos del pool)"""
+    profile = start_profile(label)
+    token = _current.set(profile)
+    try:
+        yield profile
+    finally:
+        _current.reset(token)
+        stop_profile(profile, fmt)
+
+def active_label():
+    """Etiqueta del perfil en curso en este contexto (None si no se perfila)"""
+    profile = _current.get()
+    return profile.label if profile is not None else None
+
+def _profiled_endpoints():
+    names = {name.strip() for name in PROFILE_ENDPOINTS.split(',') if name.strip()}
+    if 'heavy' in names:
+        names.discard('heavy')
+        names |= HEAVY_ENDPOINTS
+    return names
+
+def _requested_format():
+    """Formato pedido para esta petición, o None si no corresponde perfilarla"""
+    header = request.headers.get(PROFILE_HEADER)
+    if header and session.get('authenticated'):
+        return header.lower() if header.lower() in FORMATS else PROFILE_FORMAT
+
+    if request.endpoint in _endpoints and random.random() < PROFILE_SAMPLE_RATE:
+        return PROFILE_FORMAT
+    return None
+
+def _start_request():
+    fmt = _requested_format()
+    if fmt is None:
+        return
+    profile = start_profile(f'{request.method} {request.endpoint or request.path}')
+    request.environ['profiler.state'] = (profile, fmt, _current.set(profile))
+
+def _finish_request(response):
+    state = request.environ.get('profiler.state')
+    if state is None:
+        return response
+    profile, fmt, _ = state
+
+    if response.is_streamed and not response.direct_passthrough:
+        # Incluir la generación del cuerpo: se detiene al cerrar la respuesta
+        response.call_on_close(lambda: stop_profile(profile, fmt))
+        response.headers['X-Profile-File'] = profile_filename(profile, fmt)
+        return response
+
+    path = stop_profile(profile, fmt)
+    if path:
+        response.headers['X-Profile-File'] = os.path.basename(path)
+    return response
+
+def _end_request(exception=None):
+    state = request.environ.pop('profiler.state', None)
+    if state is None:
+        return
+    profile, fmt, token = state
+    _current.reset(token)
+    if profile.finished is None and exception is not None:
+        stop_profile(profile, fmt)
+
+def init_app(app):
+    """Registrar los hooks de perfilado por petición"""
+    global _endpoints
+
+    if not PROFILER_ENABLED:
+        return
+    _endpoints = _profiled_endpoints()
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
+    app.teardown_request(_end_request)
@@ -0,0 +1,229 @@
+"""
+Diagnóstico de consultas SQL: consultas lentas y patrones N+1.
+
+Con QUERY_DIAGNOSTICS=true, eventos de cursor en los engines de SQLAlchemy
+registran en el logger 'procurement_system.database':
+- cada consulta que tarda más de SLOW_QUERY_MS, con sus parámetros y el plan
+  de ejecución (EXPLAIN QUERY PLAN en SQLite, EXPLAIN en PostgreSQL; el plan
+  de una misma consulta se repite como máximo cada REPORT_COOLDOWN_SECONDS);
+- cada petición o tarea programada que ejecuta la misma forma de consulta
+  (el SQL con los literales y las listas IN normalizados) más de
+  N_PLUS_ONE_THRESHOLD veces, junto con la línea de código que la originó.
+  Es el patrón de los accesos perezosos a relaciones dentro de bucles o de
+  to_dict().
+
+Las peticiones se siguen con hooks de Flask y las tareas con tracking(),
+que scheduler.run_job usa para cada ejecución.
+"""
+
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+import logging
+import os
+import re
+import threading
+import time
+import traceback
+
+from flask import request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger('procurement_system.database')
+
+QUERY_DIAGNOSTICS = os.environ.get('QUERY_DIAGNOSTICS', 'false').lower() == 'true'
+SLOW_QUERY_MS = float(os.environ.get('SLOW_QUERY_MS', 200))
+N_PLUS_ONE_THRESHOLD = int(os.environ.get('N_PLUS_ONE_THRESHOLD', 10))
+REPORT_COOLDOWN_SECONDS = 300
+MAX_PARAMS_LENGTH = 500
+SHAPE_CACHE_SIZE = 2000
+EXPLAIN_PREFIXES = ('select', 'with')
+SOURCE_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r'\b\d+(?:\.\d+)?\b')
+_PLACEHOLDER_LIST = re.compile(r'\(\s*(?:\?|%\(\w+\)s|%s|:\w+)(?:\s*,\s*(?:\?|%\(\w+\)s|%s|:\w+))+\s*\)')
+_WHITESPACE = re.compile(r'\s+')
+
+class QueryTracker:
+    """Formas de consulta ejecutadas por una petición o tarea"""
+
+    __slots__ = ('label', 'shapes', 'origins')
+
+    def __init__(self, label):
+        self.label = label
+        self.shapes = {}
+        self.origins = {}
+
+_current = ContextVar('query_diagnostics', default=None)
+_shape_cache = OrderedDict()
+_reported = {}
+_lock = threading.Lock()
+_installed = False
+
+def statement_shape(statement):
+    """SQL normalizado: sin literales, con las listas de parámetros reducidas a uno"""
+    with _lock:
+        shape = _shape_cache.get(statement)
+        if shape is not None:
+            _shape_cache.move_to_end(statement)
+            return shape
+
+    shape = _STRING_LITERAL.sub('?', statement)
+    shape = _NUMBER_LITERAL.sub('?', shape)
+    shape = _PLACEHOLDER_LIST.sub('(?)', shape)
+    shape = _WHITESPACE.sub(' ', shape).strip()
+
+    with _lock:
+        _shape_cache[statement] = shape
+        if len(_shape_cache) > SHAPE_CACHE_SIZE:
+            _shape_cache.popitem(last=False)
+    return shape
+
+def _should_report(key):
+    """Limitar cada hallazgo a un aviso por REPORT_COOLDOWN_SECONDS"""
+    now = time.monotonic()
+    with _lock:
+        last = _reported.get(key)
+        if last is not None and now - last < REPORT_COOLDOWN_SECONDS:
+            return False
+        _reported[key] = now
+        if len(_reported) > SHAPE_CACHE_SIZE:
+            for stale in [k for k, t in _reported.items() if now - t >= REPORT_COOLDOWN_SECONDS]:
+                del _reported[stale]
+        return True
+
+def _format_params(parameters):
+    text = repr(parameters)
+    if len(text) > MAX_PARAMS_LENGTH:
+        text = text[:MAX_PARAMS_LENGTH] + '...'
+    return text
+
+def _origin():
+    """Primera línea de código de la aplicación (fuera de este módulo) en la pila"""
+    for frame in reversed(traceback.extract_stack()[:-2]):
+        filename = os.path.abspath(frame.filename)
+        if filename.startswith(SOURCE_ROOT) and filename != os.path.abspath(__file__):
+            return f'{os.path.relpath(filename, SOURCE_ROOT)}:{frame.lineno} in {frame.name}'
+    return 'unknown'
+
+def explain(conn, statement, parameters):
+    """Plan de ejecución de una consulta de lectura, usando la conexión DBAPI directamente"""
+    dialect = conn.dialect.name
+    if not statement.lstrip().lower().startswith(EXPLAIN_PREFIXES):
+        return None
+    if dialect == 'sqlite':
+        prefix = 'EXPLAIN QUERY PLAN '
+    elif dialect == 'postgresql':
+        prefix = 'EXPLAIN '
+    else:
+        return None
+
+    cursor = conn.connection.dbapi_connection.cursor()
+    try:
+        cursor.execute(prefix + statement, parameters)
+        rows = cursor.fetchall()
+    finally:
+        cursor.close()
+
+    if dialect == 'sqlite':
+        # (id, parent, notused, detail)
+        return '\n'.join(f'  {row[3]}' for row in rows)
+    return '\n'.join(f'  {row[0]}' for row in rows)
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('diagnostics_started', []).append(time.perf_counter())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.get('diagnostics_started')
+    if not started:
+        return
+    elapsed_ms = (time.perf_counter() - started.pop()) * 1000
+
+    tracker = _current.get()
+    shape = None
+    if tracker is not None:
+        shape = statement_shape(statement)
+        count = tracker.shapes.get(shape, 0) + 1
+        tracker.shapes[shape] = count
+        if count == N_PLUS_ONE_THRESHOLD + 1:
+            tracker.origins[shape] = _origin()
+
+    if elapsed_ms < SLOW_QUERY_MS:
+        return
+
+    shape = shape or statement_shape(statement)
+    label = tracker.label if tracker is not None else 'background'
+    message = (
+        f"Slow query ({elapsed_ms:.1f} ms) in {label}: {statement}\n"
+        f"  params: {_format_params(parameters)}"
+    )
+    if not executemany and _should_report(('explain', shape)):
+        try:
+            plan = explain(conn, statement, parameters)
+            if plan:
+                message += f"\n  plan:\n{plan}"
+        except Exception as e:
+            message += f"\n  plan: unavailable ({str(e)})"
+    logger.warning(message)
+
+def report(tracker):
+    """Avisar de las formas de consulta repetidas más de N_PLUS_ONE_THRESHOLD veces"""
+    for shape, count in tracker.shapes.items():
+        if count <= N_PLUS_ONE_THRESHOLD:
+            continue
+        if not _should_report(('n+1', tracker.label, shape)):
+            continue
+        logger.warning(
+            f"Possible N+1 in {tracker.label}: same query executed {count} times "
+            f"(first repeat at {tracker.origins.get(shape, 'unknown')}): {shape}"
+        )
+
+@contextmanager
+def tracking(label):
+    """Seguir las consultas de un bloque (por ejemplo, una tarea programada)"""
+    if not _installed:
+        yield None
+        return
+
+    tracker = QueryTracker(label)
+    token = _current.set(tracker)
+    try:
+        yield tracker
+    finally:
+        _current.reset(token)
+        report(tracker)
+
+def install():
+    """Registrar los eventos de cursor en todos los engines (una vez)"""
+    global _installed
+    if _installed:
+        return
+    event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+    event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+    _installed = True
+    logger.info(
+        f"Query diagnostics enabled (slow >= {SLOW_QUERY_MS:g} ms, N+1 > {N_PLUS_ONE_THRESHOLD} repeats)"
+    )
+
+def _start_request():
+    label = f'{request.method} {request.endpoint or request.path}'
+    request.environ['query_diagnostics.token'] = _current.set(QueryTracker(label))
+
+def _end_request(exception=None):
+    token = request.environ.pop('query_diagnostics.token', None)
+    if token is None:
+        return
+    tracker = _current.get()
+    _current.reset(token)
+    if tracker is not None:
+        report(tracker)
+
+def init_app(app):
+    """Activar el diagnóstico para todas las peticiones (si QUERY_DIAGNOSTICS está activo)"""
+    if not QUERY_DIAGNOSTICS:
+        return
+    install()
+    app.before_request(_start_request)
+    app.teardown_request(_end_request)
@@ -0,0 +1,256 @@
+"""
+Servicio de generación de informes en segundo plano.
+
+La conversión HTML -> PDF (xhtml2pdf) es costosa en CPU, por lo que se ejecuta
+en un pool de procesos. El resultado queda en una caché en disco compartida
+por todos los workers, con nombre derivado del contenido del informe: mientras
+los datos del proceso no cambien, las descargas sirven el archivo ya generado.
+"""
+
+import atexit
+import glob
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import socket
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from src.services.profiler import active_label
+
+logger = logging.getLogger(__name__)
+
+# Por defecto en instance/ (junto a la base SQLite), fuera del código fuente
+INSTANCE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), 'instance')
+REPORT_CACHE_DIR = os.environ.get('REPORT_CACHE_DIR', os.path.join(INSTANCE_DIR, 'cache', 'reports'))
+REPORT_WORKERS = int(os.environ.get('REPORT_WORKERS', 2))
+REPORT_CACHE_MAX_FILES = int(os.environ.get('REPORT_CACHE_MAX_FILES', 500))
+PENDING_TIMEOUT = 300  # segundos antes de considerar abandonado un informe en curso
+
+_executor = None
+_executor_lock = threading.RLock()
+_jobs = {}
+
+def render_pdf_file(html, target_path, profile_label=None):
+    """Convertir HTML a PDF dentro del pool (escritura atómica en target_path)"""
+    if profile_label:
+        # La petición que encoló el informe se está perfilando: perfilar también el render
+        from src.services.profiler import profiling
+
+        with profiling(f'{profile_label} render_pdf'):
+            return render_pdf_file(html, target_path)
+
+    from xhtml2pdf import pisa
+
+    tmp_path = f'{target_path}.{os.getpid()}.tmp'
+    try:
+        with open(tmp_path, 'wb') as tmp_file:
+            pisa_status = pisa.CreatePDF(html, dest=tmp_file)
+
+        if pisa_status.err:
+            return False
+
+        os.replace(tmp_path, target_path)
+        return True
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+def get_executor():
+    """Pool de procesos compartido, creado en el primer uso"""
+    global _executor
+
+    with _executor_lock:
+        if _executor is None:
+            # spawn evita heredar conexiones de base de datos del worker web
+            _executor = ProcessPoolExecutor(
+                max_workers=REPORT_WORKERS,
+                mp_context=multiprocessing.get_context('spawn')
+            )
+            atexit.register(_executor.shutdown, wait=False, cancel_futures=True)
+        return _executor
+
+def _reset_executor():
+    """Descartar un pool roto para que get_executor cree otro"""
+    global _executor
+
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+            _executor = None
+
+def report_key(data):
+    """Huella del contenido de un informe (cambia cuando cambian los datos)"""
+    raw = json.dumps(data, sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()[:40]
+
+def cached_report_path(kind, object_id, key, extension='pdf'):
+    """Ruta en la caché para un informe concreto"""
+    os.makedirs(REPORT_CACHE_DIR, exist_ok=True)
+    return os.path.join(REPORT_CACHE_DIR, f'{kind}_{object_id}_{key}.{extension}')
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+def _marker_owner():
+    """Dueño de una marca .pending: host y pid del worker que encoló el informe"""
+    return f'{socket.gethostname()} {os.getpid()}'
+
+def _stale_marker(pending_marker):
+    """Indicar si la marca quedó de un worker que ya no existe (en este mismo host)"""
+    try:
+        if time.time() - os.path.getmtime(pending_marker) >= PENDING_TIMEOUT:
+            return True
+        with open(pending_marker) as marker:
+            host, pid = marker.read().split()
+        pid = int(pid)
+    except FileNotFoundError:
+        return False
+    except (OSError, ValueError):
+        # Marca sin dueño legible: solo vence por PENDING_TIMEOUT
+        return False
+
+    if host != socket.gethostname():
+        return False
+    # Este worker no tiene el informe en curso (ya se consultó _jobs) o su dueño terminó
+    return pid == os.getpid() or not _pid_alive(pid)
+
+def report_status(path):
+    """Estado de un informe en caché: ready, pending, failed o None"""
+    if os.path.exists(path):
+        return 'ready'
+
+    if os.path.exists(path + '.failed'):
+        return 'failed'
+
+    if path in _jobs:
+        return 'pending'
+
+    pending_marker = path + '.pending'
+    if os.path.exists(pending_marker):
+        if not _stale_marker(pending_marker):
+            return 'pending'
+        # Worker muerto a mitad del render: descartar la marca para volver a encolarlo
+        try:
+            os.remove(pending_marker)
+            logger.warning(f"Discarded stale pending marker for {path}")
+        except OSError:
+            pass
+
+    return None
+
+def get_job(path):
+    """Future del informe en curso en este worker (None si no hay)"""
+    return _jobs.get(path)
+
+def wait_for_report(path, timeout):
+    """Esperar a que un informe deje de estar pendiente y devolver su estado"""
+    deadline = time.monotonic() + timeout
+
+    future = get_job(path)
+    if future is not None:
+        try:
+            future.result(timeout=timeout)
+        except Exception:
+            pass
+        # El callback de limpieza puede ejecutarse justo después de result()
+        while path in _jobs and time.monotonic() < deadline:
+            time.sleep(0.05)
+
+    # Generado por otro worker: esperar a que aparezca el archivo
+    while report_status(path) == 'pending' and time.monotonic() < deadline:
+        time.sleep(0.5)
+
+    return report_status(path)
+
+def clear_failure(path):
+    """Olvidar un error previo para permitir un nuevo intento"""
+    if os.path.exists(path + '.failed'):
+        os.remove(path + '.failed')
+
+def submit_pdf(path, html):
+    """Encolar la generación de un PDF (una sola vez por ruta y proceso)"""
+    with _executor_lock:
+        future = _jobs.get(path)
+        if future is not None:
+            return future
+
+        with open(path + '.pending', 'w') as marker:
+            marker.write(_marker_owner())
+
+        try:
+            future = get_executor().submit(render_pdf_file, html, path, active_label())
+        except BrokenProcessPool:
+            # Un proceso del pool murió: crear un pool nuevo
+            _reset_executor()
+            future = get_executor().submit(render_pdf_file, html, path, active_label())
+        _jobs[path] = future
+
+    future.add_done_callback(lambda done: _finish_job(path, done))
+    return future
+
+def _finish_job(path, future):
+    """Limpiar marcas y la caché al terminar un informe"""
+    with _executor_lock:
+        _jobs.pop(path, None)
+
+    try:
+        succeeded = future.result()
+    except Exception as e:
+        logger.error(f"Report rendering failed for {path}: {str(e)}")
+        succeeded = False
+
+    if not succeeded:
+        with open(path + '.failed', 'w'):
+            pass
+
+    if os.path.exists(path + '.pending'):
+        os.remove(path + '.pending')
+
+    if succeeded:
+        _remove_stale_versions(path)
+        prune_cache()
+
+def _remove_stale_versions(path):
+    """Eliminar versiones anteriores del mismo informe"""
+    name = os.path.basename(path)
+    prefix = name.rsplit('_', 1)[0]
+    extension = os.path.splitext(name)[1]
+
+    for stale in glob.glob(os.path.join(REPORT_CACHE_DIR, f'{glob.escape(prefix)}_*{extension}')):
+        if stale != path:
+            try:
+                os.remove(stale)
+            except OSError:
+                pass
+
+def prune_cache():
+    """Mantener la caché bajo REPORT_CACHE_MAX_FILES eliminando los más antiguos"""
+    try:
+        with os.scandir(REPORT_CACHE_DIR) as entries:
+            files = [
+                (entry.stat().st_mtime, entry.path) for entry in entries
+                if entry.is_file() and not entry.name.endswith(('.pending', '.failed', '.tmp'))
+            ]
+    except FileNotFoundError:
+        return
+
+    excess = len(files) - REPORT_CACHE_MAX_FILES
+    if excess <= 0:
+        return
+
+    for _, stale in sorted(files)[:excess]:
+        try:
+            os.remove(stale)
+        except OSError:
+            pass
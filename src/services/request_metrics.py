@@ -0,0 +1,414 @@
+"""
+Métricas de latencia por endpoint.
+
+init_app() registra hooks de Flask que miden cada petición (tiempo total,
+cantidad y tiempo de las consultas SQL, filas y tamaño de la respuesta) y
+eventos de SQLAlchemy a nivel de cursor que acumulan las consultas de la
+petición en curso. Las consultas de hilos en segundo plano no se cuentan.
+
+Los valores se guardan en histogramas log-lineales al estilo HDR: valores
+exactos hasta 31 y luego 16 intervalos por cada potencia de 2 (error relativo
+menor al 6,25%), sin límites fijados de antemano y con memoria proporcional a
+los intervalos usados. Los tiempos se registran en microsegundos.
+
+Cada worker escribe sus histogramas en METRICS_DIR (por defecto
+instance/metrics) cada FLUSH_SECONDS y /api/system/metrics combina los de
+todos los workers vivos del host, de modo que cualquier worker que atienda la
+consulta de Prometheus devuelve el total. Al terminar, cada worker elimina su
+archivo; los de procesos que ya no existen se descartan al leerlos.
+"""
+
+from collections import Counter
+from contextvars import ContextVar
+import json
+import logging
+import math
+import atexit
+import os
+import threading
+import time
+
+from flask import request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from src.models.database import db
+
+logger = logging.getLogger(__name__)
+
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'true').lower() == 'true'
+METRICS_DIR = os.environ.get('METRICS_DIR')  # Por defecto, <instance_path>/metrics (se fija en init_app)
+FLUSH_SECONDS = 10
+METRIC_PREFIX = 'procurement_'
+UNMATCHED_ENDPOINT = '<unmatched>'
+SUB_BUCKET_BITS = 5
+SUB_BUCKETS = 1 << (SUB_BUCKET_BITS - 1)
+QUANTILES = (0.5, 0.9, 0.99)
+
+# Histogramas por petición: (escala a la unidad exportada, límites 'le' exportados, descripción)
+METRICS = {
+    'request_duration_seconds': (
+        1e-6, (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+        'Tiempo total de la petición'
+    ),
+    'db_query_duration_seconds': (
+        1e-6, (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+        'Tiempo acumulado en consultas SQL por petición'
+    ),
+    'db_queries': (
+        1, (0, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000),
+        'Consultas SQL ejecutadas por petición'
+    ),
+    'db_rows': (
+        1, (0, 1, 10, 100, 1000, 10000, 100000),
+        'Filas cargadas como objetos ORM o modificadas por INSERT/UPDATE/DELETE por petición'
+    ),
+    'response_size_bytes': (
+        1, (1024, 10 * 1024, 100 * 1024, 1024 ** 2, 10 * 1024 ** 2, 100 * 1024 ** 2),
+        'Tamaño de la respuesta (solo respuestas con Content-Length)'
+    ),
+}
+
+def bucket_index(value):
+    """Intervalo log-lineal de un valor entero no negativo"""
+    if value < (1 << SUB_BUCKET_BITS):
+        return value
+    shift = value.bit_length() - SUB_BUCKET_BITS
+    return shift * SUB_BUCKETS + (value >> shift)
+
+def bucket_upper(index):
+    """Mayor valor que cae en un intervalo"""
+    if index < (1 << SUB_BUCKET_BITS):
+        return index
+    shift = index // SUB_BUCKETS - 1
+    top = index - shift * SUB_BUCKETS
+    return ((top + 1) << shift) - 1
+
+class Histogram:
+    """Histograma log-lineal disperso (se combina sumando intervalos)"""
+
+    __slots__ = ('counts', 'count', 'total', 'max')
+
+    def __init__(self):
+        self.counts = {}
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def record(self, value):
+        value = max(int(value), 0)
+        index = bucket_index(value)
+        self.counts[index] = self.counts.get(index, 0) + 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def merge(self, other):
+        for index, count in other.counts.items():
+            self.counts[index] = self.counts.get(index, 0) + count
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+
+    def quantile(self, q):
+        """Valor del cuantil q (cota superior de su intervalo, nunca mayor que el máximo)"""
+        if not self.count:
+            return 0
+        target = max(math.ceil(q * self.count), 1)
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= target:
+                return min(bucket_upper(index), self.max)
+        return self.max
+
+    def cumulative(self, bounds):
+        """Cantidad de valores menores o iguales a cada límite (en la unidad registrada)"""
+        items = sorted(self.counts.items())
+        result = []
+        position = 0
+        seen = 0
+        for bound in bounds:
+            while position < len(items) and bucket_upper(items[position][0]) <= bound:
+                seen += items[position][1]
+                position += 1
+            result.append(seen)
+        return result
+
+    def to_dict(self):
+        return {'counts': self.counts, 'count': self.count, 'total': self.total, 'max': self.max}
+
+    @classmethod
+    def from_dict(cls, data):
+        histogram = cls()
+        histogram.counts = {int(index): count for index, count in data['counts'].items()}
+        histogram.count = data['count']
+        histogram.total = data['total']
+        histogram.max = data['max']
+        return histogram
+
+class RequestStats:
+    """Acumulador de la petición en curso"""
+
+    __slots__ = ('started', 'queries', 'query_time', 'rows')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.query_time = 0.0
+        self.rows = 0
+
+_current = ContextVar('request_metrics', default=None)
+_histograms = {}
+_requests = Counter()
+_state_lock = threading.Lock()
+_flush_lock = threading.Lock()  # Una sola escritura del snapshot a la vez
+_last_flush = 0.0
+_flush_failed = False
+_installed = False
+
+def current_stats():
+    """Acumulador de la petición en curso (None fuera de una petición)"""
+    return _current.get()
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current.get() is not None:
+        conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = _current.get()
+    if stats is None:
+        return
+    started = conn.info.get('query_started')
+    if not started:
+        return
+
+    stats.queries += 1
+    stats.query_time += time.perf_counter() - started.pop()
+    # En SELECT rowcount es -1; las filas leídas se cuentan al cargar objetos
+    if cursor.rowcount and cursor.rowcount > 0 and cursor.description is None:
+        stats.rows += cursor.rowcount
+
+def _on_load(target, context):
+    stats = _current.get()
+    if stats is not None:
+        stats.rows += 1
+
+def install_db_events():
+    """Registrar los eventos de cursor (en todos los engines) y de carga de objetos (una vez)"""
+    global _installed
+    if _installed:
+        return
+    event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+    event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+    event.listen(db.Model, 'load', _on_load, propagate=True)
+    _installed = True
+
+def _start_request():
+    request.environ['request_metrics.token'] = _current.set(RequestStats())
+
+def _record_request(response):
+    stats = _current.get()
+    if stats is None:
+        return response
+
+    elapsed = time.perf_counter() - stats.started
+    endpoint = request.endpoint or UNMATCHED_ENDPOINT
+    method = request.method
+    values = {
+        'request_duration_seconds': elapsed * 1e6,
+        'db_query_duration_seconds': stats.query_time * 1e6,
+        'db_queries': stats.queries,
+        'db_rows': stats.rows,
+    }
+    # Las respuestas en streaming no tienen tamaño conocido al terminar la vista
+    if response.content_length is not None:
+        values['response_size_bytes'] = response.content_length
+
+    with _state_lock:
+        for name, value in values.items():
+            key = (name, endpoint, method)
+            histogram = _histograms.get(key)
+            if histogram is None:
+                histogram = _histograms[key] = Histogram()
+            histogram.record(value)
+        _requests[(endpoint, method, str(response.status_code))] += 1
+
+    flush()
+    return response
+
+def _end_request(exception=None):
+    token = request.environ.pop('request_metrics.token', None)
+    if token is not None:
+        _current.reset(token)
+
+def init_app(app):
+    """Instrumentar todas las rutas de la aplicación"""
+    global METRICS_DIR
+
+    if not METRICS_ENABLED:
+        return
+    if not METRICS_DIR:
+        METRICS_DIR = os.path.join(app.instance_path, 'metrics')
+    install_db_events()
+    atexit.register(remove_snapshot)
+    app.before_request(_start_request)
+    app.after_request(_record_request)
+    app.teardown_request(_end_request)
+
+def export_state():
+    """Copia serializable de los histogramas y contadores de este worker"""
+    with _state_lock:
+        return {
+            'histograms': [[list(key), histogram.to_dict()] for key, histogram in _histograms.items()],
+            'requests': [[list(key), count] for key, count in _requests.items()],
+        }
+
+def flush(force=False):
+    """Guardar el estado de este worker en METRICS_DIR (como máximo cada FLUSH_SECONDS)"""
+    global _last_flush, _flush_failed
+
+    if not METRICS_DIR:
+        return
+
+    now = time.monotonic()
+    if not force and now - _last_flush < FLUSH_SECONDS:
+        return
+
+    if not _flush_lock.acquire(blocking=force):
+        # Otro hilo está escribiendo el snapshot en este momento
+        return
+    try:
+        _last_flush = now
+        path = snapshot_path()
+        tmp_path = f'{path}.tmp'
+        os.makedirs(METRICS_DIR, exist_ok=True)
+        with open(tmp_path, 'w', encoding='utf-8') as snapshot_file:
+            json.dump(export_state(), snapshot_file, separators=(',', ':'))
+        os.replace(tmp_path, path)
+        _flush_failed = False
+    except OSError as e:
+        if not _flush_failed:
+            logger.warning(f"Could not write metrics snapshot to {METRICS_DIR}: {str(e)}")
+        _flush_failed = True
+    finally:
+        _flush_lock.release()
+
+def snapshot_path(pid=None):
+    """Archivo de snapshot de un worker"""
+    return os.path.join(METRICS_DIR, f'{pid or os.getpid()}.json')
+
+def remove_snapshot():
+    """Eliminar el snapshot de este worker al terminar (sus contadores dejan de sumarse)"""
+    if not METRICS_DIR:
+        return
+    with _flush_lock:
+        try:
+            os.remove(snapshot_path())
+        except OSError:
+            pass
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+def _load_snapshots():
+    """Estados de los workers vivos del host (el propio, siempre desde memoria)"""
+    states = [export_state()]
+    if not METRICS_DIR:
+        return states
+    try:
+        entries = list(os.scandir(METRICS_DIR))
+    except OSError:
+        return states
+
+    own_pid = os.getpid()
+    for entry in entries:
+        pid = entry.name[:-len('.json')]
+        if not entry.name.endswith('.json') or not pid.isdigit() or int(pid) == own_pid:
+            continue
+        try:
+            if not _pid_alive(int(pid)):
+                # Worker terminado sin limpiar (kill, OOM): no sumar sus contadores
+                os.remove(entry.path)
+                continue
+            with open(entry.path, encoding='utf-8') as snapshot_file:
+                states.append(json.load(snapshot_file))
+        except (OSError, ValueError) as e:
+            logger.warning(f"Skipping metrics snapshot {entry.name}: {str(e)}")
+    return states
+
+def collect():
+    """Histogramas y contadores combinados de todos los workers"""
+    flush(force=True)
+    histograms = {}
+    requests = Counter()
+    for state in _load_snapshots():
+        for key, data in state['histograms']:
+            key = tuple(key)
+            histogram = histograms.get(key)
+            if histogram is None:
+                histogram = histograms[key] = Histogram()
+            histogram.merge(Histogram.from_dict(data))
+        for key, count in state['requests']:
+            requests[tuple(key)] += count
+    return histograms, requests
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+def render_prometheus():
+    """Métricas en formato de texto de Prometheus"""
+    histograms, requests = collect()
+    lines = [
+        f'# HELP {METRIC_PREFIX}requests_total Peticiones atendidas',
+        f'# TYPE {METRIC_PREFIX}requests_total counter',
+    ]
+    for (endpoint, method, status), count in sorted(requests.items()):
+        lines.append(
+            f'{METRIC_PREFIX}requests_total{{endpoint="{_label(endpoint)}",method="{method}",status="{status}"}} {count}'
+        )
+
+    for name, (scale, bounds, help_text) in METRICS.items():
+        metric = METRIC_PREFIX + name
+        lines.append(f'# HELP {metric} {help_text}')
+        lines.append(f'# TYPE {metric} histogram')
+        raw_bounds = [bound / scale for bound in bounds]
+        for (histogram_name, endpoint, method), histogram in sorted(histograms.items()):
+            if histogram_name != name:
+                continue
+            labels = f'endpoint="{_label(endpoint)}",method="{method}"'
+            for bound, count in zip(bounds, histogram.cumulative(raw_bounds)):
+                lines.append(f'{metric}_bucket{{{labels},le="{_number(bound)}"}} {count}')
+            lines.append(f'{metric}_bucket{{{labels},le="+Inf"}} {histogram.count}')
+            lines.append(f'{metric}_sum{{{labels}}} {_number(histogram.total * scale)}')
+            lines.append(f'{metric}_count{{{labels}}} {histogram.count}')
+
+    return '\n'.join(lines) + '\n'
+
+def summary():
+    """Resumen por endpoint con cuantiles (para consultar sin Prometheus)"""
+    histograms, requests = collect()
+    endpoints = {}
+    for (name, endpoint, method), histogram in histograms.items():
+        scale = METRICS[name][0]
+        entry = endpoints.setdefault(f'{method} {endpoint}', {})
+        entry[name] = {
+            'count': histogram.count,
+            'mean': round(histogram.total * scale / histogram.count, 6) if histogram.count else 0,
+            'max': round(histogram.max * scale, 6),
+            **{f'p{int(q * 100)}': round(histogram.quantile(q) * scale, 6) for q in QUANTILES}
+        }
+    for (endpoint, method, status), count in requests.items():
+        entry = endpoints.setdefault(f'{method} {endpoint}', {})
+        entry.setdefault('status', {})[status] = count
+    return endpoints
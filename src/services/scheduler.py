@@ -0,0 +1,308 @@
+"""
+Scheduler de tareas seguro con varios workers.
+
+Cada worker (por ejemplo, cada proceso de gunicorn) arranca un
+BackgroundScheduler en pausa sobre un almacén de tareas persistente en la base
+de datos. Un hilo de elección renueva periódicamente un arrendamiento en la
+tabla scheduler_locks: solo el worker que lo posee reanuda su scheduler y
+ejecuta las tareas. Si el líder desaparece, el arrendamiento vence y otro
+worker toma el relevo, ejecutando las tareas atrasadas dentro del margen de
+tolerancia. Cada ejecución queda registrada en scheduler_job_runs.
+"""
+
+from contextlib import nullcontext
+from datetime import datetime, timedelta
+import atexit
+import json
+import logging
+import os
+import socket
+import threading
+import time
+
+from apscheduler.jobstores.sqlalchemy import SQLAlchemyJobStore
+from apscheduler.schedulers.background import BackgroundScheduler
+from flask import has_app_context
+from sqlalchemy.exc import IntegrityError
+
+from src.models.database import db, dialect_insert
+from src.models.models import SchedulerLock, SchedulerJobRun
+from src.services.query_diagnostics import tracking
+
+logger = logging.getLogger(__name__)
+
+SCHEDULER_ENABLED = os.environ.get('SCHEDULER_ENABLED', 'true').lower() == 'true'
+LEASE_SECONDS = int(os.environ.get('SCHEDULER_LEASE_SECONDS', 60))
+RENEW_SECONDS = max(LEASE_SECONDS // 3, 1)
+MISFIRE_GRACE_SECONDS = 3600  # Tareas atrasadas que aún se ejecutan al cambiar de líder
+HISTORY_LIMIT = 200  # Ejecuciones conservadas por tarea
+LOCK_NAME = 'scheduler'
+JOBS_TABLE = 'apscheduler_jobs'
+
+_app = None
+_scheduler = None
+_elector = None
+_stop_event = threading.Event()
+_state_lock = threading.RLock()
+_is_leader = False
+_job_definitions = {}
+
+def worker_id():
+    """Identificador de este worker (se calcula en cada llamada por si hubo fork)"""
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+def app_context():
+    """Contexto de aplicación para ejecutar fuera de una petición"""
+    if has_app_context() or _app is None:
+        return nullcontext()
+    return _app.app_context()
+
+def register_job(job_id, func, trigger, name=None):
+    """Declarar una tarea programada (se agrega al almacén cuando este worker es líder)"""
+    _job_definitions[job_id] = {'func': func, 'trigger': trigger, 'name': name or job_id}
+
+def try_acquire_lease(now=None):
+    """Obtener o renovar el arrendamiento de liderazgo; devuelve True si este worker es líder"""
+    now = now or datetime.utcnow()
+    owner = worker_id()
+    expires_at = now + timedelta(seconds=LEASE_SECONDS)
+
+    renewed = SchedulerLock.query.filter(
+        SchedulerLock.name == LOCK_NAME,
+        db.or_(SchedulerLock.owner == owner, SchedulerLock.expires_at < now)
+    ).update({
+        'acquired_date': db.case((SchedulerLock.owner == owner, SchedulerLock.acquired_date), else_=now),
+        'owner': owner,
+        'expires_at': expires_at,
+    }, synchronize_session=False)
+
+    if renewed:
+        db.session.commit()
+        return True
+
+    values = {'name': LOCK_NAME, 'owner': owner, 'acquired_date': now, 'expires_at': expires_at}
+    stmt = dialect_insert(SchedulerLock)
+    if stmt is not None:
+        created = db.session.execute(stmt.values(values).on_conflict_do_nothing(index_elements=['name'])).rowcount
+        db.session.commit()
+        return bool(created)
+
+    try:
+        db.session.add(SchedulerLock(**values))
+        db.session.commit()
+        return True
+    except IntegrityError:
+        db.session.rollback()
+        return False
+
+def release_lease():
+    """Liberar el arrendamiento si pertenece a este worker"""
+    SchedulerLock.query.filter_by(name=LOCK_NAME, owner=worker_id()).delete(synchronize_session=False)
+    db.session.commit()
+
+def _sync_jobs():
+    """Agregar al almacén las tareas que falten o cuyo disparador haya cambiado"""
+    for job_id, definition in _job_definitions.items():
+        job = _scheduler.get_job(job_id)
+        if job is None:
+            _scheduler.add_job(definition['func'], trigger=definition['trigger'], id=job_id, name=definition['name'])
+        elif str(job.trigger) != str(definition['trigger']):
+            _scheduler.reschedule_job(job_id, trigger=definition['trigger'])
+
+def _set_leader(leader):
+    """Reanudar o pausar el scheduler local según el resultado de la elección"""
+    global _is_leader
+
+    with _state_lock:
+        if _scheduler is None or leader == _is_leader:
+            return
+
+        if leader:
+            _sync_jobs()
+            _scheduler.resume()
+            logger.info(f"Scheduler leadership acquired by {worker_id()}")
+        else:
+            _scheduler.pause()
+            logger.info(f"Scheduler leadership lost by {worker_id()}")
+        _is_leader = leader
+
+def _election_loop():
+    """Renovar el arrendamiento periódicamente hasta que se detenga el scheduler"""
+    while not _stop_event.is_set():
+        with _app.app_context():
+            try:
+                leader = try_acquire_lease()
+            except Exception as e:
+                db.session.rollback()
+                logger.warning(f"Scheduler leader election failed: {str(e)}")
+                leader = False
+
+            try:
+                _set_leader(leader)
+            except Exception as e:
+                logger.error(f"Error updating scheduler leadership: {str(e)}")
+
+        _stop_event.wait(RENEW_SECONDS)
+
+def start(app):
+    """Arrancar el scheduler en pausa y el hilo de elección de líder"""
+    global _app, _scheduler, _elector
+
+    with _state_lock:
+        if _scheduler is not None:
+            return _scheduler
+
+        _app = app
+        _stop_event.clear()
+
+        # Engine propio del almacén: el scheduler lo cierra al detenerse
+        with app.app_context():
+            url = db.engine.url.render_as_string(hide_password=False)
+        jobstore = SQLAlchemyJobStore(url=url, tablename=JOBS_TABLE)
+
+        _scheduler = BackgroundScheduler(
+            jobstores={'default': jobstore},
+            job_defaults={
+                'coalesce': True,
+                'max_instances': 1,
+                'misfire_grace_time': MISFIRE_GRACE_SECONDS,
+            }
+        )
+        _scheduler.start(paused=True)
+
+        _elector = threading.Thread(target=_election_loop, name='scheduler-election', daemon=True)
+        _elector.start()
+
+        logger.info(f"Scheduler started on worker {worker_id()}")
+        return _scheduler
+
+def stop():
+    """Detener el scheduler de este worker y ceder el liderazgo"""
+    global _scheduler, _elector, _is_leader
+
+    if _scheduler is None:
+        return False
+
+    _stop_event.set()
+    if _elector is not None and _elector is not threading.current_thread():
+        _elector.join(timeout=5)
+
+    with _state_lock:
+        if _scheduler is None:
+            return False
+
+        if _is_leader:
+            with app_context():
+                try:
+                    release_lease()
+                except Exception as e:
+                    db.session.rollback()
+                    logger.warning(f"Could not release scheduler lease: {str(e)}")
+
+        _scheduler.shutdown(wait=False)
+        _scheduler = None
+        _elector = None
+        _is_leader = False
+
+        logger.info(f"Scheduler stopped on worker {worker_id()}")
+        return True
+
+atexit.register(stop)
+
+def is_running():
+    """Indicar si el scheduler está activo en este worker"""
+    return _scheduler is not None and _scheduler.running
+
+def is_leader():
+    """Indicar si este worker es el líder actual"""
+    return _is_leader
+
+def run_job(job_id, func, trigger='scheduled'):
+    """Ejecutar una tarea registrando en el historial su duración y resultado"""
+    run = SchedulerJobRun(job_id=job_id, trigger=trigger, worker=worker_id(), started_date=datetime.utcnow())
+    db.session.add(run)
+    db.session.commit()
+
+    started = time.perf_counter()
+    try:
+        with tracking(f'job {job_id}'):
+            result = func()
+    except Exception as e:
+        db.session.rollback()
+        _finish_run(run, started, status='error', error=str(e))
+        raise
+
+    _finish_run(run, started, status='success', result=result)
+    return result
+
+def _finish_run(run, started, status, result=None, error=None):
+    """Cerrar el registro de una ejecución y podar el historial de la tarea"""
+    run.status = status
+    run.finished_date = datetime.utcnow()
+    run.duration_ms = round((time.perf_counter() - started) * 1000, 2)
+    run.result = json.dumps(result, default=str) if result is not None else None
+    run.error = error
+
+    oldest_kept = db.session.query(SchedulerJobRun.id).filter(
+        SchedulerJobRun.job_id == run.job_id
+    ).order_by(SchedulerJobRun.id.desc()).offset(HISTORY_LIMIT - 1).limit(1).scalar_subquery()
+
+    SchedulerJobRun.query.filter(
+        SchedulerJobRun.job_id == run.job_id,
+        SchedulerJobRun.id < oldest_kept
+    ).delete(synchronize_session=False)
+
+    db.session.commit()
+
+def get_history(job_id=None, limit=20):
+    """Últimas ejecuciones registradas"""
+    query = SchedulerJobRun.query
+    if job_id:
+        query = query.filter_by(job_id=job_id)
+    return query.order_by(SchedulerJobRun.id.desc()).limit(limit).all()
+
+def get_job_stats():
+    """Ejecuciones, errores y duraciones agregadas por tarea"""
+    rows = db.session.query(
+        SchedulerJobRun.job_id,
+        db.func.count(SchedulerJobRun.id),
+        db.func.sum(db.case((SchedulerJobRun.status == 'error', 1), else_=0)),
+        db.func.avg(SchedulerJobRun.duration_ms),
+        db.func.max(SchedulerJobRun.duration_ms),
+        db.func.max(SchedulerJobRun.started_date)
+    ).group_by(SchedulerJobRun.job_id).all()
+
+    return {
+        job_id: {
+            'runs': runs,
+            'errors': errors or 0,
+            'avg_duration_ms': round(avg_duration, 2) if avg_duration is not None else None,
+            'max_duration_ms': max_duration,
+            'last_run': last_run.isoformat() if last_run else None
+        }
+        for job_id, runs, errors, avg_duration, max_duration, last_run in rows
+    }
+
+def get_status():
+    """Estado del scheduler: líder, tareas programadas e historial"""
+    lease = db.session.get(SchedulerLock, LOCK_NAME)
+
+    jobs = []
+    if _scheduler is not None:
+        for job in _scheduler.get_jobs():
+            jobs.append({
+                'id': job.id,
+                'name': job.name,
+                'next_run': job.next_run_time.isoformat() if job.next_run_time else None,
+                'trigger': str(job.trigger)
+            })
+
+    return {
+        'running': is_running(),
+        'worker': worker_id(),
+        'is_leader': is_leader(),
+        'leader': lease.to_dict() if lease and lease.expires_at >= datetime.utcnow() else None,
+        'jobs': jobs,
+        'job_stats': get_job_stats(),
+        'history': [run.to_dict() for run in get_history()]
+    }
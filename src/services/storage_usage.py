@@ -0,0 +1,296 @@
+"""
+Contabilidad del almacenamiento de documentos.
+
+storage_usage mantiene contadores de documentos y bytes (total, por proceso y
+por proveedor) que se actualizan en la misma transacción que crea, mueve o
+elimina un documento, de modo que las estadísticas y la verificación de
+cuotas no necesitan sumar la tabla documents en cada consulta.
+
+La conciliación recorre UPLOAD_FOLDER con os.scandir y compara lo que hay en
+disco con lo que referencian los documentos: informa archivos huérfanos y
+documentos sin archivo, puede eliminar los huérfanos con más de
+ORPHAN_GRACE_SECONDS de antigüedad (para no tocar subidas en curso) y vuelve a
+calcular los contadores desde la base de datos para corregir desvíos.
+"""
+
+from datetime import datetime
+import logging
+import os
+import time
+
+from apscheduler.triggers.cron import CronTrigger
+from flask import current_app
+
+from src.models.database import db, dialect_insert
+from src.models.models import Document, StorageUsage
+from src.services import scheduler as scheduler_service
+from src.services.blob_store import BLOB_DIR, LOCK_DIR, TMP_DIR, digest_lock, is_digest, ref_count
+
+logger = logging.getLogger(__name__)
+
+TOTAL_SCOPE = 'total'
+SCOPES = ('process', 'supplier')
+PROCESS_QUOTA_MB = int(os.environ.get('PROCESS_STORAGE_QUOTA_MB', 0))  # 0 = sin límite
+SUPPLIER_QUOTA_MB = int(os.environ.get('SUPPLIER_STORAGE_QUOTA_MB', 0))
+ORPHAN_GRACE_SECONDS = 3600
+MAX_REPORTED_PATHS = 100
+SKIPPED_DIRS = (TMP_DIR, LOCK_DIR)
+RECONCILE_JOB_ID = 'storage_reconcile'
+REMOVE_ORPHANS = os.environ.get('STORAGE_REMOVE_ORPHANS', 'false').lower() == 'true'
+
+def _scope_keys(process_id, supplier_id):
+    """Contadores afectados por un documento"""
+    keys = [(TOTAL_SCOPE, 0)]
+    if process_id:
+        keys.append(('process', process_id))
+    if supplier_id:
+        keys.append(('supplier', supplier_id))
+    return keys
+
+def _apply_delta(scope, scope_id, count_delta, bytes_delta):
+    """Sumar a un contador dentro de la transacción en curso (lo crea si no existe)"""
+    insert = dialect_insert(StorageUsage)
+    now = datetime.utcnow()
+
+    if insert is not None:
+        statement = insert.values(
+            scope=scope, scope_id=scope_id, document_count=count_delta,
+            total_bytes=bytes_delta, updated_date=now
+        )
+        db.session.execute(statement.on_conflict_do_update(
+            index_elements=['scope', 'scope_id'],
+            set_={
+                'document_count': StorageUsage.document_count + statement.excluded.document_count,
+                'total_bytes': StorageUsage.total_bytes + statement.excluded.total_bytes,
+                'updated_date': now,
+            }
+        ))
+        return
+
+    updated = StorageUsage.query.filter_by(scope=scope, scope_id=scope_id).update({
+        'document_count': StorageUsage.document_count + count_delta,
+        'total_bytes': StorageUsage.total_bytes + bytes_delta,
+        'updated_date': now,
+    }, synchronize_session=False)
+    if not updated:
+        db.session.add(StorageUsage(
+            scope=scope, scope_id=scope_id, document_count=count_delta,
+            total_bytes=bytes_delta, updated_date=now
+        ))
+
+def record_added(document):
+    """Contabilizar un documento nuevo (llamar antes del commit)"""
+    for scope, scope_id in _scope_keys(document.process_id, document.supplier_id):
+        _apply_delta(scope, scope_id, 1, document.file_size or 0)
+
+def record_removed(document):
+    """Descontar un documento eliminado (llamar antes del commit)"""
+    for scope, scope_id in _scope_keys(document.process_id, document.supplier_id):
+        _apply_delta(scope, scope_id, -1, -(document.file_size or 0))
+
+def record_moved(document, old_process_id, old_supplier_id):
+    """Trasladar el uso de un documento reasignado a otro proceso o proveedor"""
+    size = document.file_size or 0
+    moves = (
+        ('process', old_process_id, document.process_id),
+        ('supplier', old_supplier_id, document.supplier_id),
+    )
+    for scope, old_id, new_id in moves:
+        if old_id == new_id:
+            continue
+        if old_id:
+            _apply_delta(scope, old_id, -1, -size)
+        if new_id:
+            _apply_delta(scope, new_id, 1, size)
+
+def clear_scope(scope, scope_id):
+    """Eliminar el contador de un proceso o proveedor que deja de existir"""
+    StorageUsage.query.filter_by(scope=scope, scope_id=scope_id).delete(synchronize_session=False)
+
+def get_usage(scope=TOTAL_SCOPE, scope_id=0):
+    """Contador de uso (con valores en cero si aún no existe)"""
+    usage = db.session.get(StorageUsage, (scope, scope_id))
+    if usage is None:
+        return {'scope': scope, 'scope_id': scope_id, 'document_count': 0, 'total_bytes': 0, 'total_mb': 0}
+    return usage.to_dict()
+
+def quota_bytes(scope):
+    """Cuota configurada para un tipo de contador (None si no hay límite)"""
+    megabytes = PROCESS_QUOTA_MB if scope == 'process' else SUPPLIER_QUOTA_MB
+    return megabytes * 1024 * 1024 if megabytes > 0 else None
+
+def check_quota(process_id, supplier_id, size):
+    """Verificar que un archivo de 'size' bytes cabe en las cuotas del proceso y del proveedor"""
+    for scope, scope_id in _scope_keys(process_id, supplier_id)[1:]:
+        limit = quota_bytes(scope)
+        if limit is None:
+            continue
+
+        used = get_usage(scope, scope_id)['total_bytes']
+        if used + size > limit:
+            label = 'el proceso' if scope == 'process' else 'el proveedor'
+            raise ValueError(
+                f'Se supera la cuota de almacenamiento para {label} '
+                f'({round(used / (1024 * 1024), 1)} de {limit // (1024 * 1024)}MB usados)'
+            )
+
+def rebuild_usage():
+    """Recalcular todos los contadores desde la tabla documents; devuelve cuántos se escribieron"""
+    rows = [(TOTAL_SCOPE, 0) + tuple(
+        db.session.query(db.func.count(Document.id), db.func.coalesce(db.func.sum(Document.file_size), 0)).one()
+    )]
+    for scope in SCOPES:
+        column = getattr(Document, f'{scope}_id')
+        rows.extend(
+            (scope, scope_id, count, total)
+            for scope_id, count, total in db.session.query(
+                column, db.func.count(Document.id), db.func.coalesce(db.func.sum(Document.file_size), 0)
+            ).filter(column.isnot(None)).group_by(column)
+        )
+
+    now = datetime.utcnow()
+    StorageUsage.query.delete(synchronize_session=False)
+    db.session.execute(db.insert(StorageUsage), [
+        {'scope': scope, 'scope_id': scope_id, 'document_count': count, 'total_bytes': total, 'updated_date': now}
+        for scope, scope_id, count, total in rows
+    ])
+    db.session.commit()
+    return len(rows)
+
+def ensure_usage():
+    """Calcular los contadores por primera vez en bases de datos existentes"""
+    if db.session.get(StorageUsage, (TOTAL_SCOPE, 0)) is None:
+        written = rebuild_usage()
+        logger.info(f"Storage usage counters initialized ({written} scopes)")
+
+def _walk_files(path):
+    """Recorrer archivos con os.scandir (sin listas intermedias por directorio)"""
+    stack = [path]
+    while stack:
+        with os.scandir(stack.pop()) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif entry.is_file(follow_symlinks=False):
+                    yield entry
+
+def reconcile_storage(remove_orphans=False, now=None):
+    """Comparar el disco con los documentos registrados y corregir los contadores"""
+    now = now or time.time()
+    root = os.path.realpath(current_app.config['UPLOAD_FOLDER'])
+
+    hashes = {digest for (digest,) in db.session.query(Document.content_hash).filter(
+        Document.content_hash.isnot(None)
+    ).distinct()}
+    # Documentos anteriores al almacén por contenido: se identifican por su ruta
+    legacy_paths = {}
+    for document_id, path in db.session.query(Document.id, Document.file_path).filter(
+        Document.content_hash.is_(None)
+    ):
+        legacy_paths.setdefault(os.path.realpath(path), []).append(document_id)
+
+    report = {
+        'files': 0,
+        'bytes_on_disk': 0,
+        'orphans': 0,
+        'orphan_bytes': 0,
+        'orphans_removed': 0,
+        'orphan_paths': [],
+        'missing': 0,
+        'missing_documents': [],
+    }
+    seen_hashes = set()
+    seen_legacy = set()
+
+    with os.scandir(root) as top_entries:
+        for top in top_entries:
+            if top.is_dir(follow_symlinks=False):
+                if top.name in SKIPPED_DIRS:
+                    continue
+                entries = _walk_files(top.path)
+            elif top.is_file(follow_symlinks=False):
+                entries = [top]
+            else:
+                continue
+
+            for entry in entries:
+                stat = entry.stat(follow_symlinks=False)
+                report['files'] += 1
+                report['bytes_on_disk'] += stat.st_size
+
+                in_blob_dir = top.name == BLOB_DIR and is_digest(entry.name)
+                if in_blob_dir and entry.name in hashes:
+                    seen_hashes.add(entry.name)
+                    continue
+                if not in_blob_dir and os.path.realpath(entry.path) in legacy_paths:
+                    seen_legacy.add(os.path.realpath(entry.path))
+                    continue
+
+                report['orphans'] += 1
+                report['orphan_bytes'] += stat.st_size
+                if len(report['orphan_paths']) < MAX_REPORTED_PATHS:
+                    report['orphan_paths'].append(os.path.relpath(entry.path, root))
+
+                if remove_orphans and now - stat.st_mtime > ORPHAN_GRACE_SECONDS:
+                    if _remove_orphan(entry, in_blob_dir):
+                        report['orphans_removed'] += 1
+
+    missing_ids = [
+        document_id
+        for path, document_ids in legacy_paths.items() if path not in seen_legacy
+        for document_id in document_ids
+    ]
+    missing_hashes = hashes - seen_hashes
+    if missing_hashes:
+        missing_ids.extend(
+            document_id for (document_id,) in db.session.query(Document.id).filter(
+                Document.content_hash.in_(missing_hashes)
+            )
+        )
+    report['missing'] = len(missing_ids)
+    report['missing_documents'] = sorted(missing_ids)[:MAX_REPORTED_PATHS]
+
+    report['usage_scopes'] = rebuild_usage()
+
+    logger.info(
+        f"Storage reconciled: {report['files']} files, {report['orphans']} orphans "
+        f"({report['orphans_removed']} removed), {report['missing']} documents without file"
+    )
+    return report
+
+def _remove_orphan(entry, is_blob):
+    """Eliminar un archivo huérfano (los blobs se revalidan con el bloqueo de su huella)"""
+    try:
+        if is_blob:
+            with digest_lock(entry.name):
+                if ref_count(entry.name):
+                    return False
+                os.remove(entry.path)
+        else:
+            os.remove(entry.path)
+        return True
+    except OSError as e:
+        logger.warning(f"Could not remove orphan file {entry.path}: {str(e)}")
+        return False
+
+def reconcile_storage_job(trigger='scheduled'):
+    """Tarea programada: conciliar el almacenamiento y corregir los contadores"""
+    try:
+        with scheduler_service.app_context():
+            return scheduler_service.run_job(
+                RECONCILE_JOB_ID,
+                lambda: reconcile_storage(remove_orphans=REMOVE_ORPHANS),
+                trigger=trigger
+            )
+    except Exception as e:
+        logger.error(f"Error in storage reconciliation: {str(e)}")
+        return None
+
+def schedule_reconciliation():
+    """Registrar la conciliación diaria en el scheduler (fuera del horario de uso)"""
+    scheduler_service.register_job(
+        RECONCILE_JOB_ID,
+        reconcile_storage_job,
+        CronTrigger(hour=4, minute=0),
+        name='Reconcile document storage'
+    )
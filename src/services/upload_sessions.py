@@ -0,0 +1,252 @@
+"""
+Subidas de documentos por partes, reanudables.
+
+Protocolo:
+1. POST /api/documents/uploads: se declara el archivo (nombre, tamaño total)
+   y se obtiene upload_id, chunk_size y total_parts.
+2. PUT /api/documents/uploads/<id>/parts/<n>: cada parte se envía como cuerpo
+   binario (con X-Part-Checksum: sha256=<hex> para verificarla). Se escribe
+   directamente a disco en bloques pequeños y solo queda registrada, con un
+   renombrado atómico, si su tamaño y su huella son correctos.
+3. GET /api/documents/uploads/<id>: partes recibidas y faltantes, para
+   reanudar después de un corte.
+4. POST /api/documents/uploads/<id>/complete: las partes se concatenan en
+   streaming hacia el almacén por contenido y se crea el Document.
+
+Cada petición lleva como máximo una parte, por lo que el límite
+MAX_CONTENT_LENGTH se aplica a las partes y no al archivo completo.
+"""
+
+from datetime import datetime, timedelta
+import hashlib
+import logging
+import os
+import shutil
+import uuid
+
+from src.models.database import db
+from src.models.models import Document, UploadSession
+from src.services.blob_store import TMP_DIR, storage_dir, store_file, write_temp
+from src.services import storage_usage
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_SIZE = 8 * 1024 * 1024  # 8MB
+MIN_CHUNK_SIZE = 256 * 1024
+MAX_CHUNK_SIZE = 15 * 1024 * 1024  # Por debajo de MAX_CONTENT_LENGTH (16MB)
+MAX_DOCUMENT_SIZE = int(os.environ.get('MAX_DOCUMENT_SIZE', 2 * 1024 * 1024 * 1024))  # 2GB
+SESSION_TTL_HOURS = 24
+READ_SIZE = 64 * 1024
+SESSIONS_DIR = 'sessions'
+
+def session_dir(upload_id):
+    """Directorio donde se guardan las partes de una subida"""
+    path = os.path.join(storage_dir(TMP_DIR), SESSIONS_DIR, upload_id)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+def part_path(upload_id, part_number):
+    """Ruta de una parte ya verificada"""
+    return os.path.join(session_dir(upload_id), f'{part_number:06d}.part')
+
+def expected_part_size(upload, part_number):
+    """Tamaño que debe tener una parte (la última puede ser menor)"""
+    if part_number < upload.total_parts:
+        return upload.chunk_size
+    return upload.total_size - upload.chunk_size * (upload.total_parts - 1)
+
+def create_session(original_filename, file_type, total_size, chunk_size=None, checksum=None, **fields):
+    """Registrar una nueva subida por partes"""
+    if not isinstance(total_size, int) or total_size <= 0:
+        raise ValueError('total_size debe ser un entero positivo')
+    if total_size > MAX_DOCUMENT_SIZE:
+        raise ValueError(f'El archivo supera el máximo permitido ({MAX_DOCUMENT_SIZE // (1024 * 1024)}MB)')
+
+    chunk_size = chunk_size or DEFAULT_CHUNK_SIZE
+    if not isinstance(chunk_size, int) or not MIN_CHUNK_SIZE <= chunk_size <= MAX_CHUNK_SIZE:
+        raise ValueError(f'chunk_size debe estar entre {MIN_CHUNK_SIZE} y {MAX_CHUNK_SIZE} bytes')
+
+    if checksum and (len(checksum) != 64 or any(c not in '0123456789abcdef' for c in checksum.lower())):
+        raise ValueError('checksum debe ser un SHA-256 en hexadecimal')
+
+    storage_usage.check_quota(fields.get('process_id'), fields.get('supplier_id'), total_size)
+
+    cleanup_expired_sessions()
+
+    upload = UploadSession(
+        id=uuid.uuid4().hex,
+        original_filename=original_filename,
+        file_type=file_type,
+        total_size=total_size,
+        chunk_size=chunk_size,
+        total_parts=(total_size + chunk_size - 1) // chunk_size,
+        checksum=checksum.lower() if checksum else None,
+        expires_at=datetime.utcnow() + timedelta(hours=SESSION_TTL_HOURS),
+        **fields
+    )
+    db.session.add(upload)
+    db.session.commit()
+    return upload
+
+def get_pending_session(upload_id):
+    """Obtener una subida en curso o fallar con un mensaje de validación"""
+    upload = db.session.get(UploadSession, upload_id)
+    if upload is None or upload.expires_at < datetime.utcnow():
+        raise LookupError('Subida no encontrada o expirada')
+    if upload.status != 'pending':
+        raise ValueError('La subida ya fue completada')
+    return upload
+
+def received_parts(upload):
+    """Números de las partes ya verificadas"""
+    parts = []
+    with os.scandir(session_dir(upload.id)) as entries:
+        for entry in entries:
+            if entry.name.endswith('.part'):
+                parts.append(int(entry.name[:-len('.part')]))
+    return sorted(parts)
+
+def session_status(upload):
+    """Estado de una subida con sus partes recibidas y faltantes"""
+    data = upload.to_dict()
+    if upload.status == 'pending':
+        received = received_parts(upload)
+        data['received_parts'] = received
+        data['missing_parts'] = sorted(set(range(1, upload.total_parts + 1)) - set(received))
+    return data
+
+def parse_checksum(header):
+    """Extraer el SHA-256 de la cabecera X-Part-Checksum ('sha256=<hex>' o '<hex>')"""
+    if not header:
+        return None
+    value = header.split('=', 1)[1] if '=' in header else header
+    return value.strip().lower()
+
+def write_part(upload, part_number, stream, checksum=None):
+    """Escribir una parte desde el flujo de la petición y verificarla antes de aceptarla"""
+    if not 1 <= part_number <= upload.total_parts:
+        raise ValueError(f'Número de parte fuera de rango (1-{upload.total_parts})')
+
+    expected_size = expected_part_size(upload, part_number)
+    target = part_path(upload.id, part_number)
+    tmp_path = f'{target}.{uuid.uuid4().hex}.tmp'
+    digest = hashlib.sha256()
+    size = 0
+
+    try:
+        with open(tmp_path, 'wb') as part_file:
+            while True:
+                chunk = stream.read(READ_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > expected_size:
+                    raise ValueError(f'La parte {part_number} supera el tamaño esperado ({expected_size} bytes)')
+                digest.update(chunk)
+                part_file.write(chunk)
+
+        if size != expected_size:
+            raise ValueError(f'La parte {part_number} tiene {size} bytes; se esperaban {expected_size}')
+
+        part_digest = digest.hexdigest()
+        if checksum and checksum != part_digest:
+            raise ValueError(f'Checksum incorrecto en la parte {part_number}')
+
+        # Reenviar una parte existente la reemplaza (reintentos idempotentes)
+        os.replace(tmp_path, target)
+        return {'part': part_number, 'size': size, 'sha256': part_digest}
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+class _PartsReader:
+    """Lectura secuencial de las partes como si fueran un solo archivo"""
+
+    def __init__(self, paths):
+        self._paths = list(paths)
+        self._current = None
+
+    def read(self, size):
+        while True:
+            if self._current is None:
+                if not self._paths:
+                    return b''
+                self._current = open(self._paths.pop(0), 'rb')
+
+            data = self._current.read(size)
+            if data:
+                return data
+
+            self._current.close()
+            self._current = None
+
+    def close(self):
+        if self._current is not None:
+            self._current.close()
+            self._current = None
+
+def complete_session(upload, filename):
+    """Unir las partes en el almacén por contenido y crear el documento"""
+    missing = sorted(set(range(1, upload.total_parts + 1)) - set(received_parts(upload)))
+    if missing:
+        raise ValueError(f'Faltan partes: {", ".join(str(part) for part in missing[:20])}')
+
+    reader = _PartsReader(part_path(upload.id, part) for part in range(1, upload.total_parts + 1))
+    try:
+        tmp_path, digest, size = write_temp(reader)
+    finally:
+        reader.close()
+
+    if size != upload.total_size or (upload.checksum and digest != upload.checksum):
+        os.remove(tmp_path)
+        raise ValueError('El archivo reconstruido no coincide con el tamaño o checksum declarados')
+
+    with store_file(tmp_path, digest, size) as blob:
+        storage_usage.check_quota(upload.process_id, upload.supplier_id, blob.size)
+        document = Document(
+            filename=filename,
+            original_filename=upload.original_filename,
+            file_path=blob.path,
+            file_size=blob.size,
+            file_type=upload.file_type,
+            content_hash=blob.digest,
+            document_type=upload.document_type,
+            process_id=upload.process_id,
+            supplier_id=upload.supplier_id,
+            description=upload.description
+        )
+        db.session.add(document)
+        db.session.flush()
+        storage_usage.record_added(document)
+
+        upload.status = 'completed'
+        upload.document_id = document.id
+        db.session.commit()
+
+    discard_parts(upload.id)
+    return document
+
+def discard_parts(upload_id):
+    """Eliminar las partes almacenadas de una subida"""
+    shutil.rmtree(os.path.join(storage_dir(TMP_DIR), SESSIONS_DIR, upload_id), ignore_errors=True)
+
+def abort_session(upload):
+    """Cancelar una subida en curso"""
+    discard_parts(upload.id)
+    db.session.delete(upload)
+    db.session.commit()
+
+def cleanup_expired_sessions():
+    """Eliminar las subidas expiradas sin completar y sus partes"""
+    expired = UploadSession.query.filter(
+        UploadSession.status == 'pending',
+        UploadSession.expires_at < datetime.utcnow()
+    ).limit(100).all()
+
+    for upload in expired:
+        discard_parts(upload.id)
+        db.session.delete(upload)
+
+    if expired:
+        db.session.commit()
+        logger.info(f"Removed {len(expired)} expired upload sessions")
@@ -0,0 +1,139 @@
+"""
+Generación de archivos ZIP en streaming.
+
+zipfile escribe sobre un destino no posicionable (usando descriptores de
+datos), y los bytes producidos se entregan al cliente a medida que se generan,
+sin armar el archivo completo en memoria ni en disco. Lo mismo aplica a los
+libros XLSX, que son archivos ZIP generados por openpyxl.
+"""
+
+import io
+import queue
+import threading
+import time
+import zipfile
+
+CHUNK_SIZE = 1024 * 1024  # 1MB
+
+class _ZipOutput(io.RawIOBase):
+    """Destino no posicionable que acumula los bytes escritos por zipfile"""
+
+    def __init__(self):
+        self._chunks = []
+        self._offset = 0
+
+    def writable(self):
+        return True
+
+    def seekable(self):
+        return False
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._offset += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._offset
+
+    def drain(self):
+        """Devolver y olvidar los bytes pendientes de envío"""
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+def stream_zip(entries, chunk_size=CHUNK_SIZE):
+    """Generar un ZIP a partir de (nombre, ruta o bytes) entregando bytes a medida que avanza"""
+    output = _ZipOutput()
+
+    with zipfile.ZipFile(output, 'w', compression=zipfile.ZIP_STORED) as zf:
+        for arcname, source in entries:
+            if isinstance(source, (bytes, bytearray)):
+                zinfo = zipfile.ZipInfo(arcname, date_time=time.localtime()[:6])
+                zinfo.file_size = len(source)
+                with zf.open(zinfo, 'w') as dest:
+                    dest.write(source)
+            else:
+                zinfo = zipfile.ZipInfo.from_file(source, arcname)
+                with open(source, 'rb') as src, zf.open(zinfo, 'w') as dest:
+                    while True:
+                        chunk = src.read(chunk_size)
+                        if not chunk:
+                            break
+                        dest.write(chunk)
+                        data = output.drain()
+                        if data:
+                            yield data
+
+            data = output.drain()
+            if data:
+                yield data
+
+    yield output.drain()
+
+class _QueueWriter(io.RawIOBase):
+    """Destino no posicionable que entrega los bytes escritos a una cola acotada"""
+
+    def __init__(self, chunks, cancelled):
+        self._chunks = chunks
+        self._cancelled = cancelled
+        self._offset = 0
+
+    def writable(self):
+        return True
+
+    def seekable(self):
+        return False
+
+    def write(self, data):
+        data = bytes(data)
+        while True:
+            if self._cancelled.is_set():
+                raise OSError('Transferencia cancelada por el cliente')
+            try:
+                self._chunks.put(data, timeout=0.5)
+                break
+            except queue.Full:
+                continue
+        self._offset += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._offset
+
+def stream_from_writer(write_func, max_pending=16):
+    """Ejecutar write_func(destino) en un hilo y entregar sus bytes a medida que se escriben"""
+    chunks = queue.Queue(maxsize=max_pending)
+    cancelled = threading.Event()
+    done = object()
+    errors = []
+
+    def run():
+        try:
+            write_func(_QueueWriter(chunks, cancelled))
+        except Exception as e:
+            errors.append(e)
+        finally:
+            chunks.put(done)
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+
+    try:
+        while True:
+            chunk = chunks.get()
+            if chunk is done:
+                break
+            yield chunk
+    finally:
+        # Si el cliente se desconecta, liberar al hilo escritor
+        cancelled.set()
+        while thread.is_alive():
+            try:
+                chunks.get(timeout=0.5)
+            except queue.Empty:
+                pass
+        thread.join()
+
+    if errors:
+        raise errors[0]
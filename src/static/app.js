@@ -26,8 +26,111 @@ function initializeApp() {
     // Load initial data
     loadDashboardData();
     
-    // Check for alerts periodically
-    setInterval(updateAlertBadge, 30000); // Every 30 seconds
+    // Live updates for alerts and dashboard counters
+    startLiveUpdates();
+}
+
+// Live Updates (Server-Sent Events)
+let liveEvents = null;
+let lastLiveEventId = null;
+
+const LIVE_EVENT_TYPES = [
+    'counters', 'resync',
+    'alert.created', 'alert.updated', 'alert.resolved', 'alert.dismissed', 'alert.deleted', 'alerts.generated'
+];
+const LIVE_POLL_INTERVAL = 15000; // Polling when the server has no free stream slots
+const LIVE_STREAM_RETRY = 60000; // Try the stream again after this long
+
+function startLiveUpdates() {
+    if (!window.EventSource) {
+        // Fallback for browsers without SSE support
+        setInterval(updateAlertBadge, 30000); // Every 30 seconds
+        return;
+    }
+    
+    liveEvents = new EventSource(`${API_BASE}/events/stream`);
+    
+    LIVE_EVENT_TYPES.forEach(type => liveEvents.addEventListener(type, (event) => {
+        lastLiveEventId = event.lastEventId || lastLiveEventId;
+        handleLiveEvent(type, JSON.parse(event.data));
+    }));
+    
+    liveEvents.addEventListener('error', () => {
+        // CLOSED means the server refused the stream (503: too many live connections)
+        if (liveEvents.readyState === EventSource.CLOSED) {
+            liveEvents = null;
+            startLivePolling();
+        }
+    });
+}
+
+function startLivePolling() {
+    const startedAt = Date.now();
+    
+    const poll = async () => {
+        try {
+            // timeout=0: answer immediately instead of holding a server thread
+            const after = lastLiveEventId ? `&after=${encodeURIComponent(lastLiveEventId)}` : '';
+            const response = await fetch(`${API_BASE}/events/poll?timeout=0${after}`);
+            if (response.ok) {
+                const data = await response.json();
+                if (data.resync) {
+                    handleLiveEvent('resync', {});
+                }
+                data.events.forEach(event => handleLiveEvent(event.type, event.data));
+                lastLiveEventId = data.last_event_id || lastLiveEventId;
+            }
+        } catch (error) {
+            console.error('Live poll error:', error);
+        }
+        
+        if (Date.now() - startedAt >= LIVE_STREAM_RETRY) {
+            startLiveUpdates();
+        } else {
+            setTimeout(poll, LIVE_POLL_INTERVAL);
+        }
+    };
+    
+    poll();
+}
+
+function handleLiveEvent(type, data) {
+    if (type === 'counters') {
+        applyLiveCounters(data);
+    } else if (type === 'resync') {
+        if (currentSection === 'dashboard') {
+            loadDashboardData();
+        } else if (currentSection === 'alerts') {
+            loadAlerts();
+        }
+    } else if (type.startsWith('alert') && currentSection === 'alerts') {
+        loadAlerts();
+    }
+}
+
+function applyLiveCounters(counters) {
+    const badge = document.getElementById('alertBadge');
+    const activeAlerts = counters.alerts?.by_status?.active || 0;
+    
+    if (badge) {
+        badge.textContent = activeAlerts;
+        badge.style.display = activeAlerts > 0 ? 'inline' : 'none';
+    }
+    
+    const dashboard = counters.dashboard || {};
+    const fields = {
+        totalProcesses: dashboard.total_processes,
+        totalSuppliers: dashboard.total_suppliers,
+        totalBids: dashboard.total_bids,
+        activeAlerts: dashboard.active_alerts
+    };
+    
+    Object.entries(fields).forEach(([id, value]) => {
+        const element = document.getElementById(id);
+        if (element && value !== undefined) {
+            element.textContent = value;
+        }
+    });
 }
 
 // Authentication Functions
@@ -1988,7 +2091,13 @@ function showEvaluationModal(bidId) {
 async function exportProcessPDF(processId) {
     try {
         showLoading();
-        const response = await fetch(`${API_BASE}/export/process/${processId}/pdf`);
+        // El PDF se genera en segundo plano: reintentar mientras responda 202
+        let response = await fetch(`${API_BASE}/export/process/${processId}/pdf?async=1`);
+        while (response.status === 202) {
+            const retryAfter = parseInt(response.headers.get('Retry-After') || '2', 10);
+            await new Promise(resolve => setTimeout(resolve, retryAfter * 1000));
+            response = await fetch(`${API_BASE}/export/process/${processId}/pdf?async=1`);
+        }
         
         if (response.ok) {
             const blob = await response.blob();